@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Benchmark loading .crate files.
+
+This compares SeratoCrate.load_crate against the original InputStream based
+parser, which read each field of a crate with a separate call. Both parsers
+are run over the same generated crates and must produce identical results.
+
+Usage:
+  python benchmarks/crate_load.py [--crates N] [--tracks N] [--repeat N]
+
+"""
+import os
+import argparse
+import tempfile
+from timeit import repeat
+from cratedigger.serato.crate import SeratoCrate
+from cratedigger.util.io import InputStream
+
+def load_crate_stream(crate: SeratoCrate, path: str) -> None:
+  """Load a .crate file with the original InputStream based parser"""
+
+  crate.crate_name = os.path.splitext(os.path.basename(path))[0]
+
+  # Columns within the crate, these replace the default columns if present
+  columns = []
+
+  with open(path, 'rb') as crate_file:
+    stream = InputStream(crate_file)
+
+    # Header
+    stream.skip_string('vrsn')
+    stream.skip_bytes(b'\x00\x00')
+    crate.version = stream.read_string(8, 'utf-16-be')
+    stream.skip_string('/Serato ScratchLive Crate', 'utf-16-be')
+
+    # Header sections
+    while True:
+      try:
+        section = stream.read_string(4)
+      except ValueError:
+        # End of a crate with no tracks
+        section = None
+        break
+
+      if section == 'otrk':
+        break
+      elif section == 'ovct':
+        stream.read_int()
+        stream.skip_string('tvcn')
+        tvcn = stream.read_int()
+        columns.append(stream.read_string(tvcn, 'utf-16-be'))
+        stream.skip_string('tvcw')
+        stream.read_int()
+        stream.skip_bytes(b'\x00')
+        stream.skip_string('0')
+      elif section == 'osrt':
+        stream.read_int()
+        stream.skip_string('tvcn')
+        tvcn = stream.read_int()
+        crate.sort = stream.read_string(tvcn, 'utf-16-be')
+        stream.skip_string('brev')
+        crate.sort_rev = stream.read_int(5)
+      else:
+        raise ValueError('Encountered unknown header section %s' % section)
+
+    # Tracks
+    first_track = True
+    while section == 'otrk':
+      if not first_track:
+        try:
+          stream.skip_string('otrk')
+        except ValueError:
+          break
+
+      first_track = False
+
+      stream.read_int()
+      stream.skip_string('ptrk')
+      ptrk = stream.read_int()
+      crate.tracks.append(stream.read_string(ptrk, 'utf-16-be'))
+
+  if columns:
+    crate.columns = columns
+
+def generate(path: str, crates: int, tracks: int) -> list:
+  """Generate a directory of crates to benchmark against"""
+
+  paths = []
+
+  for i in range(crates):
+    crate = SeratoCrate()
+    crate.crate_name = 'Media%%%%Benchmark%%%%Crate %d' % i
+
+    for j in range(tracks):
+      crate.tracks.append('Music/Artist %d/Album ñ %d/%02d - Track %d.flac' % (i, i, j, j))
+
+    crate.write_crate(path)
+    paths.append(os.path.join(path, '%s.crate' % crate.crate_name))
+
+  return paths
+
+def state(crate: SeratoCrate) -> tuple:
+  """Return all loaded values of a crate for comparison"""
+
+  return (crate.crate_name, crate.version, crate.sort, crate.sort_rev, list(crate.columns), list(crate.tracks))
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description='Benchmark loading .crate files')
+  parser.add_argument('--crates', type=int, default=200, help='Number of crates to generate')
+  parser.add_argument('--tracks', type=int, default=500, help='Number of tracks per crate')
+  parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs')
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as path:
+    paths = generate(path, args.crates, args.tracks)
+
+    def load_buffer() -> list:
+      loaded = []
+      for crate_path in paths:
+        crate = SeratoCrate()
+        crate.load_crate(crate_path)
+        loaded.append(crate)
+      return loaded
+
+    def load_stream() -> list:
+      loaded = []
+      for crate_path in paths:
+        crate = SeratoCrate()
+        load_crate_stream(crate, crate_path)
+        loaded.append(crate)
+      return loaded
+
+    # Both parsers must produce identical crates
+    if [state(crate) for crate in load_buffer()] != [state(crate) for crate in load_stream()]:
+      raise SystemExit('Parsers produced different results')
+
+    stream_time = min(repeat(load_stream, number=1, repeat=args.repeat))
+    buffer_time = min(repeat(load_buffer, number=1, repeat=args.repeat))
+
+    print('%d crates x %d tracks' % (args.crates, args.tracks))
+    print('InputStream: %.3fs' % stream_time)
+    print('Buffer:      %.3fs (%.1fx)' % (buffer_time, stream_time / buffer_time))
+
+if __name__ == '__main__':
+  main()
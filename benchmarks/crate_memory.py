@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Benchmark the memory used by a tree of crates.
+
+This compares the memory used by a tree of MediaCrate objects against crates
+built on anytree's NodeMixin with a per instance __dict__ and their own copy
+of the default columns, as crates were originally implemented.
+
+Usage:
+  python benchmarks/crate_memory.py [--crates N] [--tracks N]
+
+"""
+import argparse
+import tracemalloc
+from typing import Callable
+from anytree import NodeMixin, PreOrderIter
+from cratedigger.media.crate import MediaCrate
+
+class NodeMixinCrate(NodeMixin):
+  """Crate with the attributes of the original NodeMixin based crates"""
+
+  def __init__(self, parent: NodeMixin = None) -> None:
+    self.version = '81.0'
+    self.sort = 'song'
+    self.sort_rev = 256
+    self.columns = ['song', 'artist', 'album', 'length']
+    self.tracks = []
+    self.crate_name = ''
+    self.crate_path = ''
+    self.parent = parent
+
+def build(crate_class: Callable, crates: int, tracks: int) -> object:
+  """Build a tree of crates, ten children per crate"""
+
+  root = crate_class()
+  nodes = [root]
+
+  for i in range(crates):
+    crate = crate_class(parent=nodes[i // 10])
+    crate.crate_name = 'Media%%%%C%%%%Music%%%%Crate %d' % i
+    crate.crate_path = 'Music/Crate %d' % i
+
+    for j in range(tracks):
+      crate.tracks.append('Music/Crate %d/%02d - Track %d.flac' % (i, j, j))
+
+    nodes.append(crate)
+
+  return root
+
+def measure(crate_class: Callable, crates: int, tracks: int) -> int:
+  """Measure the memory used by a tree of crates in bytes"""
+
+  tracemalloc.start()
+  root = build(crate_class, crates, tracks)
+  used = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+
+  # Ensure the tree is intact
+  assert len(list(PreOrderIter(root))) == crates + 1
+
+  return used
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description='Benchmark the memory used by a tree of crates')
+  parser.add_argument('--crates', type=int, default=50000, help='Number of crates to build')
+  parser.add_argument('--tracks', type=int, default=0, help='Number of tracks per crate')
+  args = parser.parse_args()
+
+  node_mixin = measure(NodeMixinCrate, args.crates, args.tracks)
+  slots = measure(MediaCrate, args.crates, args.tracks)
+
+  print('%d crates x %d tracks' % (args.crates, args.tracks))
+  print('NodeMixin: %.1f MiB (%d bytes per crate)' % (node_mixin / 1048576, node_mixin // args.crates))
+  print('Slots:     %.1f MiB (%d bytes per crate, %.1fx smaller)' % (slots / 1048576, slots // args.crates, node_mixin / slots))
+
+if __name__ == '__main__':
+  main()
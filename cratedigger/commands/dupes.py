@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+import logging
+import click
+from json import dumps
+from typing import Dict, List
+from anytree import PreOrderIter
+from cratedigger.media.cache import HashCache, ScanCache
+from cratedigger.media.dupes import DupeFinder
+from cratedigger.media.library import MediaLibrary
+from cratedigger.serato.crate import SeratoCrate
+from cratedigger.serato.library import SeratoLibrary
+from cratedigger.cli import Context, pass_context
+
+logger = logging.getLogger(__name__)
+
+@click.command('dupes', short_help='Find duplicate tracks in a media library')
+@click.option('--library-dir', type=click.Path(exists=True, file_okay=False, resolve_path=False), required=True, help='Folder containing music library')
+@click.option('--serato-dir', type=click.Path(exists=True, file_okay=False, resolve_path=False), help='Folder containing .crate files to rewrite, defaults to the Subcrates folder of the volume')
+@click.option('--no-cache', is_flag=True, help='Do not read or write the directory scan and hash caches')
+@click.option('--rebuild-cache', is_flag=True, help='Ignore the existing directory scan and hash caches and rebuild them')
+@click.option('--jobs', type=click.IntRange(min=1), default=1, show_default=True, help='Number of directories to scan and files to hash concurrently')
+@click.option('--json', 'as_json', is_flag=True, help='Print the duplicate groups as JSON')
+@click.option('--rewrite', is_flag=True, help='Rewrite crates to only reference the first copy of each duplicate track')
+@pass_context
+def cli(ctx: Context, library_dir: str, serato_dir: str, no_cache: bool, rebuild_cache: bool, jobs: int, as_json: bool, rewrite: bool) -> None:
+  """Find duplicate tracks in a given Media Library
+
+  This command scans a library directory in the same way as sync, and finds
+  tracks with identical contents. Each group of duplicates is printed with its
+  first copy, by path, followed by the other copies.
+
+  Tracks are first compared by size, then by a hash of their first and last
+  bytes, and only tracks which are still identical are hashed in full. Hashes
+  are cached between runs, and tracks which have not been modified since the
+  last run are not read again.
+
+  With --rewrite, crates in the Serato library which reference more than one
+  copy of a track are rewritten to only reference the first copy. Media crates
+  are not rewritten, as they mirror the folders of the media library.
+
+  """
+
+  if no_cache:
+    scan_cache = None
+    hash_cache = None
+  else:
+    # Load the caches, unless they are being rebuilt
+    scan_cache = ScanCache(ScanCache.default_path(library_dir))
+    hash_cache = HashCache(HashCache.default_path(library_dir))
+    if not rebuild_cache:
+      scan_cache.load()
+      hash_cache.load()
+
+  logger.info('Loading media library from %s' % library_dir)
+
+  # Read media library
+  media_library = MediaLibrary()
+  media_library.load(library_dir, scan_cache, jobs)
+
+  # Tracks of all crates, by their path on the filesystem
+  tracks = {} # type: Dict[str, str]
+  for crate in PreOrderIter(media_library.crates):
+    for track in crate.tracks:
+      tracks[media_library.resolve_track(track)] = track
+
+  logger.info('Comparing %d tracks' % len(tracks))
+
+  finder = DupeFinder(hash_cache, jobs)
+  groups = [[tracks[path] for path in group] for group in finder.find(tracks)]
+
+  logger.debug('Sampled %d tracks, hashed %d tracks in full' % (finder.sampled, finder.hashed))
+
+  # Save the caches for the next run
+  if scan_cache is not None:
+    scan_cache.save()
+  if hash_cache is not None:
+    hash_cache.save()
+
+  if as_json:
+    click.echo(dumps(groups, indent=2))
+  else:
+    for group in groups:
+      click.echo(group[0])
+
+      for track in group[1:]:
+        click.echo('  %s' % track)
+
+  logger.info('Found %d duplicate tracks in %d groups' % (sum(len(group) - 1 for group in groups), len(groups)))
+
+  if not rewrite or not groups:
+    return
+
+  # First copy of each duplicate track
+  replacements = {} # type: Dict[str, str]
+  for group in groups:
+    for track in group[1:]:
+      replacements[track] = group[0]
+
+  # Read Serato library
+  serato_library = SeratoLibrary()
+  try:
+    serato_library.load(library_dir, crates_path=serato_dir)
+  except (OSError, ValueError) as e:
+    raise click.ClickException('Failed to load Serato library: %s' % e)
+
+  # Media crates are regenerated from the folders on every sync
+  media_prefix = MediaLibrary.root_name + SeratoCrate.delimiter
+
+  rewritten = [] # type: List[SeratoCrate]
+  for crate in PreOrderIter(serato_library.crates):
+    if crate.source is None or crate.crate_name.startswith(media_prefix):
+      # Not loaded from a .crate file, or a media crate
+      continue
+
+    if crate.replace_tracks(replacements):
+      rewritten.append(crate)
+
+  if not ctx.dry_run:
+    logger.info('Rewriting %d crates in %s' % (len(rewritten), serato_library.crates_path))
+  else:
+    logger.info('Rewriting %d crates in %s (Dry Run)' % (len(rewritten), serato_library.crates_path))
+
+  stats = serato_library.write_crates(rewritten, ctx.dry_run, jobs)
+
+  for crate_name, error in sorted(stats.errors.items()):
+    # Report each crate which failed to write
+    logger.error('Failed to write crate %s: %s' % (crate_name, error))
+
+  logger.info('Crates: %s' % stats)
+
+  if stats.errors:
+    raise click.ClickException('Failed to write %d crates' % len(stats.errors))
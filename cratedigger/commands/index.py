@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import logging
+import time
+import click
+from json import dumps
+from typing import Any, Dict
+from cratedigger.media.arrays import ArrayIndex, require_numpy
+from cratedigger.media.cache import ScanCache
+from cratedigger.media.library import MediaLibrary
+from cratedigger.media.rules import DAY
+from cratedigger.cli import Context, pass_context
+
+logger = logging.getLogger(__name__)
+
+@click.command('index', short_help='Build and report on an array index of a media library')
+@click.option('--library-dir', type=click.Path(exists=True, file_okay=False, resolve_path=False), help='Folder containing music library to index')
+@click.option('--index', 'index_path', type=click.Path(dir_okay=False, resolve_path=False), help='Index file to save to, or to load from without --library-dir, defaults to one per library in the user cache directory')
+@click.option('--no-cache', is_flag=True, help='Do not read or write the directory scan cache')
+@click.option('--jobs', type=click.IntRange(min=1), default=1, show_default=True, help='Number of directories to scan and tracks to stat concurrently')
+@click.option('--top', type=click.IntRange(min=0), default=10, show_default=True, help='Number of largest crates to report')
+@click.option('--recent-days', type=click.FloatRange(min=0), default=30, show_default=True, help='Report the number of tracks modified within this many days')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON')
+@pass_context
+def cli(ctx: Context, library_dir: str, index_path: str, no_cache: bool, jobs: int, top: int, recent_days: float, as_json: bool) -> None:
+  """Build and report on an array index of a given Media Library
+
+  This command scans a library directory in the same way as sync, and stores
+  the crates and tracks of the library as NumPy arrays in an index file. If no
+  library directory is given, an existing index file is loaded instead, which
+  does not touch the library at all.
+
+  The report lists the number of tracks and their total size, a histogram of
+  track extensions, the number of recently modified tracks and the largest
+  crates, including all of their subcrates.
+
+  NumPy is required, and can be installed with "pip install cratedigger[numpy]".
+
+  """
+
+  if library_dir is None and index_path is None:
+    raise click.UsageError('Either --library-dir or --index is required')
+
+  try:
+    # Fail before scanning the library rather than once it has been scanned
+    require_numpy()
+
+    if library_dir is not None:
+      if index_path is None:
+        index_path = ArrayIndex.default_path(library_dir)
+
+      if no_cache:
+        cache = None
+      else:
+        cache = ScanCache(ScanCache.default_path(library_dir))
+        cache.load()
+
+      logger.info('Loading media library from %s' % library_dir)
+
+      # Read media library
+      media_library = MediaLibrary()
+      media_library.load(library_dir, cache, jobs)
+
+      if cache is not None:
+        # Save the cache for the next run
+        cache.save()
+
+      index = ArrayIndex.build(media_library, jobs)
+
+      if not ctx.dry_run:
+        logger.info('Saving index of %d tracks to %s' % (len(index), index_path))
+
+        try:
+          index.save(index_path)
+        except OSError as e:
+          raise click.ClickException('Failed to save index %s: %s' % (index_path, e))
+      else:
+        logger.info('Saving index of %d tracks to %s (Dry Run)' % (len(index), index_path))
+    else:
+      logger.info('Loading index from %s' % index_path)
+
+      try:
+        index = ArrayIndex.load(index_path)
+      except (OSError, ValueError) as e:
+        raise click.ClickException('Failed to load index %s: %s' % (index_path, e))
+  except ImportError as e:
+    raise click.ClickException(str(e))
+
+  subtree_sizes = index.subtree_sizes()
+  subtree_counts = index.subtree_counts()
+
+  # Largest crates first, ties in crate order
+  largest = (-subtree_sizes).argsort(kind='stable')[:top]
+
+  report = {
+    'tracks': len(index),
+    'crates': len(index.crate_names),
+    'size': int(index.sizes.sum()),
+    'extensions': index.extension_histogram(),
+    'recent': len(index.filter_mtime(start=time.time() - recent_days * DAY)),
+    'largest': [
+      {
+        'crate': index.crate_names[crate_id],
+        'tracks': int(subtree_counts[crate_id]),
+        'size': int(subtree_sizes[crate_id])
+      } for crate_id in largest
+    ]
+  } # type: Dict[str, Any]
+
+  if as_json:
+    click.echo(dumps(report, indent=2))
+    return
+
+  click.echo('Tracks: %d (%d bytes) in %d crates' % (report['tracks'], report['size'], report['crates']))
+  click.echo('Modified in the last %g days: %d' % (recent_days, report['recent']))
+
+  click.echo('Extensions:')
+  for extension, count in report['extensions'].items():
+    click.echo('  %s: %d' % (extension or '(none)', count))
+
+  if report['largest']:
+    click.echo('Largest crates:')
+    for crate in report['largest']:
+      click.echo('  %s: %d tracks (%d bytes)' % (crate['crate'], crate['tracks'], crate['size']))
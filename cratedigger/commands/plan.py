@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import logging
+import os
+import click
+from json import dumps
+from typing import Iterable
+from anytree import PreOrderIter
+from cratedigger.media.cache import ScanCache
+from cratedigger.media.library import MediaLibrary
+from cratedigger.media.plan import SyncPlan
+from cratedigger.serato.crate import SeratoCrate
+from cratedigger.serato.library import SeratoLibrary
+from cratedigger.cli import Context, pass_context
+
+logger = logging.getLogger(__name__)
+
+@click.command('plan', short_help='Show the changes a sync would make to a Serato library')
+@click.option('--library-dir', type=click.Path(exists=True, file_okay=False, resolve_path=False), required=True, help='Folder containing music library')
+@click.option('--serato-dir', type=click.Path(exists=True, file_okay=False, resolve_path=False), help='Folder containing _Serato_ directory, defaults to drive/volume that music library is on')
+@click.option('--no-cache', is_flag=True, help='Do not read or write the directory scan cache')
+@click.option('--jobs', type=click.IntRange(min=1), default=1, show_default=True, help='Number of directories to scan concurrently')
+@click.option('--recursive-tracks', is_flag=True, help='Include the tracks of all subfolders in each crate')
+@click.option('--prune', is_flag=True, help='Also plan the deletion of crates on this volume which would not be produced by the sync')
+@click.option('--json', 'as_json', is_flag=True, help='Print the plan as JSON')
+@click.option('--check', is_flag=True, help='Exit with an error if any crate would be created, changed or deleted')
+@pass_context
+def cli(ctx: Context, library_dir: str, serato_dir: str, no_cache: bool, jobs: int, recursive_tracks: bool, prune: bool, as_json: bool, check: bool) -> None:
+  """Show the changes a sync of a given Media Library would make
+
+  This command loads a library directory in the same way as sync, and loads
+  the existing .crate files of the Serato library without writing anything.
+  Each crate which would be created, changed or deleted by a sync with the
+  same options is printed, along with the tracks which would be added to or
+  removed from it.
+
+  Existing crates are compared by their sets of tracks, so a plan takes time
+  linear in the size of the library, and existing .crate files are only
+  parsed one at a time.
+
+  With --check, the command fails if a sync would change anything, so it can
+  be used to check that a Serato library is in sync.
+
+  """
+
+  if no_cache:
+    cache = None
+  else:
+    # Load the directory scan cache
+    cache = ScanCache(ScanCache.default_path(library_dir))
+    cache.load()
+
+  logger.info('Loading media library from %s' % library_dir)
+
+  # Read media library
+  media_library = MediaLibrary()
+  media_library.load(library_dir, cache, jobs)
+
+  logger.info('Loaded %d media library crates' % len(media_library))
+
+  if serato_dir is not None:
+    # Override crates_path if --serato-dir provided
+    logger.info('Overriding Serato directory to %s' % serato_dir)
+    media_library.crates_path = serato_dir
+
+  if os.path.isdir(media_library.crates_path):
+    logger.info('Loading Serato library from %s' % media_library.crates_path)
+
+    # Only the names of existing crates are read up front
+    serato_library = SeratoLibrary()
+    serato_library.load(library_dir, lazy=True, crates_path=media_library.crates_path)
+
+    logger.info('Loaded %d Serato crates' % len(serato_library))
+  else:
+    # Nothing has been synced yet, so every crate is new
+    serato_library = None
+
+  if recursive_tracks:
+    crates = media_library.iter_recursive_crates() # type: Iterable[SeratoCrate]
+  else:
+    crates = PreOrderIter(media_library.crates)
+
+  if prune:
+    # Same prefix as MediaLibrary.prune
+    prune_prefix = MediaLibrary.root_name + SeratoCrate.delimiter + media_library.volume
+  else:
+    prune_prefix = None
+
+  plan = SyncPlan(media_library.crates_path)
+  plan.compare(crates, serato_library, prune_prefix)
+
+  if cache is not None:
+    # Save the directory scan cache for the next run
+    cache.save()
+
+  changes = plan.changes
+
+  if as_json:
+    click.echo(dumps(plan.to_dict(), indent=2))
+  else:
+    for crate_plan in changes:
+      click.echo(str(crate_plan))
+
+      for track in crate_plan.added:
+        click.echo('  + %s' % track)
+
+      for track in crate_plan.removed:
+        click.echo('  - %s' % track)
+
+  logger.info('Plan: %s' % plan)
+
+  if check and changes:
+    raise click.ClickException('%d crates are out of sync' % len(changes))
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import logging
+import click
+from cratedigger.media.cache import ScanCache, TagCache
+from cratedigger.media.index import TrackIndex
+from cratedigger.media.library import MediaLibrary
+from cratedigger.media.rules import SmartRules
+from cratedigger.media.tags import TagReader
+from cratedigger.cli import Context, pass_context
+
+logger = logging.getLogger(__name__)
+
+@click.command('smart', short_help='Create smart crates from a rules file')
+@click.option('--library-dir', type=click.Path(exists=True, file_okay=False, resolve_path=False), required=True, help='Folder containing music library')
+@click.option('--rules', 'rules_path', type=click.Path(exists=True, dir_okay=False, resolve_path=False), required=True, help='JSON file containing smart crate rules')
+@click.option('--serato-dir', type=click.Path(exists=True, file_okay=False, resolve_path=False), help='Folder to write .crate files to, defaults to the Subcrates folder of the volume')
+@click.option('--prefix', default='Smart', show_default=True, help='Name of the crate that all smart crates are grouped under')
+@click.option('--no-cache', is_flag=True, help='Do not read or write the directory scan and tag caches')
+@click.option('--rebuild-cache', is_flag=True, help='Ignore the existing directory scan and tag caches and rebuild them')
+@click.option('--jobs', type=click.IntRange(min=1), default=1, show_default=True, help='Number of directories to scan and tracks to read concurrently')
+@click.option('--prune', is_flag=True, help='Delete smart crates which are no longer produced by the rules')
+@pass_context
+def cli(ctx: Context, library_dir: str, rules_path: str, serato_dir: str, prefix: str, no_cache: bool, rebuild_cache: bool, jobs: int, prune: bool) -> None:
+  """Create smart crates from a rules file
+
+  This command scans a library directory in the same way as sync, and indexes
+  the path, extension, size, modification time and directory of every track.
+  Each rule in the rules file is then evaluated against the index, and the
+  matching tracks are written as a crate under the given prefix.
+
+  If any rule uses a tag field (title, artist, bpm, key or duration), the tags
+  of all tracks are read as well.
+
+  """
+
+  try:
+    rules = SmartRules.load(rules_path)
+
+    # Check all conditions before scanning the library
+    rules.compile(TrackIndex(tags=rules.uses_tags))
+  except ValueError as e:
+    raise click.ClickException('Invalid rules file %s: %s' % (rules_path, e))
+
+  if no_cache:
+    cache = None
+    tag_cache = None
+  else:
+    # Load the caches, unless they are being rebuilt
+    cache = ScanCache(ScanCache.default_path(library_dir))
+    if not rebuild_cache:
+      cache.load()
+
+    if rules.uses_tags:
+      tag_cache = TagCache(TagCache.default_path(library_dir))
+      if not rebuild_cache:
+        tag_cache.load()
+    else:
+      tag_cache = None
+
+  logger.info('Loading media library from %s' % library_dir)
+
+  # Read media library
+  media_library = MediaLibrary()
+  media_library.load(library_dir, cache, jobs)
+
+  # Index all tracks, along with their tags if needed
+  if rules.uses_tags:
+    with TagReader(tag_cache, jobs) as reader:
+      index = TrackIndex.build(media_library, jobs, reader)
+  else:
+    index = TrackIndex.build(media_library, jobs)
+
+  logger.info('Indexed %d tracks' % len(index))
+
+  if cache is not None:
+    # Save the caches for the next run
+    cache.save()
+
+  if tag_cache is not None:
+    tag_cache.save()
+
+  crates = rules.evaluate(index, prefix)
+
+  if serato_dir is not None:
+    # Override crates_path if --serato-dir provided
+    logger.info('Overriding Serato directory to %s' % serato_dir)
+    media_library.crates_path = serato_dir
+
+  if not ctx.dry_run:
+    logger.info('Writing %d smart crates to %s' % (len(crates), media_library.crates_path))
+  else:
+    logger.info('Writing %d smart crates to %s (Dry Run)' % (len(crates), media_library.crates_path))
+
+  stats = media_library.write_crates(crates, ctx.dry_run, jobs)
+
+  if prune:
+    # Delete smart crates of rules which no longer exist
+    media_library.prune_crates(prefix, stats, ctx.dry_run)
+
+  for crate_name, error in sorted(stats.errors.items()):
+    # Report each crate which failed to write
+    logger.error('Failed to write crate %s: %s' % (crate_name, error))
+
+  logger.info('Crates: %s' % stats)
+
+  if stats.errors:
+    raise click.ClickException('Failed to write %d crates' % len(stats.errors))
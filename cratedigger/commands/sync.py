@@ -1,45 +1,289 @@
 #!/usr/bin/env python3
 import logging
 import click
+from typing import Dict, List, Tuple
+from cratedigger.media.batch import LibraryBatch
+from cratedigger.media.cache import ScanCache, SnapshotCache, TagCache
+from cratedigger.media.engine import AsyncEngine
 from cratedigger.media.library import MediaLibrary
+from cratedigger.media.tags import TAG_FIELDS, TagReader
 from cratedigger.cli import Context, pass_context
 
 logger = logging.getLogger(__name__)
 
 @click.command('sync', short_help='Run a sync operation')
-@click.option('--library-dir', type=click.Path(exists=True, file_okay=False, resolve_path=False), required=True, help='Folder containing music library')
+@click.option('--library-dir', 'library_dirs', type=click.Path(exists=True, file_okay=False, resolve_path=False), multiple=True, help='Folder containing music library, may be given more than once')
+@click.option('--manifest', type=click.Path(exists=True, dir_okay=False, resolve_path=False), help='File listing music library folders to sync, one per line')
 @click.option('--serato-dir', type=click.Path(exists=True, file_okay=False, resolve_path=False), help='Folder containing _Serato_ directory, defaults to drive/volume that music library is on')
+@click.option('--no-cache', is_flag=True, help='Do not read or write the directory scan cache')
+@click.option('--rebuild-cache', is_flag=True, help='Ignore the existing directory scan cache and rebuild it')
+@click.option('--jobs', type=click.IntRange(min=1), default=1, show_default=True, help='Number of directories to scan concurrently')
+@click.option('--write-jobs', type=click.IntRange(min=1), help='Number of crates to write concurrently, defaults to --jobs')
+@click.option('--recursive-tracks', is_flag=True, help='Include the tracks of all subfolders in each crate')
+@click.option('--engine', type=click.Choice(['sync', 'async']), default='sync', show_default=True, help='Engine to scan and write with, async lists folders and writes crates at the same time')
+@click.option('--stream', is_flag=True, help='Write each crate as soon as its folder is scanned, without loading the whole library')
+@click.option('--prune', is_flag=True, help='Delete crates on this volume which were not produced by this sync')
+@click.option('--merge', is_flag=True, help='Merge crates with their existing .crate files, keeping tracks added or reordered in Serato')
+@click.option('--sort-tracks', type=click.Choice(TAG_FIELDS), help='Read the tags of all tracks and sort the tracks of each crate by this field')
 @pass_context
-def cli(ctx: Context, library_dir: str, serato_dir: str) -> None:
+def cli(ctx: Context, library_dirs: Tuple[str, ...], manifest: str, serato_dir: str, no_cache: bool, rebuild_cache: bool, jobs: int, write_jobs: int, recursive_tracks: bool, engine: str, stream: bool, prune: bool, merge: bool, sort_tracks: str) -> None:
   """Sync a given Media Library with a Serato Library
 
   This command takes a library directory and loads all media crates within it.
   It then writes the media crates to the Serato subcrates directory as .crate
   files.
 
+  Directory listings are cached between runs, and directories which have not
+  been modified since the last run are not listed again. On high latency
+  volumes, such as network shares, --jobs can be used to scan several
+  directories concurrently, and --write-jobs to write several crates
+  concurrently.
+
+  With --recursive-tracks, each crate also contains the tracks of all of the
+  folders beneath it.
+
+  With --engine async, folders are listed, crates are built and crates are
+  written all at the same time on an asyncio event loop, with up to --jobs
+  listings and --write-jobs writes in flight. This produces the same crates,
+  but hides the latency of each listing and write on network volumes.
+
+  With --stream, crates are written while the library is still being scanned,
+  rather than after the whole library has been loaded. This produces the same
+  crates, but only holds the folders currently being scanned and written in
+  memory.
+
+  With --prune, crates under the Media/<volume> prefix which were not produced
+  by this sync, such as the crates of renamed or removed folders, are deleted.
+
+  With --merge, each crate is merged with its existing .crate file rather than
+  replaced. Only the tracks added to or removed from its folder since the last
+  merge are applied, and tracks added or reordered in Serato are kept.
+
+  With --sort-tracks, the tags of all tracks are read, and the tracks of each
+  crate are sorted by the given field. Tags are cached between runs, so only
+  new or modified tracks are read again.
+
+  Several libraries can be synced at once by giving --library-dir more than
+  once, or by listing them in a --manifest file. All of them are scanned
+  concurrently into a single tree, crates are written grouped by their
+  Subcrates folder, and each volume crate is only written once.
+
   """
 
-  logger.info('Loading media library from %s' % library_dir)
+  dirs = list(library_dirs)
+
+  if manifest is not None:
+    try:
+      dirs.extend(LibraryBatch.read_manifest(manifest))
+    except (OSError, ValueError) as e:
+      raise click.ClickException('Invalid manifest %s: %s' % (manifest, e))
+
+  if not dirs:
+    raise click.UsageError('At least one --library-dir or a --manifest is required')
+
+  if len(dirs) > 1:
+    if stream or merge or sort_tracks is not None or engine == 'async':
+      # These are tied to the caches and crates of a single library
+      raise click.UsageError('--stream, --merge, --sort-tracks and --engine async cannot be used with more than one library')
+
+    sync_batch(ctx, dirs, serato_dir, no_cache, rebuild_cache, jobs, write_jobs or jobs, recursive_tracks, prune)
+    return
+
+  library_dir = dirs[0]
+
+  if stream and recursive_tracks:
+    # Recursive crates can only be produced once all subfolders are scanned
+    raise click.UsageError('--stream cannot be used with --recursive-tracks')
+
+  if engine == 'async' and (stream or recursive_tracks):
+    # The async engine already writes crates as folders are listed
+    raise click.UsageError('--engine async cannot be used with --stream or --recursive-tracks')
+
+  if no_cache:
+    cache = None
+    tag_cache = None
+  else:
+    # Load the directory scan cache, unless it is being rebuilt
+    cache = ScanCache(ScanCache.default_path(library_dir))
+    if not rebuild_cache:
+      cache.load()
+
+    if sort_tracks is not None:
+      # Load the tag cache, only needed when reading tags
+      tag_cache = TagCache(TagCache.default_path(library_dir))
+      if not rebuild_cache:
+        tag_cache.load()
+    else:
+      tag_cache = None
+
+  if merge:
+    # Load the snapshot of the last merge, regardless of the other caches as
+    # it is the base of the merge rather than a cache
+    snapshots = SnapshotCache(SnapshotCache.default_path(library_dir))
+    snapshots.load()
+  else:
+    snapshots = None
+
+  if write_jobs is None:
+    write_jobs = jobs
 
-  # Read media library
   media_library = MediaLibrary()
-  media_library.load(library_dir)
 
-  logger.info('Loaded %d media library crates' % len(media_library))
+  if engine == 'async':
+    logger.info('Loading media library from %s (Async)' % library_dir)
+
+    # Determine the volume, crates are only loaded once writing starts
+    media_library.open(library_dir, cache)
+  elif stream:
+    logger.info('Streaming media library from %s' % library_dir)
+
+    # Determine the volume, crates are only produced once writing starts
+    crates = media_library.stream(library_dir, cache, jobs)
+  else:
+    logger.info('Loading media library from %s' % library_dir)
+
+    # Read media library
+    media_library.load(library_dir, cache, jobs)
+
+    logger.info('Loaded %d media library crates' % len(media_library))
 
   if serato_dir is not None:
     # Override crates_path if --serato-dir provided
     logger.info('Overriding Serato directory to %s' % serato_dir)
     media_library.crates_path = serato_dir
 
-  if ctx.verbose:
+  if ctx.verbose and not stream and engine == 'sync':
     # Print rendered tree of library
     logger.debug('Rendering media library tree')
     logger.debug('\n%s' % media_library.render())
   
-  # Write the library crates 
+  # Write the library crates, only crates with changed contents are written
   if not ctx.dry_run:
     logger.info('Writing media library crates to %s' % media_library.crates_path)
-    media_library.write()
   else:
     logger.info('Writing media library crates to %s (Dry Run)' % media_library.crates_path)
+
+  if sort_tracks is not None:
+    # Read track tags on the same number of threads as scanning
+    reader = TagReader(tag_cache, jobs)
+  else:
+    reader = None
+
+  try:
+    if engine == 'async':
+      # Scan and write the library crates at the same time
+      stats = AsyncEngine(media_library, jobs, write_jobs, sort_tracks, reader, merge, snapshots).sync(ctx.dry_run)
+
+      logger.info('Loaded %d media library crates' % len(media_library))
+    elif stream:
+      if sort_tracks is not None:
+        crates = media_library.sort_crates(crates, sort_tracks, reader)
+
+      if merge:
+        crates = media_library.merge_crates(crates, snapshots)
+
+      # Scan and write the library crates at the same time
+      stats = media_library.write_crates(crates, ctx.dry_run, write_jobs)
+    else:
+      stats = media_library.write(ctx.dry_run, write_jobs, recursive_tracks, sort_tracks, reader, merge, snapshots)
+  finally:
+    if reader is not None:
+      reader.close()
+
+  if prune:
+    # Delete crates which were not produced by this sync
+    media_library.prune(stats, ctx.dry_run)
+
+  if cache is not None:
+    # Save the directory scan cache for the next run
+    logger.debug('Scan cache: %d hits, %d misses' % (cache.hits, cache.misses))
+    cache.save()
+
+  if snapshots is not None and not ctx.dry_run:
+    for crate_name in stats.errors:
+      # Keep merging failed crates against what was last written
+      snapshots.revert(crate_name)
+
+    # Save the snapshot as the base of the next merge
+    snapshots.save()
+
+  if tag_cache is not None:
+    # Save the tag cache for the next run
+    logger.debug('Tag cache: %d hits, %d misses' % (tag_cache.hits, tag_cache.misses))
+    tag_cache.save()
+
+  for crate_name, error in sorted(stats.errors.items()):
+    # Report each crate which failed to write
+    logger.error('Failed to write crate %s: %s' % (crate_name, error))
+
+  logger.info('Crates: %s' % stats)
+
+  if stats.errors:
+    raise click.ClickException('Failed to write %d crates' % len(stats.errors))
+
+def sync_batch(ctx: Context, library_dirs: List[str], serato_dir: str, no_cache: bool, rebuild_cache: bool, jobs: int, write_jobs: int, recursive_tracks: bool, prune: bool) -> None:
+  """Sync a number of Media Libraries with their Serato Libraries at once.
+
+  Args:
+    ctx (obj:`Context`): Context of the command
+    library_dirs (obj:`list` of str): Folders containing music libraries
+    serato_dir (str): Folder to write all crates to, if overridden
+    no_cache (bool): Do not read or write the directory scan caches
+    rebuild_cache (bool): Ignore the existing directory scan caches
+    jobs (int): Number of directories to scan concurrently in each library
+    write_jobs (int): Number of crates to write concurrently
+    recursive_tracks (bool): Include the tracks of all subfolders in each crate
+    prune (bool): Delete crates which were not produced by this sync
+
+  """
+
+  caches = {} # type: Dict[str, ScanCache]
+
+  if not no_cache:
+    for library_dir in library_dirs:
+      # Each library keeps its own directory scan cache
+      cache = ScanCache(ScanCache.default_path(library_dir))
+      if not rebuild_cache:
+        cache.load()
+
+      caches[library_dir] = cache
+
+  logger.info('Loading %d media libraries from %s' % (len(library_dirs), ', '.join(library_dirs)))
+
+  batch = LibraryBatch()
+  batch.load(library_dirs, caches, jobs)
+
+  logger.info('Loaded %d media library crates' % len(batch))
+
+  if serato_dir is not None:
+    # Override crates_path of every library if --serato-dir provided
+    logger.info('Overriding Serato directory to %s' % serato_dir)
+    for library in batch.libraries:
+      library.crates_path = serato_dir
+
+  if ctx.verbose:
+    # Print rendered tree of all libraries
+    logger.debug('Rendering media library tree')
+    logger.debug('\n%s' % batch.render())
+
+  results = batch.write(ctx.dry_run, write_jobs, recursive_tracks)
+
+  if prune:
+    # Delete crates which were not produced by this sync
+    batch.prune(results, ctx.dry_run)
+
+  for cache in caches.values():
+    # Save the directory scan caches for the next run
+    cache.save()
+
+  errors = 0
+  for crates_path, stats in results.items():
+    for crate_name, error in sorted(stats.errors.items()):
+      # Report each crate which failed to write
+      logger.error('Failed to write crate %s: %s' % (crate_name, error))
+
+    logger.info('Crates in %s: %s' % (crates_path, stats))
+    errors += len(stats.errors)
+
+  if errors:
+    raise click.ClickException('Failed to write %d crates' % errors)
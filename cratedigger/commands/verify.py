@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import logging
+import click
+from json import dumps
+from typing import Dict, List
+from anytree import PreOrderIter
+from cratedigger.serato.library import SeratoLibrary
+from cratedigger.cli import Context, pass_context
+
+logger = logging.getLogger(__name__)
+
+@click.command('verify', short_help='Find missing tracks in a Serato library')
+@click.option('--volume-dir', type=click.Path(exists=True, file_okay=False, resolve_path=False), required=True, help='Folder on the volume of the Serato library, such as /Volumes/Music')
+@click.option('--serato-dir', type=click.Path(exists=True, file_okay=False, resolve_path=False), help='Folder containing .crate files, defaults to the Subcrates folder of the volume')
+@click.option('--jobs', type=click.IntRange(min=1), default=1, show_default=True, help='Number of directories to check concurrently')
+@click.option('--json', 'as_json', is_flag=True, help='Print the missing tracks of each crate as JSON')
+@click.option('--clean', is_flag=True, help='Remove missing tracks from their crates')
+@pass_context
+def cli(ctx: Context, volume_dir: str, serato_dir: str, jobs: int, as_json: bool, clean: bool) -> None:
+  """Find tracks in a Serato library which no longer exist
+
+  This command loads all crates of the Serato library on a volume, and checks
+  whether each of their tracks still exists on the volume. Each crate with
+  missing tracks is printed along with the missing tracks.
+
+  The tracks of all crates are deduplicated and checked once per directory, so
+  large libraries can be checked without a stat for every track reference. On
+  high latency volumes, --jobs can be used to check several directories
+  concurrently.
+
+  With --clean, the missing tracks are removed from their crates, and the
+  crates are written back to the Serato library.
+
+  """
+
+  # Read Serato library
+  logger.info('Loading Serato library from %s' % volume_dir)
+
+  serato_library = SeratoLibrary()
+  try:
+    serato_library.load(volume_dir, crates_path=serato_dir)
+  except ValueError as e:
+    # No Serato library on the volume, or a crate which can't be parsed
+    raise click.ClickException('Failed to load Serato library: %s' % e)
+
+  logger.info('Loaded %d Serato crates' % len(serato_library))
+
+  # Check all tracks against the volume
+  logger.info('Checking tracks against %s' % serato_library.volume_path)
+  missing = serato_library.find_missing_tracks(jobs)
+
+  # Missing tracks of each crate, in crate order
+  report = {} # type: Dict[str, List[str]]
+  for crate in PreOrderIter(serato_library.crates):
+    crate_missing = [track for track in crate.tracks if track in missing]
+
+    if crate_missing:
+      # Only report each missing track once per crate
+      report[crate.crate_name] = list(dict.fromkeys(crate_missing))
+
+  if as_json:
+    click.echo(dumps(report, indent=2))
+  else:
+    for crate_name, tracks in report.items():
+      click.echo('%s (%d missing)' % (crate_name, len(tracks)))
+
+      for track in tracks:
+        click.echo('  %s' % track)
+
+  logger.info('Found %d missing tracks in %d crates' % (len(missing), len(report)))
+
+  if not clean or not report:
+    return
+
+  # Remove missing tracks from the affected crates
+  cleaned = []
+  for crate in PreOrderIter(serato_library.crates):
+    if crate.crate_name in report:
+      crate.remove_tracks(missing)
+      cleaned.append(crate)
+
+  if not ctx.dry_run:
+    logger.info('Writing cleaned crates to %s' % serato_library.crates_path)
+  else:
+    logger.info('Writing cleaned crates to %s (Dry Run)' % serato_library.crates_path)
+
+  stats = serato_library.write_crates(cleaned, ctx.dry_run, jobs)
+
+  for crate_name, error in sorted(stats.errors.items()):
+    # Report each crate which failed to write
+    logger.error('Failed to write crate %s: %s' % (crate_name, error))
+
+  logger.info('Crates: %s' % stats)
+
+  if stats.errors:
+    raise click.ClickException('Failed to write %d crates' % len(stats.errors))
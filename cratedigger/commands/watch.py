@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+import logging
+import click
+from typing import Iterable, List, Set, Tuple
+from anytree import PreOrderIter
+from cratedigger.media.cache import ScanCache
+from cratedigger.media.crate import MediaCrate
+from cratedigger.media.library import MediaLibrary
+from cratedigger.media.watch import Watcher, create_watcher
+from cratedigger.serato.library import WriteStats
+from cratedigger.cli import Context, pass_context
+
+logger = logging.getLogger(__name__)
+
+@click.command('watch', short_help='Keep a Serato library in sync as folders change')
+@click.option('--library-dir', type=click.Path(exists=True, file_okay=False, resolve_path=False), required=True, help='Folder containing music library')
+@click.option('--serato-dir', type=click.Path(exists=True, file_okay=False, resolve_path=False), help='Folder containing _Serato_ directory, defaults to drive/volume that music library is on')
+@click.option('--no-cache', is_flag=True, help='Do not read or write the directory scan cache')
+@click.option('--rebuild-cache', is_flag=True, help='Ignore the existing directory scan cache and rebuild it')
+@click.option('--jobs', type=click.IntRange(min=1), default=1, show_default=True, help='Number of directories to scan and crates to write concurrently')
+@click.option('--prune', is_flag=True, help='Delete crates on this volume which were not produced by the initial sync, and the crates of removed folders')
+@click.option('--debounce', type=click.FloatRange(min=0), default=2.0, show_default=True, help='Seconds without changes to wait for before updating crates')
+@click.option('--polling', is_flag=True, help='Poll folders for changes even if inotify is available')
+@click.option('--poll-interval', type=click.FloatRange(min=0.1), default=2.0, show_default=True, help='Seconds between polls of all folders when polling')
+@pass_context
+def cli(ctx: Context, library_dir: str, serato_dir: str, no_cache: bool, rebuild_cache: bool, jobs: int, prune: bool, debounce: float, polling: bool, poll_interval: float) -> None:
+  """Keep a given Media Library in sync with a Serato Library
+
+  This command syncs a library directory in the same way as sync, and then
+  watches all of its folders for changes until it is interrupted. Only the
+  folders which changed are listed again, and only their crates are written.
+
+  Changes are collected until none have been made for the debounce period, so
+  copying an album results in a single update of its crate. Folders are
+  watched with inotify on Linux, and otherwise by polling the modification
+  time of every folder.
+
+  With --prune, stale crates are deleted after the initial sync as with sync,
+  and the crates of folders which are removed while watching are deleted.
+
+  """
+
+  if no_cache:
+    cache = None
+  else:
+    # Load the directory scan cache, unless it is being rebuilt
+    cache = ScanCache(ScanCache.default_path(library_dir))
+    if not rebuild_cache:
+      cache.load()
+
+  logger.info('Loading media library from %s' % library_dir)
+
+  # Read media library
+  media_library = MediaLibrary()
+  media_library.load(library_dir, cache, jobs)
+
+  logger.info('Loaded %d media library crates' % len(media_library))
+
+  if serato_dir is not None:
+    # Override crates_path if --serato-dir provided
+    logger.info('Overriding Serato directory to %s' % serato_dir)
+    media_library.crates_path = serato_dir
+
+  if not ctx.dry_run:
+    logger.info('Writing media library crates to %s' % media_library.crates_path)
+  else:
+    logger.info('Writing media library crates to %s (Dry Run)' % media_library.crates_path)
+
+  stats = media_library.write(ctx.dry_run, jobs)
+
+  if prune:
+    # Delete crates which were not produced by the initial sync
+    media_library.prune(stats, ctx.dry_run)
+
+  report(stats)
+
+  # Folders of all crates, other than the volume crate
+  folders = {
+    media_library.folder_path(crate) for crate in PreOrderIter(media_library.crates)
+    if crate is not media_library.crates
+  } # type: Set[str]
+
+  try:
+    with create_watcher(folders, polling, poll_interval) as watcher:
+      logger.info('Watching %d folders in %s for changes' % (len(folders), library_dir))
+
+      while True:
+        paths = watcher.wait(debounce)
+        logger.debug('Rescanning %d changed folders' % len(paths))
+
+        changed, removed = rescan(media_library, watcher, folders, paths, jobs)
+
+        if not changed and not removed:
+          continue
+
+        logger.info('Updating %d changed and %d removed crates' % (len(changed), len(removed)))
+
+        stats = media_library.write_crates(changed, ctx.dry_run, jobs)
+
+        if prune and removed:
+          # Delete the crates of removed folders
+          media_library.delete_crates((crate.crate_name for crate in removed), stats, ctx.dry_run)
+
+        report(stats)
+  except KeyboardInterrupt:
+    logger.info('Stopped watching %s' % library_dir)
+  finally:
+    if cache is not None:
+      # Save the directory scan cache for the next run
+      cache.save()
+
+def rescan(media_library: MediaLibrary, watcher: Watcher, folders: Set[str], paths: Iterable[str], jobs: int) -> Tuple[List[MediaCrate], List[MediaCrate]]:
+  """Rescan changed folders, and watch or stop watching added or removed folders.
+
+  A new folder is only watched once it has been listed, so each new folder is
+  listed once more after its watch is added, to pick up any tracks or
+  subfolders created in between. This repeats until no new folders are found.
+
+  Args:
+    media_library (obj:`MediaLibrary`): Loaded media library
+    watcher (obj:`Watcher`): Watcher of the library folders
+    folders (obj:`set` of str): Paths of the watched folders, updated in place
+    paths (obj:`iterable` of str): Paths of the changed folders
+    jobs (int): Number of new folders to scan concurrently
+
+  Returns:
+    changes (obj:`tuple`): Tuple of the crates which changed or were added,
+                           and the crates which were removed
+
+  """
+
+  changed = [] # type: List[MediaCrate]
+  removed = [] # type: List[MediaCrate]
+
+  # Crates already in changed, as a crate can change in several passes
+  seen = set() # type: Set[MediaCrate]
+
+  while paths:
+    rescanned, rescan_removed = media_library.rescan(paths, jobs)
+
+    for crate in rescan_removed:
+      # Stop watching removed folders
+      path = media_library.folder_path(crate)
+      folders.discard(path)
+      watcher.remove(path)
+
+    removed.extend(rescan_removed)
+
+    new_paths = [] # type: List[str]
+    for crate in rescanned:
+      if crate not in seen:
+        seen.add(crate)
+        changed.append(crate)
+
+      path = media_library.folder_path(crate)
+      if path in folders:
+        continue
+
+      # Start watching new folders
+      try:
+        watcher.add(path)
+      except OSError as e:
+        logger.warning('Unable to watch %s for changes: %s' % (path, e))
+
+      folders.add(path)
+      new_paths.append(path)
+
+    paths = new_paths
+
+  if removed:
+    # Folders which were added and removed again are only removed
+    removed_crates = set(removed)
+    changed = [crate for crate in changed if crate not in removed_crates]
+
+  return changed, removed
+
+def report(stats: WriteStats) -> None:
+  """Log the results of writing crates.
+
+  Args:
+    stats (obj:`WriteStats`): Stats of the write
+
+  """
+
+  for crate_name, error in sorted(stats.errors.items()):
+    # Report each crate which failed to write, but keep watching
+    logger.error('Failed to write crate %s: %s' % (crate_name, error))
+
+  logger.info('Crates: %s' % stats)
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+import os
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from logging import getLogger
+from typing import Any, Dict, Iterable, List, Optional
+from anytree import PreOrderIter
+from cratedigger.media.cache import user_cache_dir
+from cratedigger.media.index import TrackIndex
+
+try:
+  import numpy
+  HAVE_NUMPY = True
+except ImportError:
+  # NumPy is an optional dependency, only needed for array indexes
+  HAVE_NUMPY = False
+
+# Logging
+logger = getLogger(__name__)
+
+def require_numpy() -> None:
+  """Ensure that NumPy is available.
+
+  Raises:
+    ImportError: If NumPy is not installed
+
+  """
+
+  if not HAVE_NUMPY:
+    raise ImportError('NumPy is required for array indexes, install it with "pip install cratedigger[numpy]"')
+
+class StringTable(object):
+  """A table of strings packed into a single UTF-8 buffer.
+
+  Strings are decoded on access rather than all at once, so a table loaded
+  from an index file with millions of paths is usable immediately.
+
+  Attributes:
+    data (obj:`numpy.ndarray`): UTF-8 encoded bytes of all strings
+    offsets (obj:`numpy.ndarray`): Offset of each string in the data, followed
+                                   by the length of the data
+
+  """
+
+  __slots__ = ('data', 'offsets')
+
+  def __init__(self, data: Any, offsets: Any) -> None:
+    """Initialize a String Table.
+
+    Args:
+      data (obj:`numpy.ndarray`): UTF-8 encoded bytes of all strings
+      offsets (obj:`numpy.ndarray`): Offset of each string in the data
+
+    """
+
+    self.data = data
+    self.offsets = offsets
+
+  @classmethod
+  def pack(cls, strings: Iterable[str]) -> 'StringTable':
+    """Pack strings into a String Table.
+
+    Args:
+      strings (obj:`iterable` of str): Strings to pack, in ID order
+
+    Returns:
+      table (obj:`StringTable`): Table of the strings
+
+    """
+
+    encoded = [string.encode('utf-8') for string in strings]
+
+    offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(string) for string in encoded], out=offsets[1:])
+
+    return cls(numpy.frombuffer(b''.join(encoded), dtype=numpy.uint8), offsets)
+
+  def __len__(self) -> int:
+    """Return the number of strings in the table"""
+
+    return len(self.offsets) - 1
+
+  def __getitem__(self, string_id: int) -> str:
+    """Decode a string from the table.
+
+    Args:
+      string_id (int): ID of the string
+
+    Returns:
+      string (str): Decoded string
+
+    """
+
+    start, end = self.offsets[string_id], self.offsets[string_id + 1]
+
+    return self.data[start:end].tobytes().decode('utf-8')
+
+  def __iter__(self) -> Iterable[str]:
+    """Decode all strings in the table, in ID order"""
+
+    data = self.data.tobytes()
+    offsets = self.offsets.tolist()
+
+    for start, end in zip(offsets, offsets[1:]):
+      yield data[start:end].decode('utf-8')
+
+class ArrayIndex(object):
+  """A columnar index of a media library stored as NumPy arrays.
+
+  Every distinct track of the library has a path ID, its position in the
+  arrays, and each field of the tracks is stored as one array with a value per
+  track. Strings are stored once in a table, and tracks reference them by ID.
+  Crates are stored in pre-order, along with the end of their subtree, and the
+  tracks of each crate are stored as one contiguous range of path IDs.
+
+  Aggregates over the whole library, such as the number of tracks in every
+  crate or the size of every subtree, are computed with vectorized operations
+  rather than by walking the crate tree. The index can be saved to a single
+  .npz file, and loading it does not scan the library or decode any paths.
+
+  Example:
+    index.paths[0]                  # 'Music/8mm/Opener.flac'
+    index.directories[index.directory_ids[0]] # 'Music/8mm'
+    index.extensions[index.extension_codes[0]] # '.flac'
+
+  Attributes:
+    version (int): Version of the index file format, incremented whenever the
+                   stored arrays change
+    paths (obj:`StringTable`): Path of each track relative to the volume
+    directories (obj:`StringTable`): Path of each directory relative to the
+                                     volume
+    extensions (obj:`list` of str): Lowercase extension of each extension code
+    crate_names (obj:`StringTable`): Name of each crate, in pre-order
+    directory_ids (obj:`numpy.ndarray`): Directory ID of each track
+    extension_codes (obj:`numpy.ndarray`): Extension code of each track
+    sizes (obj:`numpy.ndarray`): Size of each track in bytes, or 0 if the track
+                                 could not be read
+    mtimes (obj:`numpy.ndarray`): Modification time of each track in seconds,
+                                  or NaN if the track could not be read
+    crate_parents (obj:`numpy.ndarray`): Parent crate ID of each crate, or -1
+    crate_ends (obj:`numpy.ndarray`): Crate ID after the last descendant of
+                                      each crate
+    crate_offsets (obj:`numpy.ndarray`): Offset of each crate's tracks in the
+                                         crate tracks, followed by their length
+    crate_tracks (obj:`numpy.ndarray`): Path IDs of the tracks of all crates
+
+  """
+
+  version = 1
+
+  # Arrays stored in an index file, other than the string tables
+  arrays = (
+    'directory_ids',
+    'extension_codes',
+    'sizes',
+    'mtimes',
+    'crate_parents',
+    'crate_ends',
+    'crate_offsets',
+    'crate_tracks'
+  )
+
+  # String tables stored in an index file
+  tables = ('paths', 'directories', 'extensions', 'crate_names')
+
+  def __init__(self, **fields: Any) -> None:
+    """Initialize an Array Index.
+
+    Args:
+      **fields: String table or array of each attribute
+
+    Raises:
+      ImportError: If NumPy is not installed
+
+    """
+
+    require_numpy()
+
+    self.paths = fields['paths'] # type: StringTable
+    self.directories = fields['directories'] # type: StringTable
+    self.extensions = list(fields['extensions']) # type: List[str]
+    self.crate_names = fields['crate_names'] # type: StringTable
+
+    self.directory_ids = fields['directory_ids'] # type: Any
+    self.extension_codes = fields['extension_codes'] # type: Any
+    self.sizes = fields['sizes'] # type: Any
+    self.mtimes = fields['mtimes'] # type: Any
+    self.crate_parents = fields['crate_parents'] # type: Any
+    self.crate_ends = fields['crate_ends'] # type: Any
+    self.crate_offsets = fields['crate_offsets'] # type: Any
+    self.crate_tracks = fields['crate_tracks'] # type: Any
+
+  def __len__(self) -> int:
+    """Return the number of tracks in the index"""
+
+    return len(self.sizes)
+
+  @classmethod
+  def build(cls, library: Any, jobs: int = 1) -> 'ArrayIndex':
+    """Build an index of all crates and tracks in a loaded media library.
+
+    Tracks are stat'ed on a thread pool if more than one job is requested.
+    Tracks which can no longer be read are kept in the index, so that they are
+    still counted in their crates, but have a size of 0 and an mtime of NaN.
+
+    Args:
+      library (obj:`MediaLibrary`): Loaded media library
+      jobs (int, optional): Number of tracks to stat concurrently
+
+    Returns:
+      index (obj:`ArrayIndex`): Index of the library
+
+    Raises:
+      ImportError: If NumPy is not installed
+
+    """
+
+    require_numpy()
+
+    crates = list(PreOrderIter(library.crates))
+
+    # Position of each crate in pre-order, by identity
+    crate_ids = {id(crate): crate_id for crate_id, crate in enumerate(crates)}
+
+    path_ids = {} # type: Dict[str, int]
+    directory_ids = {} # type: Dict[str, int]
+    extension_codes = {} # type: Dict[str, int]
+
+    track_directories = [] # type: List[int]
+    track_extensions = [] # type: List[int]
+    crate_tracks = [] # type: List[int]
+    crate_offsets = [0]
+    crate_parents = []
+
+    for crate in crates:
+      crate_parents.append(crate_ids.get(id(crate.parent), -1))
+
+      for track in crate.tracks:
+        path_id = path_ids.get(track)
+
+        if path_id is None:
+          # First reference to this track, assign the next path ID
+          path_id = path_ids[track] = len(path_ids)
+
+          directory, _, name = track.rpartition('/')
+          extension = os.path.splitext(name)[1].lower()
+
+          track_directories.append(directory_ids.setdefault(directory, len(directory_ids)))
+          track_extensions.append(extension_codes.setdefault(extension, len(extension_codes)))
+
+        crate_tracks.append(path_id)
+
+      crate_offsets.append(len(crate_tracks))
+
+    # Count the descendants of each crate, children always follow their parent
+    # in pre-order so each count is complete before it is added to the parent
+    subtree_sizes = [1] * len(crates)
+    for crate_id in range(len(crates) - 1, 0, -1):
+      parent_id = crate_parents[crate_id]
+      if parent_id >= 0:
+        subtree_sizes[parent_id] += subtree_sizes[crate_id]
+
+    paths = [library.resolve_track(track) for track in path_ids]
+
+    if jobs > 1:
+      with ThreadPoolExecutor(max_workers=jobs) as executor:
+        stats = list(executor.map(TrackIndex.stat_track, paths))
+    else:
+      stats = list(map(TrackIndex.stat_track, paths))
+
+    sizes = numpy.array([stat[0] if stat else 0 for stat in stats], dtype=numpy.int64)
+    mtimes = numpy.array([stat[1] if stat else numpy.nan for stat in stats], dtype=numpy.float64)
+
+    return cls(
+      paths=StringTable.pack(path_ids),
+      directories=StringTable.pack(directory_ids),
+      extensions=list(extension_codes),
+      crate_names=StringTable.pack(crate.crate_name for crate in crates),
+      directory_ids=numpy.array(track_directories, dtype=numpy.int32),
+      extension_codes=numpy.array(track_extensions, dtype=numpy.int16),
+      sizes=sizes,
+      mtimes=mtimes,
+      crate_parents=numpy.array(crate_parents, dtype=numpy.int32),
+      crate_ends=numpy.arange(len(crates), dtype=numpy.int32) + numpy.array(subtree_sizes, dtype=numpy.int32),
+      crate_offsets=numpy.array(crate_offsets, dtype=numpy.int64),
+      crate_tracks=numpy.array(crate_tracks, dtype=numpy.int32)
+    )
+
+  @staticmethod
+  def default_path(library_path: str) -> str:
+    """Determine the default index file path for a given media library.
+
+    Indexes are stored alongside the caches in the user cache directory, with
+    one index file per media library path.
+
+    Args:
+      library_path (str): Path to the media library
+
+    Returns:
+      index_path (str): Path to the index file
+
+    """
+
+    library_hash = sha1(os.path.abspath(library_path).encode('utf-8')).hexdigest()
+
+    return os.path.join(user_cache_dir(), 'index-%s.npz' % library_hash)
+
+  def save(self, path: str) -> None:
+    """Save the index to an uncompressed .npz file.
+
+    The index is written to a temporary file first, and then moved into place,
+    so an interrupted save never leaves a partial index file behind.
+
+    Args:
+      path (str): Path to the index file
+
+    """
+
+    arrays = {name: getattr(self, name) for name in ArrayIndex.arrays}
+    arrays['version'] = numpy.array(ArrayIndex.version)
+
+    for name in ArrayIndex.tables:
+      table = getattr(self, name)
+      if not isinstance(table, StringTable):
+        table = StringTable.pack(table)
+
+      arrays[name + '_data'] = table.data
+      arrays[name + '_offsets'] = table.offsets
+
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+
+    temp_path = path + '.tmp'
+
+    with open(temp_path, 'wb') as index_file:
+      numpy.savez(index_file, **arrays)
+
+    os.replace(temp_path, path)
+
+  @classmethod
+  def load(cls, path: str) -> 'ArrayIndex':
+    """Load an index from a .npz file.
+
+    Args:
+      path (str): Path to the index file
+
+    Returns:
+      index (obj:`ArrayIndex`): Loaded index
+
+    Raises:
+      ImportError: If NumPy is not installed
+      OSError: If the index file can't be read
+      ValueError: If the file is not an index, or of an outdated version
+
+    """
+
+    require_numpy()
+
+    try:
+      index_file = numpy.load(path, allow_pickle=False)
+    except ValueError:
+      # Not a .npz file, numpy attempts to load it as a pickle
+      raise ValueError('Not an index file')
+
+    if not isinstance(index_file, numpy.lib.npyio.NpzFile):
+      # A single .npy array rather than an archive of arrays
+      raise ValueError('Not an index file')
+
+    with index_file:
+      try:
+        if int(index_file['version']) != ArrayIndex.version:
+          raise ValueError('Index version %d is not supported, rebuild the index' % index_file['version'])
+
+        fields = {name: index_file[name] for name in ArrayIndex.arrays} # type: Dict[str, Any]
+
+        for name in ArrayIndex.tables:
+          fields[name] = StringTable(index_file[name + '_data'], index_file[name + '_offsets'])
+      except KeyError:
+        raise ValueError('Not an index file')
+
+    return cls(**fields)
+
+  def crate_counts(self) -> Any:
+    """Count the tracks of each crate.
+
+    Returns:
+      counts (obj:`numpy.ndarray`): Number of tracks in each crate, by crate ID
+
+    """
+
+    return numpy.diff(self.crate_offsets)
+
+  def subtree_counts(self) -> Any:
+    """Count the tracks of each crate and all of its descendants.
+
+    Returns:
+      counts (obj:`numpy.ndarray`): Number of tracks in each subtree, by crate
+                                    ID
+
+    """
+
+    # Crates of a subtree are contiguous, and so are their tracks
+    return self.crate_offsets[self.crate_ends] - self.crate_offsets[:-1]
+
+  def subtree_sizes(self) -> Any:
+    """Total the size of the tracks of each crate and all of its descendants.
+
+    A track referenced by more than one crate of a subtree is counted once per
+    reference, which never happens in a media library as each track is only in
+    the crate of its own directory.
+
+    Returns:
+      sizes (obj:`numpy.ndarray`): Total size in bytes of each subtree, by
+                                   crate ID
+
+    """
+
+    # Running total of the track sizes, in crate track order
+    totals = numpy.zeros(len(self.crate_tracks) + 1, dtype=numpy.int64)
+    numpy.cumsum(self.sizes[self.crate_tracks], out=totals[1:])
+
+    return totals[self.crate_offsets[self.crate_ends]] - totals[self.crate_offsets[:-1]]
+
+  def extension_histogram(self) -> Dict[str, int]:
+    """Count the tracks of each extension.
+
+    Returns:
+      histogram (obj:`dict` of str: int): Number of tracks of each extension,
+                                          in descending order of count
+
+    """
+
+    counts = numpy.bincount(self.extension_codes, minlength=len(self.extensions))
+
+    return {
+      self.extensions[code]: int(counts[code])
+      for code in numpy.argsort(-counts, kind='stable')
+    }
+
+  def filter_mtime(self, start: Optional[float] = None, end: Optional[float] = None) -> Any:
+    """Find the tracks modified within a time range.
+
+    Tracks which could not be read never match.
+
+    Args:
+      start (float, optional): Earliest modification time in seconds, inclusive
+      end (float, optional): Latest modification time in seconds, exclusive
+
+    Returns:
+      path_ids (obj:`numpy.ndarray`): Path IDs of the matching tracks
+
+    """
+
+    mask = ~numpy.isnan(self.mtimes)
+
+    if start is not None:
+      mask &= self.mtimes >= start
+
+    if end is not None:
+      mask &= self.mtimes < end
+
+    return numpy.flatnonzero(mask)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from logging import getLogger
+from typing import Dict, Iterable, List, Optional
+from anytree import PreOrderIter, RenderTree
+from cratedigger.media.cache import ScanCache
+from cratedigger.media.library import MediaLibrary
+from cratedigger.serato.crate import SeratoCrate
+from cratedigger.serato.library import WriteStats
+
+# Logging
+logger = getLogger(__name__)
+
+class LibraryBatch(object):
+  """A batch of Media Libraries loaded into a single crates tree.
+
+  Syncing several library directories in one process only pays for startup
+  once, and lets their shared ancestor crates be written once. All libraries
+  are loaded concurrently, each into a tree of its own, and are then grafted
+  beneath a single "Media" crate. Libraries on the same volume share a single
+  volume crate, so it is only written once.
+
+  Crates are written grouped by the crates_path they are written to, and stale
+  crates are pruned against all crates written to the same crates_path, so
+  libraries on the same volume do not prune each other's crates.
+
+  Example:
+    batch = LibraryBatch()
+    batch.load(['/Volumes/A/Music', '/Volumes/B/Music'], jobs=4)
+    results = batch.write()
+
+  Attributes:
+    root_crate (obj:`MediaCrate`): "Media" crate shared by all libraries
+    libraries (obj:`list` of obj:`MediaLibrary`): Loaded libraries, in order
+    volumes (obj:`dict` of str: obj:`MediaLibrary`): First library loaded on
+                                                     each volume, which writes
+                                                     the volume's crates
+
+  """
+
+  def __init__(self) -> None:
+    """Initialize an empty Library Batch"""
+
+    self.root_crate = MediaLibrary.create_root()
+    self.libraries = [] # type: List[MediaLibrary]
+    self.volumes = OrderedDict() # type: Dict[str, MediaLibrary]
+
+  def __len__(self) -> int:
+    """Return the count of all crates beneath the volume crates of the batch"""
+
+    return sum(len(library) for library in self.volumes.values())
+
+  def render(self) -> str:
+    """Render all libraries of the batch as a single ASCII tree.
+
+    Returns:
+      tree (str): String representation of the shared tree
+
+    """
+
+    render = ''
+
+    for pre, _, node in RenderTree(self.root_crate.root):
+      render += '%s%s\n' % (pre, node)
+
+    return render
+
+  @staticmethod
+  def read_manifest(path: str) -> List[str]:
+    """Read the library directories listed in a manifest file.
+
+    A manifest lists one library directory per line. Blank lines and lines
+    starting with # are ignored, and relative paths are relative to the folder
+    containing the manifest.
+
+    Example:
+      # Nightly sync
+      /Volumes/Music/Library
+      /Volumes/Archive/Library
+
+    Args:
+      path (str): Path to the manifest file
+
+    Returns:
+      paths (obj:`list` of str): Library directories, in manifest order
+
+    Raises:
+      ValueError: If a listed library directory does not exist
+
+    """
+
+    paths = [] # type: List[str]
+    base_path = os.path.dirname(os.path.abspath(path))
+
+    with open(path, 'r', encoding='utf-8') as manifest:
+      for line in manifest:
+        line = line.strip()
+        if not line or line.startswith('#'):
+          continue
+
+        library_path = os.path.join(base_path, os.path.expanduser(line))
+
+        if not os.path.isdir(library_path):
+          raise ValueError('Library directory %s in manifest %s does not exist' % (line, path))
+
+        paths.append(library_path)
+
+    return paths
+
+  @staticmethod
+  def exclude_nested(paths: Iterable[str]) -> List[str]:
+    """Drop library directories which are already covered by another.
+
+    A directory which is the same as, or inside of, another library directory
+    would produce the same crates twice, so only the outermost directory is
+    kept, or the first of several identical directories.
+
+    Args:
+      paths (obj:`iterable` of str): Library directories
+
+    Returns:
+      paths (obj:`list` of str): Library directories which are not nested, in
+                                 their original order
+
+    """
+
+    paths = list(paths)
+    real_paths = [os.path.realpath(path) for path in paths]
+
+    kept = [] # type: List[str]
+    for index, (path, real_path) in enumerate(zip(paths, real_paths)):
+      for other_index, other_path in enumerate(real_paths):
+        if other_path == real_path and other_index < index:
+          logger.warning('Skipping library %s, which is listed more than once' % path)
+          break
+
+        if real_path.startswith(other_path.rstrip(os.sep) + os.sep):
+          logger.warning('Skipping library %s, which is inside library %s' % (path, paths[other_index]))
+          break
+      else:
+        kept.append(path)
+
+    return kept
+
+  def load(self, paths: Iterable[str], caches: Optional[Dict[str, ScanCache]] = None, jobs: int = 1) -> None:
+    """Load a number of Media Libraries into the batch.
+
+    Each library is loaded on its own thread, into a tree of its own, and
+    scans up to the given number of directories concurrently. Once all of them
+    are loaded, they are added to the shared tree in the given order.
+
+    Args:
+      paths (obj:`iterable` of str): Library directories to load
+      caches (obj:`dict` of str: obj:`ScanCache`, optional): Cache of directory
+                                                             scans for each
+                                                             library directory
+      jobs (int, optional): Number of directories to scan concurrently in each
+                            library
+
+    """
+
+    paths = self.exclude_nested(paths)
+    if not paths:
+      return
+
+    if caches is None:
+      caches = {}
+
+    libraries = [MediaLibrary() for _ in paths]
+
+    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+      futures = [
+        executor.submit(library.load, path, caches.get(path), jobs)
+        for library, path in zip(libraries, paths)
+      ]
+
+      # Raise the first error in library order, once all loads have finished
+      for future in futures:
+        future.result()
+
+    for library in libraries:
+      self.add(library)
+
+  def add(self, library: MediaLibrary) -> None:
+    """Add a loaded Media Library to the shared tree.
+
+    The first library on a volume moves its volume crate beneath the shared
+    "Media" crate. The crates of later libraries on the same volume are moved
+    beneath that volume crate, after the crates already there.
+
+    Args:
+      library (obj:`MediaLibrary`): Library loaded with MediaLibrary.load
+
+    """
+
+    volume_library = self.volumes.get(library.volume)
+
+    if volume_library is None:
+      library.crates.parent = self.root_crate
+      self.volumes[library.volume] = library
+    else:
+      volume_crate = library.crates
+
+      for crate in volume_crate.children:
+        crate.parent = volume_library.crates
+
+      # Drop the emptied volume crate in favor of the shared one
+      volume_crate.parent = None
+      library.crates = volume_library.crates
+
+    library.root_crate = self.root_crate
+    self.libraries.append(library)
+
+  def groups(self) -> Dict[str, List[MediaLibrary]]:
+    """Group the libraries writing each volume by their crates_path.
+
+    Returns:
+      groups (obj:`dict` of str: obj:`list` of obj:`MediaLibrary`): Libraries
+        writing each volume, by crates_path, in the order they were loaded
+
+    """
+
+    groups = OrderedDict() # type: Dict[str, List[MediaLibrary]]
+
+    for library in self.volumes.values():
+      groups.setdefault(library.crates_path, []).append(library)
+
+    return groups
+
+  def write(self, dry_run: bool = False, jobs: int = 1, recursive_tracks: bool = False) -> Dict[str, WriteStats]:
+    """Write all crates of the batch as .crate files.
+
+    The crates of all volumes written to the same crates_path are written
+    together, and each volume crate is written once, no matter how many
+    libraries are on its volume.
+
+    Args:
+      dry_run (bool, optional): Compare all crates without writing any of them
+      jobs (int, optional): Number of crates to write concurrently
+      recursive_tracks (bool, optional): Include the tracks of all subfolders
+                                         in each crate
+
+    Returns:
+      results (obj:`dict` of str: obj:`WriteStats`): Stats of the write to each
+                                                     crates_path
+
+    """
+
+    results = OrderedDict() # type: Dict[str, WriteStats]
+
+    for crates_path, libraries in self.groups().items():
+      if not dry_run:
+        logger.info('Writing media library crates to %s' % crates_path)
+      else:
+        logger.info('Writing media library crates to %s (Dry Run)' % crates_path)
+
+      crates = chain.from_iterable(
+        library.iter_recursive_crates() if recursive_tracks else PreOrderIter(library.crates)
+        for library in libraries
+      ) # type: Iterable[SeratoCrate]
+
+      results[crates_path] = libraries[0].write_crates(crates, dry_run, jobs)
+
+    return results
+
+  def prune(self, results: Dict[str, WriteStats], dry_run: bool = False) -> List[str]:
+    """Delete stale crates of all volumes in the batch.
+
+    Each volume is pruned against every crate written to its crates_path, see
+    MediaLibrary.prune.
+
+    Args:
+      results (obj:`dict` of str: obj:`WriteStats`): Stats returned by write
+      dry_run (bool, optional): Determine the stale crates without deleting any
+                                of them
+
+    Returns:
+      pruned (obj:`list` of str): Names of the stale crates
+
+    """
+
+    pruned = [] # type: List[str]
+
+    for crates_path, libraries in self.groups().items():
+      for library in libraries:
+        pruned.extend(library.prune(results[crates_path], dry_run))
+
+    return pruned
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+from threading import Lock
+from hashlib import sha1
+from json import dump, load
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Logging
+logger = getLogger(__name__)
+
+def user_cache_dir() -> str:
+  """Determine the cratedigger directory in the user cache directory.
+
+  Returns:
+    cache_dir (str): Path to the cache directory for the current platform
+
+  """
+
+  if sys.platform == 'darwin':
+    # ~/Library/Caches/cratedigger
+    return os.path.join(Path.home(), 'Library', 'Caches', 'cratedigger')
+  elif sys.platform == 'win32':
+    # C:\Users\user\AppData\Local\cratedigger\Cache
+    return os.path.join(
+      os.environ.get('LOCALAPPDATA', os.path.join(Path.home(), 'AppData', 'Local')),
+      'cratedigger', 'Cache'
+    )
+  else:
+    # ~/.cache/cratedigger
+    return os.path.join(
+      os.environ.get('XDG_CACHE_HOME', os.path.join(Path.home(), '.cache')),
+      'cratedigger'
+    )
+
+class FileCache(object):
+  """Persistent cache of entries for paths within a media library.
+
+  This is the base class for caches which are stored as a JSON file in the user
+  cache directory, with one cache file per media library. Entries loaded from
+  the cache file are only saved again if they are used or stored during this
+  run, which drops the entries of paths that no longer exist.
+
+  Lookups and stores are thread safe, so paths can be processed concurrently
+  against a single cache.
+
+  Attributes:
+    path (str): Path to the cache file
+    name (str): Name of the cache, used in the cache file name
+    section (str): Key of the entries within the cache file
+    version (int): Version of the cache file format, caches written with a
+                   different version are discarded
+    racy_window (int): Paths modified within this many nanoseconds of being
+                       read are not cached, as a change within the resolution
+                       of the filesystem's timestamps would not update the
+                       modification time
+    hits (int): Entries served from the cache during this run
+    misses (int): Entries which had to be computed during this run
+
+  """
+
+  name = 'cache'
+  section = 'entries'
+  version = 1
+
+  # 2 seconds, the timestamp resolution of FAT formatted drives
+  racy_window = 2 * 1000 * 1000 * 1000
+
+  def __init__(self, path: str) -> None:
+    """Initialize a File Cache.
+
+    Args:
+      path (str): Path to the cache file
+
+    """
+
+    self.path = path
+
+    # Entries loaded from the cache file, by path
+    self._cached = {} # type: Dict[str, list]
+
+    # Entries used or stored during this run, only these are saved
+    self._used = {} # type: Dict[str, list]
+
+    # Cache hits and misses during this run
+    self.hits = 0
+    self.misses = 0
+
+    # Lock for concurrent lookups and stores
+    self._lock = Lock()
+
+  @classmethod
+  def default_path(cls, library_path: str) -> str:
+    """Determine the default cache file path for a given media library.
+
+    Caches are stored in the user cache directory for the current platform,
+    with one cache file per cache and media library path.
+
+    Args:
+      library_path (str): Path to the media library
+
+    Returns:
+      cache_path (str): Path to the cache file
+
+    """
+
+    cache_dir = user_cache_dir()
+
+    # Name the cache after a hash of the library path
+    library_hash = sha1(os.path.abspath(library_path).encode('utf-8')).hexdigest()
+
+    return os.path.join(cache_dir, '%s-%s.json' % (cls.name, library_hash))
+
+  def load(self) -> None:
+    """Load the cache file.
+
+    A missing, unreadable or outdated cache file results in an empty cache.
+
+    """
+
+    try:
+      with open(self.path, 'r', encoding='utf-8') as cache_file:
+        cache = load(cache_file)
+    except FileNotFoundError:
+      logger.debug('No %s cache at %s' % (self.name, self.path))
+      return
+    except (OSError, ValueError) as e:
+      logger.warning('Ignoring unreadable %s cache %s: %s' % (self.name, self.path, e))
+      return
+
+    if not isinstance(cache, dict) or cache.get('version') != self.version:
+      logger.debug('Ignoring outdated %s cache %s' % (self.name, self.path))
+      return
+
+    self._cached = cache.get(self.section, {})
+    logger.debug('Loaded %d %s from %s cache %s' % (len(self._cached), self.section, self.name, self.path))
+
+  def save(self) -> None:
+    """Save all entries used during this run to the cache file.
+
+    The cache is written to a temporary file and renamed over the cache file,
+    so an interrupted save never leaves a corrupt cache behind.
+
+    """
+
+    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    temp_path = '%s.%d.tmp' % (self.path, os.getpid())
+    with open(temp_path, 'w', encoding='utf-8') as cache_file:
+      dump({'version': self.version, self.section: self._used}, cache_file)
+
+    os.replace(temp_path, self.path)
+    logger.debug('Saved %d %s to %s cache %s' % (len(self._used), self.section, self.name, self.path))
+
+  def is_racy(self, mtime: int) -> bool:
+    """Determine whether a path was modified too recently to be cached.
+
+    Args:
+      mtime (int): Modification time of the path in nanoseconds
+
+    Returns:
+      racy (bool): Whether the path is within the racy window
+
+    """
+
+    return int(time.time() * 1000000000) - mtime < self.racy_window
+
+class ScanCache(FileCache):
+  """Persistent cache of media directory scans.
+
+  This class stores the result of listing each media directory, keyed on the
+  modification time of the directory. Adding, removing or renaming an entry
+  in a directory updates its modification time, so a directory whose
+  modification time has not changed can be served from the cache without
+  listing it again.
+
+  """
+
+  name = 'scan'
+  section = 'directories'
+
+  def get(self, path: str, mtime: int) -> Optional[Tuple[List[str], List[str]]]:
+    """Retrieve a cached directory scan.
+
+    Args:
+      path (str): Path of the directory
+      mtime (int): Current modification time of the directory in nanoseconds
+
+    Returns:
+      scan (obj:`tuple`, optional): Tuple of child directory names and track
+                                    file names, or None if the directory is
+                                    not cached or has been modified
+
+    """
+
+    with self._lock:
+      entry = self._cached.get(path)
+
+      if entry is None or entry[0] != mtime:
+        self.misses += 1
+        return None
+
+      self.hits += 1
+      self._used[path] = entry
+
+    return entry[1], entry[2]
+
+  def set(self, path: str, mtime: int, dirs: List[str], tracks: List[str]) -> None:
+    """Store a directory scan.
+
+    Args:
+      path (str): Path of the directory
+      mtime (int): Modification time of the directory in nanoseconds
+      dirs (obj:`list` of str): Names of the child directories
+      tracks (obj:`list` of str): File names of the supported tracks
+
+    """
+
+    if self.is_racy(mtime):
+      # Modified too recently to trust the modification time
+      return
+
+    with self._lock:
+      self._used[path] = [mtime, dirs, tracks]
+
+class HashCache(FileCache):
+  """Persistent cache of track file hashes.
+
+  This class stores the sample and full content hashes of track files, keyed
+  on the size and modification time of each file, so files which have not
+  been modified are not read again.
+
+  """
+
+  name = 'hashes'
+  section = 'files'
+
+  def get(self, path: str, size: int, mtime: int) -> Tuple[Optional[str], Optional[str]]:
+    """Retrieve the cached hashes of a file.
+
+    Args:
+      path (str): Path of the file
+      size (int): Current size of the file in bytes
+      mtime (int): Current modification time of the file in nanoseconds
+
+    Returns:
+      hashes (obj:`tuple`): Tuple of the sample hash and full hash of the file,
+                            either of which is None if it is not cached
+
+    """
+
+    with self._lock:
+      # Hashes stored during this run take precedence over the cache file
+      entry = self._used.get(path) or self._cached.get(path)
+
+      if entry is None or entry[0] != size or entry[1] != mtime:
+        self.misses += 1
+        return None, None
+
+      self.hits += 1
+      self._used[path] = entry
+
+    return entry[2], entry[3]
+
+  def set(self, path: str, size: int, mtime: int, sample: Optional[str], full: Optional[str] = None) -> None:
+    """Store the hashes of a file.
+
+    Args:
+      path (str): Path of the file
+      size (int): Size of the file in bytes
+      mtime (int): Modification time of the file in nanoseconds
+      sample (str): Sample hash of the file
+      full (str, optional): Full hash of the file, if it has been computed
+
+    """
+
+    if self.is_racy(mtime):
+      # Modified too recently to trust the modification time
+      return
+
+    with self._lock:
+      self._used[path] = [size, mtime, sample, full]
+
+class TagCache(FileCache):
+  """Persistent cache of track tags.
+
+  This class stores the tags read from track files, keyed on the size and
+  modification time of each file, so files which have not been modified are
+  not parsed again.
+
+  """
+
+  name = 'tags'
+  section = 'files'
+
+  def get(self, path: str, size: int, mtime: int) -> Optional[Dict[str, Any]]:
+    """Retrieve the cached tags of a file.
+
+    Args:
+      path (str): Path of the file
+      size (int): Current size of the file in bytes
+      mtime (int): Current modification time of the file in nanoseconds
+
+    Returns:
+      tags (obj:`dict`, optional): Tags of the file, or None if the file is not
+                                   cached or has been modified
+
+    """
+
+    with self._lock:
+      # Tags stored during this run take precedence over the cache file
+      entry = self._used.get(path) or self._cached.get(path)
+
+      if entry is None or entry[0] != size or entry[1] != mtime:
+        self.misses += 1
+        return None
+
+      self.hits += 1
+      self._used[path] = entry
+
+    return entry[2]
+
+  def set(self, path: str, size: int, mtime: int, tags: Dict[str, Any]) -> None:
+    """Store the tags of a file.
+
+    Args:
+      path (str): Path of the file
+      size (int): Size of the file in bytes
+      mtime (int): Modification time of the file in nanoseconds
+      tags (obj:`dict`): Tags of the file
+
+    """
+
+    if self.is_racy(mtime):
+      # Modified too recently to trust the modification time
+      return
+
+    with self._lock:
+      self._used[path] = [size, mtime, tags]
+
+class SnapshotCache(FileCache):
+  """Persistent snapshot of the crates last written by a sync.
+
+  This class stores the tracks of each media crate as they were produced from
+  the media folders when the crate was last written, by crate name. This is
+  the common base of a three-way merge between the crate on disk, which may
+  have been changed in Serato since, and the crate produced by the next sync.
+
+  """
+
+  name = 'snapshots'
+  section = 'crates'
+
+  def get(self, crate_name: str) -> Optional[List[str]]:
+    """Retrieve the snapshot of a crate.
+
+    Args:
+      crate_name (str): Name of the crate
+
+    Returns:
+      tracks (obj:`list` of str, optional): Tracks of the crate when it was last
+                                            written, or None if there is no
+                                            snapshot of the crate
+
+    """
+
+    with self._lock:
+      tracks = self._cached.get(crate_name)
+
+      if tracks is None:
+        self.misses += 1
+        return None
+
+      self.hits += 1
+      self._used.setdefault(crate_name, tracks)
+
+    return tracks
+
+  def set(self, crate_name: str, tracks: Sequence[str]) -> None:
+    """Store the snapshot of a crate.
+
+    Args:
+      crate_name (str): Name of the crate
+      tracks (obj:`list` of str): Tracks of the crate as it is being written
+
+    """
+
+    with self._lock:
+      self._used[crate_name] = list(tracks)
+
+  def revert(self, crate_name: str) -> None:
+    """Restore the snapshot a crate had before this run.
+
+    This is used for crates which failed to write, so that the next merge uses
+    the tracks that were actually last written as its base.
+
+    Args:
+      crate_name (str): Name of the crate
+
+    """
+
+    with self._lock:
+      tracks = self._cached.get(crate_name)
+
+      if tracks is None:
+        self._used.pop(crate_name, None)
+      else:
+        self._used[crate_name] = tracks
@@ -2,10 +2,10 @@
 import os
 from logging import getLogger
 from json import dumps
-from typing import Tuple, TypeVar, Type
+from typing import Iterable, Optional
 from os.path import splitext, basename
-from anytree import NodeMixin
 from cratedigger.serato.crate import SeratoCrate
+from cratedigger.serato.tracks import TrackTable
 
 # Logging
 logger = getLogger(__name__)
@@ -25,18 +25,20 @@ SUPPORTED_FILE_TYPES = (
   '.aac'
 )
 
-# Type var
-MC = TypeVar('MC', bound='MediaCrate')
-
 class MediaCrate(SeratoCrate):
   """A media folder represented as a Serato Crate.
 
   This class is intended to read a given media folder and represent it as a
   Serato Crate.
 
+  Attributes:
+    crate_path (str): Path of the media folder relative to the volume
+
   """
 
-  def __init__(self, parent: Type[MC] = None, children: Tuple[Type[MC]] = None) -> None:
+  __slots__ = ('crate_path',)
+
+  def __init__(self, parent: Optional[SeratoCrate] = None, children: Optional[Iterable[SeratoCrate]] = None) -> None:
     """Initialize a Media Crate
 
     This method invokes the SeratoCrate constructor in order to set the provided
@@ -50,11 +52,15 @@ class MediaCrate(SeratoCrate):
 
     super().__init__(parent, children)
 
-  def load_crate(self, path: str, volume: str, volume_path: str, prefix: str = None) -> None:
+    # Path of the media folder relative to the volume
+    self.crate_path = ''
+
+  def load_crate(self, path: str, volume: str, volume_path: str, prefix: Optional[str] = None, files: Optional[Iterable[str]] = None, table: Optional[TrackTable] = None) -> None:
     """Load a given media folder path as a Serato crate.
 
     This method lists a given directory, and adds all compatible files to the
-    Serato crate as tracks.    
+    Serato crate as tracks. If the directory has already been listed, the
+    file names can be provided to avoid listing it again.
 
     Args:
       path (str): Path to load tracks from
@@ -64,6 +70,10 @@ class MediaCrate(SeratoCrate):
                          used when converting track paths to the Serato
                          "relative" format
       prefix (str, optional): Prefix to append to the crate name
+      files (obj:`list` of str, optional): File names within the directory,
+                                           listed from path if not provided
+      table (obj:`TrackTable`, optional): Library wide table to intern track
+                                          paths in
 
     """
 
@@ -90,6 +100,26 @@ class MediaCrate(SeratoCrate):
       self.crate_path.replace('/', SeratoCrate.delimiter).replace('\\', SeratoCrate.delimiter)
     )
 
-    for file in os.listdir(path):
+    if files is None:
+      files = os.listdir(path)
+
+    # Normalized track path prefix, which is joined with each file name
+    # Example
+    # Crate path: Music\8mm\8mm - Opener EP
+    # Track prefix: Music/8mm/8mm - Opener EP/
+    track_prefix = os.path.join(self.crate_path, '').replace('\\', '/')
+
+    self.track_table = table
+    tracks = list(self.tracks)
+
+    for file in files:
       if file.endswith(SUPPORTED_FILE_TYPES):
-        self.tracks.append(os.path.join(self.crate_path, file).replace('\\', '/'))
+        track = track_prefix + file.replace('\\', '/')
+
+        if table is not None:
+          # Share the track path with other crates
+          track = table.intern(track)
+
+        tracks.append(track)
+
+    self.tracks = tracks
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+import os
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from logging import getLogger
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from cratedigger.media.cache import HashCache
+
+# Logging
+logger = getLogger(__name__)
+
+class DupeFinder(object):
+  """Finder of duplicate track files.
+
+  Duplicates are found in stages, where each stage only considers the files
+  which are still not unique after the previous one:
+
+  1. Files are grouped by their size, which only requires a stat
+  2. Files with the same size are grouped by a hash of a sample of their
+     first and last bytes
+  3. Files with the same sample hash are grouped by a hash of their contents
+
+  Most files have a unique size, and most of the rest differ within their
+  sample, so only true duplicates are read in full. Hashes are computed on a
+  thread pool, and can be cached between runs by the size and modification
+  time of each file.
+
+  Attributes:
+    cache (obj:`HashCache`, optional): Cache of file hashes
+    jobs (int): Number of files to hash concurrently
+    sample_size (int): Number of bytes sampled from the start and the end of
+                       each file
+    block_size (int): Number of bytes read at once when hashing a whole file
+    sampled (int): Files whose sample hash was computed during the last search
+    hashed (int): Files whose full hash was computed during the last search
+
+  """
+
+  sample_size = 64 * 1024
+  block_size = 1024 * 1024
+
+  def __init__(self, cache: Optional[HashCache] = None, jobs: int = 1) -> None:
+    """Initialize a Dupe Finder.
+
+    Args:
+      cache (obj:`HashCache`, optional): Cache of file hashes
+      jobs (int, optional): Number of files to hash concurrently
+
+    """
+
+    self.cache = cache
+    self.jobs = jobs
+
+    self.sampled = 0
+    self.hashed = 0
+
+    # Lock for counting files hashed on the thread pool
+    self._lock = Lock()
+
+  def find(self, paths: Iterable[str]) -> List[List[str]]:
+    """Find groups of identical files.
+
+    Args:
+      paths (obj:`list` of str): Paths of the files to compare
+
+    Returns:
+      groups (obj:`list` of obj:`list` of str): Groups of paths with identical
+                                                contents, with each group and
+                                                the groups themselves sorted by
+                                                path
+
+    """
+
+    self.sampled = 0
+    self.hashed = 0
+
+    if self.jobs > 1:
+      executor = ThreadPoolExecutor(max_workers=self.jobs)
+      map_files = executor.map # type: Callable
+    else:
+      executor = None
+      map_files = map
+
+    try:
+      # Size and modification time of each file
+      # path: (size, mtime)
+      stats = {} # type: Dict[str, Tuple[int, int]]
+      paths = list(paths)
+      for path, stat in zip(paths, map_files(self.stat_file, paths)):
+        if stat is not None:
+          stats[path] = stat
+
+      # Group by size, empty files are not considered duplicates
+      groups = self.group(
+        (path, stat[0]) for path, stat in stats.items() if stat[0] > 0
+      )
+      logger.debug('%d of %d files share a size' % (sum(map(len, groups)), len(stats)))
+
+      # Group files of the same size by their sample hash
+      candidates = [path for group in groups for path in group]
+      samples = list(map_files(lambda path: self.sample_hash(path, *stats[path]), candidates))
+      groups = self.group(
+        ((path, (stats[path][0], sample)) for path, sample in zip(candidates, samples)
+        if sample is not None)
+      )
+
+      # Group files of the same sample hash by their full hash, files which are
+      # small enough to be sampled entirely are already compared in full
+      candidates = [
+        path for group in groups for path in group
+        if stats[path][0] > 2 * DupeFinder.sample_size
+      ]
+      duplicates = [group for group in groups if stats[group[0]][0] <= 2 * DupeFinder.sample_size]
+
+      hashes = list(map_files(lambda path: self.full_hash(path, *stats[path]), candidates))
+      duplicates.extend(self.group(
+        ((path, (stats[path][0], full)) for path, full in zip(candidates, hashes)
+        if full is not None)
+      ))
+    finally:
+      if executor is not None:
+        executor.shutdown(wait=True)
+
+    for group in duplicates:
+      group.sort()
+
+    duplicates.sort()
+
+    return duplicates
+
+  @staticmethod
+  def stat_file(path: str) -> Optional[Tuple[int, int]]:
+    """Determine the size and modification time of a file.
+
+    Args:
+      path (str): Path of the file
+
+    Returns:
+      stat (obj:`tuple`): Tuple of the size in bytes and modification time in
+                          nanoseconds, or None if the file can't be read
+
+    """
+
+    try:
+      stat = os.stat(path)
+    except OSError as e:
+      logger.warning('Skipping unreadable track %s: %s' % (path, e))
+      return None
+
+    return stat.st_size, stat.st_mtime_ns
+
+  @staticmethod
+  def group(keys: Iterable[Tuple[str, object]]) -> List[List[str]]:
+    """Group paths by a key, dropping paths with a unique key.
+
+    Args:
+      keys (obj:`list` of obj:`tuple`): Tuples of a path and its key
+
+    Returns:
+      groups (obj:`list` of obj:`list` of str): Groups of more than one path
+                                                sharing a key
+
+    """
+
+    groups = {} # type: Dict[object, List[str]]
+    for path, key in keys:
+      groups.setdefault(key, []).append(path)
+
+    return [group for group in groups.values() if len(group) > 1]
+
+  def sample_hash(self, path: str, size: int, mtime: int) -> Optional[str]:
+    """Hash the first and last bytes of a file.
+
+    Files of up to twice the sample size are hashed entirely.
+
+    Args:
+      path (str): Path of the file
+      size (int): Size of the file in bytes
+      mtime (int): Modification time of the file in nanoseconds
+
+    Returns:
+      sample (str): Hex digest of the sample, or None if the file can't be read
+
+    """
+
+    if self.cache is not None:
+      sample, full = self.cache.get(path, size, mtime)
+      if sample is not None:
+        return sample
+
+    with self._lock:
+      self.sampled += 1
+
+    digest = sha1()
+
+    try:
+      with open(path, 'rb') as file:
+        if size <= 2 * DupeFinder.sample_size:
+          digest.update(file.read())
+        else:
+          digest.update(file.read(DupeFinder.sample_size))
+          file.seek(-DupeFinder.sample_size, os.SEEK_END)
+          digest.update(file.read(DupeFinder.sample_size))
+    except OSError as e:
+      logger.warning('Skipping unreadable track %s: %s' % (path, e))
+      return None
+
+    sample = digest.hexdigest()
+
+    if self.cache is not None:
+      self.cache.set(path, size, mtime, sample)
+
+    return sample
+
+  def full_hash(self, path: str, size: int, mtime: int) -> Optional[str]:
+    """Hash the entire contents of a file.
+
+    Args:
+      path (str): Path of the file
+      size (int): Size of the file in bytes
+      mtime (int): Modification time of the file in nanoseconds
+
+    Returns:
+      full (str): Hex digest of the file, or None if the file can't be read
+
+    """
+
+    sample = None
+
+    if self.cache is not None:
+      sample, full = self.cache.get(path, size, mtime)
+      if full is not None:
+        return full
+
+    with self._lock:
+      self.hashed += 1
+
+    digest = sha1()
+
+    try:
+      with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(DupeFinder.block_size), b''):
+          digest.update(block)
+    except OSError as e:
+      logger.warning('Skipping unreadable track %s: %s' % (path, e))
+      return None
+
+    full = digest.hexdigest()
+
+    if self.cache is not None:
+      self.cache.set(path, size, mtime, sample, full)
+
+    return full
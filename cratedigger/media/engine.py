@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from typing import Awaitable, List, Optional, Set
+from cratedigger.media.cache import SnapshotCache
+from cratedigger.media.crate import MediaCrate
+from cratedigger.media.library import MediaLibrary
+from cratedigger.media.tags import TagReader
+from cratedigger.serato.crate import SeratoCrate
+from cratedigger.serato.library import WriteStats
+
+# Logging
+logger = getLogger(__name__)
+
+class AsyncEngine(object):
+  """Pipelined scanner and writer of a Media Library using asyncio.
+
+  On high latency volumes, such as network shares, every directory listing and
+  crate write is a round trip. Rather than loading the whole library and then
+  writing it, this engine lists folders, builds crates and writes crates all at
+  once: each folder's crate is written as soon as its folder has been listed,
+  while its subfolders are already being listed.
+
+  All blocking filesystem calls run on a thread pool, and the number of
+  listings and writes in flight are each limited by a semaphore. Crates are
+  still built on the event loop thread, and subcrates are attached to their
+  parent in listing order before they are listed, so the tree and the written
+  crates are identical to those of MediaLibrary.load and MediaLibrary.write.
+
+  Example:
+    media_library.open('/Volumes/Music/Library', cache)
+    stats = AsyncEngine(media_library, jobs=16).sync()
+
+  Attributes:
+    library (obj:`MediaLibrary`): Opened media library to load and write
+    jobs (int): Number of directories to list concurrently
+    write_jobs (int): Number of crates to write concurrently
+    sort_by (str): Tag field to sort the tracks of each crate by, if any
+    reader (obj:`TagReader`): Reader of track tags, if sorting
+    merge (bool): Merge crates with their existing .crate files
+    snapshots (obj:`SnapshotCache`): Tracks of each crate when it was last
+                                     merged, if merging
+
+  """
+
+  def __init__(self, library: MediaLibrary, jobs: int = 1, write_jobs: int = 1, sort_by: Optional[str] = None, reader: Optional[TagReader] = None, merge: bool = False, snapshots: Optional[SnapshotCache] = None) -> None:
+    """Initialize an Async Engine.
+
+    Args:
+      library (obj:`MediaLibrary`): Opened media library to load and write
+      jobs (int, optional): Number of directories to list concurrently
+      write_jobs (int, optional): Number of crates to write concurrently
+      sort_by (str, optional): Tag field to sort the tracks of each crate by,
+                               one of TAG_FIELDS
+      reader (obj:`TagReader`, optional): Reader of track tags, required if
+                                          sort_by is set
+      merge (bool, optional): Merge crates with their existing .crate files
+      snapshots (obj:`SnapshotCache`, optional): Tracks of each crate when it
+                                                 was last merged
+
+    Raises:
+      ValueError: If sort_by is set without a reader
+
+    """
+
+    if sort_by is not None and reader is None:
+      raise ValueError('A TagReader is required to sort tracks by %s' % sort_by)
+
+    self.library = library
+    self.jobs = jobs
+    self.write_jobs = write_jobs
+    self.sort_by = sort_by
+    self.reader = reader
+    self.merge = merge
+    self.snapshots = snapshots
+
+  def sync(self, dry_run: bool = False) -> WriteStats:
+    """Load all crates of the library and write them as .crate files.
+
+    The library must have been opened with MediaLibrary.open, and its crates
+    are loaded beneath its volume crate as with MediaLibrary.load.
+
+    Args:
+      dry_run (bool, optional): Compare all crates without writing any of them
+
+    Returns:
+      stats (obj:`WriteStats`): Counts of written, skipped and unchanged crates,
+                                as well as any errors encountered
+
+    """
+
+    loop = asyncio.new_event_loop()
+    try:
+      return loop.run_until_complete(self.run(dry_run))
+    finally:
+      loop.close()
+
+  async def run(self, dry_run: bool) -> WriteStats:
+    """Load and write all crates of the library on the running event loop.
+
+    If loading any folder fails, all pending listings and writes are cancelled
+    and the error is raised.
+
+    Args:
+      dry_run (bool): Compare all crates without writing any of them
+
+    Returns:
+      stats (obj:`WriteStats`): Counts of written, skipped and unchanged crates,
+                                as well as any errors encountered
+
+    """
+
+    library = self.library
+    stats = WriteStats()
+
+    if not dry_run and not os.path.exists(library.crates_path):
+      # Create the crates path if it doesn't exist
+      logger.info('Creating crates directory %s' % library.crates_path)
+      os.makedirs(library.crates_path)
+
+    # Semaphores are bound to the running loop, so they are created here
+    scans = asyncio.Semaphore(self.jobs)
+    writes = asyncio.Semaphore(self.write_jobs)
+
+    # Tasks which have not finished yet, cancelled if loading fails
+    pending = set() # type: Set[asyncio.Future]
+
+    loop = asyncio.get_event_loop()
+
+    def spawn(awaitable: Awaitable) -> asyncio.Future:
+      """Run an awaitable as a task, tracked until it is done"""
+
+      task = asyncio.ensure_future(awaitable)
+      pending.add(task)
+      task.add_done_callback(pending.discard)
+
+      return task
+
+    async def write(crate: SeratoCrate) -> None:
+      """Write a crate once a write slot is free, and count its result"""
+
+      async with writes:
+        try:
+          stats.add(await loop.run_in_executor(executor, self.write_crate, crate, dry_run))
+        except (OSError, ValueError) as e:
+          stats.errors[crate.crate_name] = e
+
+    async def load(path: str, crate: MediaCrate) -> None:
+      """List a folder once a scan slot is free, and load its crate"""
+
+      async with scans:
+        dirs, files = await loop.run_in_executor(executor, library.scan_directory, path)
+
+      crate.load_crate(path, library.volume, library.volume_path, MediaLibrary.root_name, files, library.track_table)
+
+      # Write this crate while its subfolders are being listed
+      stats.crate_names.add(crate.crate_name)
+      writers.append(spawn(write(crate)))
+
+      # Attach all subcrates in listing order before listing any of them
+      subcrates = [
+        (os.path.join(path, directory), MediaCrate(parent=crate))
+        for directory in dirs
+      ]
+
+      await asyncio.gather(*(spawn(load(*subcrate)) for subcrate in subcrates))
+
+    # Writes of all crates, awaited once all folders are loaded
+    writers = [] # type: List[asyncio.Future]
+
+    with ThreadPoolExecutor(max_workers=self.jobs + self.write_jobs) as executor:
+      try:
+        stats.crate_names.add(library.crates.crate_name)
+        writers.append(spawn(write(library.crates)))
+
+        await spawn(load(library.path, MediaCrate(parent=library.crates)))
+        await asyncio.gather(*writers)
+      except BaseException:
+        for task in list(pending):
+          task.cancel()
+
+        await asyncio.gather(*pending, return_exceptions=True)
+        raise
+
+    return stats
+
+  def write_crate(self, crate: SeratoCrate, dry_run: bool) -> str:
+    """Sort, merge and write a single crate, on the thread pool.
+
+    Args:
+      crate (obj:`SeratoCrate`): Crate to write
+      dry_run (bool): Compare the crate without writing it
+
+    Returns:
+      result (str): Result of SeratoCrate.write_crate
+
+    """
+
+    if self.sort_by is not None and self.reader is not None:
+      # Sort the tracks of the crate in place
+      self.library.sort_batch([crate], self.sort_by, self.reader)
+
+    if self.merge:
+      # Merge the crate in place
+      next(self.library.merge_crates([crate], self.snapshots))
+
+    return crate.write_crate(self.library.crates_path, dry_run)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+import os
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from typing import Any, Dict, List, Optional, Tuple
+from anytree import PreOrderIter
+from cratedigger.media.tags import TAG_FIELDS, TagReader
+
+# Logging
+logger = getLogger(__name__)
+
+class TrackIndex(object):
+  """A columnar index of the tracks in a media library.
+
+  Each field of the tracks is stored as its own column, a list with one value
+  per track, rather than as one object per track. Filters over a single field
+  only touch that field's column, and the index stays compact for libraries
+  with many tracks.
+
+  The file fields are always present. The tag fields are only present if the
+  index was built with a tag reader.
+
+  Example:
+    index.column('extension')[0] # '.flac'
+    index.column('directory')[0] # 'Music/8mm'
+    index.column('path')[0]      # 'Music/8mm/Opener.flac'
+
+  Attributes:
+    file_fields (obj:`tuple` of str): Fields determined from the file itself
+    columns (obj:`dict` of str: obj:`list`): Column of each field, by field
+
+  """
+
+  # path: Track path relative to the volume, as stored in crates
+  # extension: Lowercase extension of the track, such as .flac
+  # size: Size of the track in bytes
+  # mtime: Modification time of the track in seconds since the epoch
+  # directory: Directory of the track relative to the volume
+  file_fields = ('path', 'extension', 'size', 'mtime', 'directory')
+
+  def __init__(self, tags: bool = False) -> None:
+    """Initialize an empty Track Index.
+
+    Args:
+      tags (bool, optional): Include a column for each tag field
+
+    """
+
+    fields = TrackIndex.file_fields + (TAG_FIELDS if tags else ())
+
+    self.columns = {field: [] for field in fields} # type: Dict[str, List[Any]]
+
+  def __len__(self) -> int:
+    """Return the number of tracks in the index"""
+
+    return len(self.columns['path'])
+
+  @property
+  def fields(self) -> Tuple[str, ...]:
+    """Fields present in the index"""
+
+    return tuple(self.columns)
+
+  def column(self, field: str) -> List[Any]:
+    """Retrieve the column of a field.
+
+    Args:
+      field (str): Name of the field
+
+    Returns:
+      column (obj:`list`): Value of the field for each track
+
+    Raises:
+      ValueError: If the field is not in the index
+
+    """
+
+    try:
+      return self.columns[field]
+    except KeyError:
+      raise ValueError('Unknown track field "%s", expected one of %s' % (field, ', '.join(self.columns)))
+
+  def add(self, path: str, size: int, mtime: float, tags: Optional[Dict[str, Any]] = None) -> None:
+    """Add a track to the index.
+
+    Args:
+      path (str): Track path relative to the volume
+      size (int): Size of the track in bytes
+      mtime (float): Modification time of the track in seconds
+      tags (obj:`dict`, optional): Tags of the track, if the index has tag
+                                   columns
+
+    """
+
+    directory, _, name = path.rpartition('/')
+
+    self.columns['path'].append(path)
+    self.columns['extension'].append(os.path.splitext(name)[1].lower())
+    self.columns['size'].append(size)
+    self.columns['mtime'].append(mtime)
+    self.columns['directory'].append(directory)
+
+    if 'title' in self.columns:
+      for field in TAG_FIELDS:
+        self.columns[field].append(tags.get(field) if tags else None)
+
+  @classmethod
+  def build(cls, library: Any, jobs: int = 1, reader: Optional[TagReader] = None) -> 'TrackIndex':
+    """Build an index of all tracks in a loaded media library.
+
+    Tracks are stat'ed on a thread pool if more than one job is requested, and
+    tracks which can no longer be read are left out of the index.
+
+    Args:
+      library (obj:`MediaLibrary`): Loaded media library
+      jobs (int, optional): Number of tracks to stat concurrently
+      reader (obj:`TagReader`, optional): Reader of track tags, the index
+                                          includes the tag fields if given
+
+    Returns:
+      index (obj:`TrackIndex`): Index of the library's tracks, in the order of
+                                the library's crates
+
+    """
+
+    index = cls(tags=reader is not None)
+
+    # Distinct tracks, in crate order
+    tracks = list(dict.fromkeys(
+      track for crate in PreOrderIter(library.crates) for track in crate.tracks
+    ))
+    paths = [library.resolve_track(track) for track in tracks]
+
+    if jobs > 1:
+      with ThreadPoolExecutor(max_workers=jobs) as executor:
+        stats = list(executor.map(cls.stat_track, paths))
+    else:
+      stats = list(map(cls.stat_track, paths))
+
+    if reader is not None:
+      tags = reader.read(paths) # type: Dict[str, Dict[str, Any]]
+    else:
+      tags = {}
+
+    for track, path, stat in zip(tracks, paths, stats):
+      if stat is not None:
+        index.add(track, stat[0], stat[1], tags.get(path))
+
+    return index
+
+  @staticmethod
+  def stat_track(path: str) -> Optional[Tuple[int, float]]:
+    """Determine the size and modification time of a track.
+
+    Args:
+      path (str): Path to the track file
+
+    Returns:
+      stat (obj:`tuple`): Tuple of the size in bytes and modification time in
+                          seconds, or None if the track can't be read
+
+    """
+
+    try:
+      stat = os.stat(path)
+    except OSError as e:
+      logger.warning('Skipping unreadable track %s: %s' % (path, e))
+      return None
+
+    return stat.st_size, stat.st_mtime
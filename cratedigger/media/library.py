@@ -1,8 +1,23 @@
 #!/usr/bin/env python3
 import os
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
 from json import dumps
-from cratedigger.media.crate import MediaCrate
-from cratedigger.serato.library import SeratoLibrary
+from logging import getLogger
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
+from anytree import PreOrderIter
+from cratedigger.media.cache import ScanCache, SnapshotCache
+from cratedigger.media.crate import MediaCrate, SUPPORTED_FILE_TYPES
+from cratedigger.media.tags import TagReader, sort_key
+from cratedigger.serato.crate import SeratoCrate
+from cratedigger.serato.library import SeratoLibrary, WriteStats
+from cratedigger.serato.tracks import TrackView
+
+# Logging
+logger = getLogger(__name__)
+
+# Type var
+SC = TypeVar('SC', bound=SeratoCrate)
 
 class MediaLibrary(SeratoLibrary):
   """A library of media folders represented as Serato crates.
@@ -19,24 +34,54 @@ class MediaLibrary(SeratoLibrary):
     volume_path (str): Path to the root of the volume
     crates_path (str): Path to the Subcrates folder on the volume
     crates (obj:`MediaCrate`): Tree of all crates in the Serato library
-    root_crate (obj:`MediaCrate`): Root crate of this folder's tree, all loaded
-                                   Serato libraries are grouped under this
+    root_crate (obj:`MediaCrate`): "Media" crate of this folder's tree, the
+                                   volume crate is created under this, and
+                                   libraries which share it form a single
+                                   tree
+    cache (obj:`ScanCache`, optional): Cache of directory scans
+    tag_batch_size (int): Number of tracks whose tags are read at once when
+                          sorting crates
 
   """
 
-  root_crate = MediaCrate(parent=SeratoLibrary.root_crate)
-  root_crate.crate_name = 'Media'
+  # Name of the "Media" crate, all media crates are grouped under it
+  root_name = 'Media'
 
-  def __init__(self) -> None:
+  # Tracks whose tags are read at once when sorting crates
+  tag_batch_size = 1024
+
+  def __init__(self, root_crate: Optional[MediaCrate] = None) -> None:
     """Initialize a Media Library.
 
     This invokes the initialization method for the Serato Library.
 
+    Args:
+      root_crate (obj:`MediaCrate`, optional): "Media" crate to create the
+                                               volume crate under, defaults to
+                                               a new one
+
     """
 
-    super().__init__()
+    super().__init__(root_crate)
+
+    self.cache = None # type: Optional[ScanCache]
+
+  @classmethod
+  def create_root(cls) -> MediaCrate:
+    """Create an empty "Media" crate for the crates tree.
+
+    Returns:
+      root_crate (obj:`MediaCrate`): New "Media" crate, beneath a new "Root"
+                                     crate
+
+    """
+
+    root_crate = MediaCrate(parent=SeratoLibrary.create_root())
+    root_crate.crate_name = MediaLibrary.root_name
+
+    return root_crate
   
-  def load(self, path: str) -> None:
+  def load(self, path: str, cache: Optional[ScanCache] = None, jobs: int = 1) -> None:
     """Load a Media Library from a given path.
 
     This method traverses all folders in a given path and creates Media crates
@@ -44,42 +89,637 @@ class MediaLibrary(SeratoLibrary):
 
     Args:
       path (str): Path to load crates for.
+      cache (obj:`ScanCache`, optional): Cache of directory scans, directories
+                                         which have not been modified are
+                                         loaded from this instead of listed
+      jobs (int, optional): Number of directories to scan concurrently
+
+    """
+
+    self.open(path, cache)
+
+    # Load crates
+    self.load_crates(path, self.crates, jobs)
+
+  def stream(self, path: str, cache: Optional[ScanCache] = None, jobs: int = 1) -> Iterator[MediaCrate]:
+    """Stream the crates of a Media Library from a given path.
+
+    This scans the same folders as load, but rather than assembling the crates
+    into a tree, each crate is produced as soon as its folder has been scanned.
+    Crates are produced in the same order that write traverses a loaded
+    library, so writing the produced crates with write_crates results in the
+    same .crate files as loading and writing the library.
+
+    Produced crates are not attached to the tree, so each crate can be released
+    as soon as it has been written, and only the folders which are still
+    waiting to be scanned are held in memory.
+
+    The volume is determined before this returns, so the crates_path can be
+    overridden before the crates are produced.
+
+    Args:
+      path (str): Path to stream crates for.
+      cache (obj:`ScanCache`, optional): Cache of directory scans, directories
+                                         which have not been modified are
+                                         loaded from this instead of listed
+      jobs (int, optional): Number of directories to scan concurrently
+
+    Returns:
+      crates (obj:`iterator` of obj:`MediaCrate`): Crates of the Media Library
+
+    """
+
+    self.open(path, cache)
+
+    return self.stream_crates(path, jobs)
+
+  def stream_crates(self, path: str, jobs: int = 1) -> Iterator[MediaCrate]:
+    """Generate the crates of an opened Media Library.
+
+    Args:
+      path (str): Path to stream crates for.
+      jobs (int, optional): Number of directories to scan concurrently
+
+    Yields:
+      crate (obj:`MediaCrate`): Volume crate, followed by a crate for each
+                                media folder in pre-order
+
+    """
+
+    yield self.crates
+
+    yield from self.scan_crates(path, None, jobs)
+
+  def open(self, path: str, cache: Optional[ScanCache] = None) -> None:
+    """Prepare a Media Library for loading crates from a given path.
+
+    This determines the volume of the path and creates the volume crate, which
+    all of the library's crates are loaded beneath.
+
+    Args:
+      path (str): Path to load crates for.
+      cache (obj:`ScanCache`, optional): Cache of directory scans
 
     """
 
-    # Store the path
+    # Store the path and cache
     self.path = path
+    self.cache = cache
 
     # Determine volume name and type
     self.split_volume(path)
 
-    # Add Media root crate to the global tree
-    self.crates = MediaCrate(parent=MediaLibrary.root_crate)
+    # Add the volume crate to the library's tree
+    self.crates = MediaCrate(parent=self.root_crate) # type: MediaCrate
     self.crates.crate_name = self.volume
 
-    # Load crates
-    self.load_crates(path, self.crates)
-
-  def load_crates(self, path: str, parent: MediaCrate) -> None:
+  def load_crates(self, path: str, parent: MediaCrate, jobs: int = 1) -> None:
     """Load crates in a given media folder.
 
     This creates a MediaCrate for a given path and parent, and loads all
     compatible files into it. Then, if there are any subdirectories, it
-    recursively invokes this method to load the subcrates.
+    loads the subcrates in the same way.
+
+    The tree is traversed iteratively with an explicit stack rather than by
+    recursion, so arbitrarily deep folder structures can be loaded without
+    reaching Python's recursion limit. Crates are created in the same
+    pre-order as a recursive traversal, so children keep their listing order.
+
+    If more than one job is requested, directories are scanned on a thread
+    pool. As soon as a directory has been listed, all of its subdirectories are
+    submitted to the pool, so sibling directories are scanned concurrently.
+    Crates are still only created on this thread in pre-order, so the tree is
+    identical regardless of the order in which the scans complete.
 
     Args:
       path (str): Path to load a crate from
       parent (obj:`MediaCrate`): Parent MediaCrate for the created subcrate
+      jobs (int, optional): Number of directories to scan concurrently
+
+    """
+
+    for _ in self.scan_crates(path, parent, jobs):
+      pass
+
+  def scan_crates(self, path: str, parent: Optional[MediaCrate], jobs: int = 1) -> Iterator[MediaCrate]:
+    """Generate crates for a given media folder and all folders beneath it.
+
+    Each crate is produced as soon as its folder has been scanned, in the
+    pre-order described in load_crates.
+
+    If parent is None, crates are created without a parent rather than as a
+    tree, and their tracks are not interned in the track table, so that no
+    crate or track is referenced by the library once it has been produced.
+
+    Args:
+      path (str): Path to load a crate from
+      parent (obj:`MediaCrate`): Parent MediaCrate for the created subcrate,
+                                 or None to create detached crates
+      jobs (int, optional): Number of directories to scan concurrently
+
+    Yields:
+      crate (obj:`MediaCrate`): Crate for each media folder
+
+    """
+
+    # Detached crates are released once produced, so their tracks are not
+    # interned in the library wide table, which would keep every track path
+    if parent is None:
+      table = None
+    else:
+      table = self.track_table
+
+    # Thread pool for scanning directories, if scanning concurrently
+    if jobs > 1:
+      executor = ThreadPoolExecutor(max_workers=jobs)
+    else:
+      executor = None
+
+    try:
+      # Stack of pending folder scans left to load, along with their parent
+      # crate
+      stack = [(self.submit_scan(executor, path), path, parent)]
+
+      while stack:
+        scan, path, parent = stack.pop()
+
+        # Wait for the directory listing, once for both tracks and subdirectories
+        dirs, tracks = scan.result()
+
+        # Create new subcrate and load it
+        child = MediaCrate(parent=parent)
+        child.load_crate(path, self.volume, self.volume_path, MediaLibrary.root_name, tracks, table)
+
+        # Parent of the subcrates, detached crates have detached subcrates
+        if parent is None:
+          subcrate_parent = None
+        else:
+          subcrate_parent = child
+
+        # If this crate has subdirectories, start scanning all of them in
+        # listing order
+        subcrates = []
+        for directory in dirs:
+          subcrate_path = os.path.join(path, directory)
+          subcrates.append((self.submit_scan(executor, subcrate_path), subcrate_path, subcrate_parent))
+
+        # These are pushed in reverse so that they are popped in listing order
+        stack.extend(reversed(subcrates))
+
+        # The subdirectories are already being scanned while this is consumed
+        yield child
+
+        # Release the crate before waiting on the next scan
+        del child
+    finally:
+      if executor is not None:
+        # Cancel any pending scans if loading failed
+        for scan, _, _ in stack:
+          scan.cancel()
+
+        executor.shutdown(wait=True)
+
+  def submit_scan(self, executor: Optional[ThreadPoolExecutor], path: str) -> Future:
+    """Scan a media folder, either on a thread pool or immediately.
+
+    Args:
+      executor (obj:`ThreadPoolExecutor`): Thread pool to scan on, or None to
+                                           scan on the current thread
+      path (str): Path of the directory to scan
+
+    Returns:
+      scan (obj:`Future`): Future resolving to the result of scan_directory
+
+    """
+
+    if executor is not None:
+      return executor.submit(self.scan_directory, path)
+
+    # Scan immediately and wrap the result in a completed future
+    scan = Future() # type: Future
+    try:
+      scan.set_result(self.scan_directory(path))
+    except Exception as e:
+      scan.set_exception(e)
+
+    return scan
+
+  def folder_path(self, crate: MediaCrate) -> str:
+    """Determine the path of the media folder of a crate.
+
+    Args:
+      crate (obj:`MediaCrate`): Crate loaded from a media folder
+
+    Returns:
+      path (str): Path of the media folder, as it was loaded
+
+    """
+
+    # The crate path is the folder path with the volume path removed
+    return self.volume_path + crate.crate_path
+
+  def rescan(self, paths: Iterable[str], jobs: int = 1) -> Tuple[List[MediaCrate], List[MediaCrate]]:
+    """Rescan changed media folders of a loaded Media Library.
+
+    Only the given folders are listed again, rather than the whole library.
+    The tracks of each folder's crate are replaced with the tracks now in the
+    folder, crates are loaded for any new subfolders along with everything
+    beneath them, and the crates of subfolders which no longer exist are
+    removed from the tree along with their subcrates. Subcrates keep the
+    listing order of their folder.
+
+    Folders which are not part of the library, or which no longer exist, are
+    skipped, as the rescan of their parent folder takes care of them.
+
+    Args:
+      paths (obj:`iterable` of str): Paths of the changed media folders
+      jobs (int, optional): Number of new folders to scan concurrently
+
+    Returns:
+      changes (obj:`tuple`): Tuple of the crates which changed or were added,
+                             and the crates which were removed
+
+    """
+
+    # Crate of each media folder, by the folder path
+    crates = {
+      self.folder_path(crate): crate
+      for crate in PreOrderIter(self.crates) if crate is not self.crates
+    } # type: Dict[str, MediaCrate]
+
+    changed = [] # type: List[MediaCrate]
+    removed = [] # type: List[MediaCrate]
+
+    # Parents sort before their subfolders, so a removed subtree is dropped
+    # before any of its folders would be rescanned
+    for path in sorted(paths):
+      crate = crates.get(path)
+      if crate is None:
+        continue
+
+      try:
+        dirs, files = self.scan_directory(path)
+      except (FileNotFoundError, NotADirectoryError):
+        logger.debug('Skipping removed media folder %s' % path)
+        continue
+
+      # Reload the tracks of the folder
+      tracks = crate.tracks
+      crate.tracks = []
+      crate.load_crate(path, self.volume, self.volume_path, MediaLibrary.root_name, files, self.track_table)
+
+      if crate.tracks != tracks:
+        changed.append(crate)
+
+      # Existing subcrates, by their folder path
+      children = {self.folder_path(child): child for child in crate.children}
+
+      subcrates = []
+      for directory in dirs:
+        subcrate_path = os.path.join(path, directory)
+        child = children.pop(subcrate_path, None)
+
+        if child is None:
+          # New folder, load it and everything beneath it
+          added = [] # type: List[MediaCrate]
+          try:
+            added.extend(self.scan_crates(subcrate_path, crate, jobs))
+          except (FileNotFoundError, NotADirectoryError):
+            logger.debug('Skipping removed media folder %s' % subcrate_path)
+
+            if added:
+              # Drop the partially loaded subtree
+              added[0].parent = None
+
+            continue
+
+          changed.extend(added)
+          child = added[0]
+
+        subcrates.append(child)
+
+      for child in children.values():
+        # Folder no longer exists, remove its subtree
+        for subcrate in PreOrderIter(child):
+          del crates[self.folder_path(subcrate)]
+          removed.append(subcrate)
+
+        child.parent = None
+
+      crate.children = subcrates
+
+    return changed, removed
+
+  def write(self, dry_run: bool = False, jobs: int = 1, recursive_tracks: bool = False, sort_by: Optional[str] = None, reader: Optional[TagReader] = None, merge: bool = False, snapshots: Optional[SnapshotCache] = None) -> WriteStats:
+    """Write all crates in a Media Library as .crate files.
+
+    If recursive_tracks is set, each crate contains the tracks of its media
+    folder followed by the tracks of all folders beneath it, rather than only
+    the tracks directly within its folder.
+
+    If sort_by is set, the tracks of each crate are sorted by the given tag
+    field before the crate is written, rather than kept in listing order.
+
+    If merge is set, each crate is merged with its existing .crate file rather
+    than replacing it, see merge_crates.
+
+    Args:
+      dry_run (bool, optional): Compare all crates without writing any of them
+      jobs (int, optional): Number of crates to write concurrently
+      recursive_tracks (bool, optional): Include the tracks of all subfolders
+                                         in each crate
+      sort_by (str, optional): Tag field to sort the tracks of each crate by,
+                               one of TAG_FIELDS
+      reader (obj:`TagReader`, optional): Reader of track tags, required if
+                                          sort_by is set
+      merge (bool, optional): Merge crates with their existing .crate files
+      snapshots (obj:`SnapshotCache`, optional): Tracks of each crate when it
+                                                 was last merged
+
+    Returns:
+      stats (obj:`WriteStats`): Counts of written, skipped and unchanged crates,
+                                as well as any errors encountered
+
+    Raises:
+      ValueError: If sort_by is set without a reader
+
+    """
+
+    if recursive_tracks:
+      crates = self.iter_recursive_crates() # type: Iterable[SeratoCrate]
+    else:
+      crates = PreOrderIter(self.crates)
+
+    if sort_by is not None:
+      if reader is None:
+        raise ValueError('A TagReader is required to sort tracks by %s' % sort_by)
+
+      crates = self.sort_crates(crates, sort_by, reader)
+
+    if merge:
+      crates = self.merge_crates(crates, snapshots)
+
+    return self.write_crates(crates, dry_run, jobs)
+
+  def sort_crates(self, crates: Iterable[SC], sort_by: str, reader: TagReader) -> Iterator[SC]:
+    """Sort the tracks of crates by a tag field as they are produced.
+
+    Crates are collected into batches of up to tag_batch_size tracks, and the
+    tags of each batch are read at once, so the tags of many small crates can
+    be read concurrently. Tracks with the same value keep their order, and
+    tracks without a value are sorted last.
+
+    Args:
+      crates (obj:`iterable` of obj:`SeratoCrate`): Crates to sort
+      sort_by (str): Tag field to sort the tracks by, one of TAG_FIELDS
+      reader (obj:`TagReader`): Reader of track tags
+
+    Yields:
+      crate (obj:`SeratoCrate`): Each crate, with its tracks sorted
+
+    """
+
+    batch = [] # type: List[SC]
+    batch_tracks = 0
+
+    for crate in crates:
+      batch.append(crate)
+      batch_tracks += len(crate.tracks)
+
+      if batch_tracks >= MediaLibrary.tag_batch_size:
+        yield from self.sort_batch(batch, sort_by, reader)
+
+        batch = []
+        batch_tracks = 0
+
+    yield from self.sort_batch(batch, sort_by, reader)
+
+  def sort_batch(self, crates: List[SC], sort_by: str, reader: TagReader) -> List[SC]:
+    """Sort the tracks of a batch of crates by a tag field.
+
+    Args:
+      crates (obj:`list` of obj:`SeratoCrate`): Crates to sort
+      sort_by (str): Tag field to sort the tracks by, one of TAG_FIELDS
+      reader (obj:`TagReader`): Reader of track tags
+
+    Returns:
+      crates (obj:`list` of obj:`SeratoCrate`): The given crates
+
+    """
+
+    tags = reader.read(
+      self.resolve_track(track) for crate in crates for track in crate.tracks
+    )
+
+    for crate in crates:
+      crate.tracks = sorted(
+        crate.tracks,
+        key=lambda track: sort_key(tags[self.resolve_track(track)].get(sort_by))
+      )
+
+    return crates
+
+  def merge_crates(self, crates: Iterable[SC], snapshots: Optional[SnapshotCache] = None) -> Iterator[SC]:
+    """Merge crates with the .crate files on disk as they are produced.
+
+    Each crate is three-way merged with its existing .crate file, using the
+    tracks of the crate when it was last merged as the base, so tracks added,
+    removed or reordered in Serato are kept and only the changes to the media
+    folder are applied. Crates without an existing .crate file are produced as
+    is, and unreadable .crate files are replaced.
+
+    A crate without a snapshot, such as on the first merge, keeps all of its
+    existing tracks, apart from those which are not in its folder and whose
+    files no longer exist.
+
+    The new tracks of each crate are stored in the snapshots as the base of the
+    next merge. Snapshots of crates which then fail to write should be reverted.
+
+    Args:
+      crates (obj:`iterable` of obj:`SeratoCrate`): Crates to merge
+      snapshots (obj:`SnapshotCache`, optional): Tracks of each crate when it
+                                                 was last merged
+
+    Yields:
+      crate (obj:`SeratoCrate`): Each crate, with its tracks merged
 
     """
-    
-    # Create new subcrate and load it
-    child = MediaCrate(parent=parent)
-    child.load_crate(path, self.volume, self.volume_path, MediaLibrary.root_crate.crate_name)
 
-    for file in os.listdir(path):
-      # If this crate has subdirectories, load the subcrates
-      full_path = os.path.join(path, file)
+    for crate in crates:
+      crate_path = os.path.join(self.crates_path, '%s.crate' % crate.crate_name)
+      tracks = crate.tracks
+
+      existing = SeratoCrate()
+      try:
+        existing.load_crate(crate_path)
+        loaded = True
+      except FileNotFoundError:
+        # Nothing to merge with
+        loaded = False
+      except (OSError, ValueError) as e:
+        logger.warning('Replacing unreadable Serato crate %s: %s' % (crate_path, e))
+        loaded = False
+
+      if loaded:
+        base = snapshots.get(crate.crate_name) if snapshots is not None else None
+
+        if base is None:
+          # Without a snapshot, tracks outside of the folder may have been added
+          # in Serato, so only those whose files no longer exist are removed
+          base = self.missing_tracks(existing.tracks, set(tracks))
+
+        added, removed = crate.merge_tracks(existing, base)
+
+        logger.debug('Merged Serato crate %s, %d tracks added, %d tracks removed' % (crate_path, added, removed))
+
+      if snapshots is not None:
+        snapshots.set(crate.crate_name, tracks)
+
+      yield crate
+
+  def missing_tracks(self, tracks: Iterable[str], present: Set[str]) -> List[str]:
+    """Find the tracks of a crate whose files no longer exist.
+
+    Args:
+      tracks (obj:`iterable` of str): Tracks of the crate
+      present (obj:`set` of str): Tracks which are known to exist, and which
+                                  are not checked
+
+    Returns:
+      missing (obj:`list` of str): Tracks whose files do not exist
+
+    """
+
+    return [
+      track for track in dict.fromkeys(tracks)
+      if track not in present and not os.path.exists(self.resolve_track(track))
+    ]
+
+  def prune(self, stats: WriteStats, dry_run: bool = False) -> List[str]:
+    """Delete stale crates of this Media Library's volume.
+
+    Crates on the volume which were not produced by the write which returned
+    the given stats, such as the crates of folders which have since been
+    renamed or removed, are deleted from the crates_path. Only crates beneath
+    Media/<volume> are pruned, so the Media/<volume> crate itself and crates
+    outside of it are never touched.
+
+    Args:
+      stats (obj:`WriteStats`): Stats returned by write or write_crates
+      dry_run (bool, optional): Determine the stale crates without deleting any
+                                of them
+
+    Returns:
+      pruned (obj:`list` of str): Names of the stale crates, in sorted order
+
+    """
+
+    prefix = MediaLibrary.root_name + SeratoCrate.delimiter + self.volume
+
+    return self.prune_crates(prefix, stats, dry_run)
+
+  def iter_recursive_crates(self) -> Iterator[SeratoCrate]:
+    """Generate crates containing the tracks of all subfolders.
+
+    The tree is traversed once, and each crate is produced as soon as all of
+    its subcrates have been. The tracks of a crate are its own tracks followed
+    by the tracks of each of its subcrates in order, so no folder is listed or
+    traversed more than once.
+
+    The IDs of the tracks of each crate are appended to a single array as the
+    crate is first visited, in pre-order, so the tracks of every subtree are a
+    contiguous range of the array. Each crate is produced with a view of its
+    range rather than a copy of the tracks of its subcrates, so the tracks of
+    the library are held once, no matter how deep the tree is. The volume crate
+    only contains its own tracks, as it would otherwise contain every track on
+    the volume, and the crates in the tree are left unchanged.
+
+    Example:
+      Music (a.mp3)
+      └── Music/8mm (b.mp3)
+          └── Music/8mm/Opener EP (c.mp3)
+
+      Music/8mm/Opener EP: c.mp3
+      Music/8mm: b.mp3, c.mp3
+      Music: a.mp3, b.mp3, c.mp3
+
+    Yields:
+      crate (obj:`SeratoCrate`): Crate with the name of a crate in the tree and
+                                 the tracks of it and all of its subcrates
+
+    """
+
+    table = self.track_table
+
+    # IDs of the tracks of all crates visited so far, in pre-order
+    track_ids = array('l')
+
+    # Stack of crates left to visit, whether their subcrates have been visited
+    # yet, and the offset of their tracks in the track IDs once visited
+    stack = [(self.crates, False, 0)] # type: List[Tuple[SeratoCrate, bool, int]]
+
+    while stack:
+      crate, visited, start = stack.pop()
+
+      if not visited:
+        # Visit all subcrates first, in order, and then this crate again
+        stack.append((crate, True, len(track_ids)))
+        stack.extend((child, False, 0) for child in reversed(crate.children))
+
+        track_ids.extend(map(table.id, crate.tracks))
+        continue
+
+      if crate is self.crates:
+        # Only the own tracks of the volume crate
+        end = start + len(crate.tracks)
+      else:
+        # Own tracks followed by the tracks of each subcrate
+        end = len(track_ids)
+
+      recursive_crate = SeratoCrate()
+      recursive_crate.crate_name = crate.crate_name
+      recursive_crate.tracks = TrackView(table, track_ids, start, end)
+
+      yield recursive_crate
+
+  def scan_directory(self, path: str) -> Tuple[List[str], List[str]]:
+    """List the subdirectories and supported tracks in a media folder.
+
+    The directory is listed exactly once with os.scandir, and the file type
+    information returned by the listing is used to tell directories apart
+    from tracks without an additional stat per entry.
+
+    If a scan cache is in use and the directory has not been modified since it
+    was cached, the cached listing is returned instead.
+
+    Args:
+      path (str): Path of the directory to list
+
+    Returns:
+      scan (obj:`tuple`): Tuple of child directory names and track file names
+
+    """
+
+    if self.cache is not None:
+      # Check the cache against the directory's modification time
+      mtime = os.stat(path).st_mtime_ns
+
+      scan = self.cache.get(path, mtime)
+      if scan is not None:
+        return scan
+
+    dirs = []
+    tracks = []
+
+    with os.scandir(path) as entries:
+      for entry in entries:
+        if entry.is_dir():
+          dirs.append(entry.name)
+        elif entry.name.endswith(SUPPORTED_FILE_TYPES):
+          tracks.append(entry.name)
+
+    if self.cache is not None:
+      # Store the listing in the cache
+      self.cache.set(path, mtime, dirs, tracks)
 
-      if os.path.isdir(full_path):
-        self.load_crates(full_path, child)
+    return dirs, tracks
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+import os
+from logging import getLogger
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+from anytree import PreOrderIter
+from cratedigger.serato.crate import SeratoCrate
+from cratedigger.serato.library import SeratoLibrary
+
+# Logging
+logger = getLogger(__name__)
+
+# Planned changes to a crate
+# new: There is no .crate file, so the crate would be created
+# changed: The .crate file differs, so the crate would be rewritten
+# unchanged: The .crate file already has the same contents
+# stale: The .crate file was not produced by the sync, so it would be pruned
+NEW = 'new'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+STALE = 'stale'
+
+# All planned changes, in the order they are reported
+STATUSES = (NEW, CHANGED, UNCHANGED, STALE)
+
+class CratePlan(object):
+  """Planned change to a single crate.
+
+  Attributes:
+    crate_name (str): Name of the crate
+    status (str): One of NEW, CHANGED, UNCHANGED or STALE
+    added (obj:`list` of str): Tracks which would be added to the crate
+    removed (obj:`list` of str): Tracks which would be removed from the crate
+    reordered (bool): The crate would keep the same tracks in another order
+
+  """
+
+  __slots__ = ('crate_name', 'status', 'added', 'removed', 'reordered')
+
+  def __init__(self, crate_name: str, status: str, added: Optional[List[str]] = None, removed: Optional[List[str]] = None, reordered: bool = False) -> None:
+    """Initialize a Crate Plan.
+
+    Args:
+      crate_name (str): Name of the crate
+      status (str): One of NEW, CHANGED, UNCHANGED or STALE
+      added (obj:`list` of str, optional): Tracks which would be added
+      removed (obj:`list` of str, optional): Tracks which would be removed
+      reordered (bool, optional): The tracks would be reordered
+
+    """
+
+    self.crate_name = crate_name
+    self.status = status
+    self.added = added or []
+    self.removed = removed or []
+    self.reordered = reordered
+
+  def __str__(self) -> str:
+    """Return a one line summary of the planned change"""
+
+    summary = '%s %s' % (self.status, self.crate_name.replace(SeratoCrate.delimiter, '/'))
+
+    if self.added or self.removed:
+      summary += ' (+%d -%d)' % (len(self.added), len(self.removed))
+    elif self.reordered:
+      summary += ' (reordered)'
+
+    return summary
+
+  def to_dict(self) -> Dict[str, Any]:
+    """Return the planned change as a dictionary for JSON output"""
+
+    return {
+      'crate_name': self.crate_name,
+      'status': self.status,
+      'added': self.added,
+      'removed': self.removed,
+      'reordered': self.reordered
+    }
+
+class SyncPlan(object):
+  """Plan of the changes a sync would make to the crates in a crates_path.
+
+  The crates a sync would write are compared to the .crate files of an
+  existing Serato Library. Existing crates are indexed by name once, and the
+  tracks of each crate are compared as sets, so a plan is built in time linear
+  in the number of crates and tracks, no matter how many crates there are.
+
+  A crate whose tracks are unchanged is still compared byte for byte with its
+  .crate file, so changes to its columns or sorting are planned as well, and a
+  crate is only planned as unchanged if a sync would leave it untouched.
+
+  Attributes:
+    crates_path (str): Path to the Subcrates folder which is compared
+    crates (obj:`list` of obj:`CratePlan`): Planned change to each crate, in
+                                            the order the crates are written,
+                                            followed by stale crates
+    tracks_added (int): Tracks which would be added to all crates
+    tracks_removed (int): Tracks which would be removed from all crates
+
+  """
+
+  def __init__(self, crates_path: str) -> None:
+    """Initialize an empty Sync Plan.
+
+    Args:
+      crates_path (str): Path to the Subcrates folder which is compared
+
+    """
+
+    self.crates_path = crates_path
+    self.crates = [] # type: List[CratePlan]
+    self.tracks_added = 0
+    self.tracks_removed = 0
+
+  def __str__(self) -> str:
+    """Return a string representation of the counts of the plan"""
+
+    counts = self.counts()
+
+    return '%d new, %d changed, %d unchanged, %d stale, %d tracks added, %d tracks removed' % (
+      counts[NEW], counts[CHANGED], counts[UNCHANGED], counts[STALE],
+      self.tracks_added, self.tracks_removed
+    )
+
+  def counts(self) -> Dict[str, int]:
+    """Count the planned crates of each status.
+
+    Returns:
+      counts (obj:`dict` of str: int): Number of crates by status
+
+    """
+
+    counts = {status: 0 for status in STATUSES}
+
+    for crate_plan in self.crates:
+      counts[crate_plan.status] += 1
+
+    return counts
+
+  @property
+  def changes(self) -> List[CratePlan]:
+    """Planned crates which would be created, rewritten or pruned"""
+
+    return [crate_plan for crate_plan in self.crates if crate_plan.status != UNCHANGED]
+
+  def to_dict(self) -> Dict[str, Any]:
+    """Return the plan as a dictionary for JSON output"""
+
+    return {
+      'crates_path': self.crates_path,
+      'counts': self.counts(),
+      'tracks_added': self.tracks_added,
+      'tracks_removed': self.tracks_removed,
+      'crates': [crate_plan.to_dict() for crate_plan in self.changes]
+    }
+
+  def add(self, crate_plan: CratePlan) -> None:
+    """Add the planned change to a crate to the plan.
+
+    Args:
+      crate_plan (obj:`CratePlan`): Planned change to the crate
+
+    """
+
+    self.crates.append(crate_plan)
+    self.tracks_added += len(crate_plan.added)
+    self.tracks_removed += len(crate_plan.removed)
+
+  def compare(self, crates: Iterable[SeratoCrate], existing: Optional[SeratoLibrary] = None, prune_prefix: Optional[str] = None) -> None:
+    """Plan the changes of writing a number of crates over a Serato Library.
+
+    Crate names are compared case insensitively, as when pruning. Existing
+    crates which fail to parse are planned as changed, as a sync would replace
+    them.
+
+    Args:
+      crates (obj:`iterable` of obj:`SeratoCrate`): Crates a sync would write
+      existing (obj:`SeratoLibrary`, optional): Library loaded from the
+                                                crates_path, preferably
+                                                lazily, or None if it has no
+                                                .crate files yet
+      prune_prefix (str, optional): Name of the crate whose descendants would
+                                    be pruned, such as Media%%root, if pruning
+
+    """
+
+    # Existing crates with a .crate file, by name
+    existing_crates = {} # type: Dict[str, SeratoCrate]
+    if existing is not None:
+      for crate in PreOrderIter(existing.crates):
+        if crate.source is not None:
+          existing_crates[crate.crate_name.casefold()] = crate
+
+    planned = set() # type: Set[str]
+
+    for crate in crates:
+      key = crate.crate_name.casefold()
+      planned.add(key)
+
+      self.add(self.compare_crate(crate, existing_crates.get(key)))
+
+    if prune_prefix is None:
+      return
+
+    subcrate_prefix = prune_prefix + SeratoCrate.delimiter
+    for key in sorted(existing_crates.keys() - planned):
+      crate = existing_crates[key]
+
+      if crate.crate_name.startswith(subcrate_prefix):
+        self.add(CratePlan(crate.crate_name, STALE, removed=unique(self.existing_tracks(crate) or ())))
+
+  def compare_crate(self, crate: SeratoCrate, existing: Optional[SeratoCrate] = None) -> CratePlan:
+    """Plan the change of writing a single crate.
+
+    Args:
+      crate (obj:`SeratoCrate`): Crate a sync would write
+      existing (obj:`SeratoCrate`, optional): Crate loaded from its existing
+                                              .crate file, if any
+
+    Returns:
+      crate_plan (obj:`CratePlan`): Planned change to the crate
+
+    """
+
+    tracks = crate.tracks
+
+    if existing is None:
+      return CratePlan(crate.crate_name, NEW, added=unique(tracks))
+
+    existing_tracks = self.existing_tracks(existing)
+    if existing_tracks is None:
+      return CratePlan(crate.crate_name, CHANGED, added=unique(tracks))
+
+    track_set = set(tracks)
+    existing_set = set(existing_tracks)
+
+    added = unique(track for track in tracks if track not in existing_set)
+    removed = unique(track for track in existing_tracks if track not in track_set)
+
+    if added or removed:
+      return CratePlan(crate.crate_name, CHANGED, added, removed)
+
+    if list(tracks) != list(existing_tracks):
+      return CratePlan(crate.crate_name, CHANGED, reordered=True)
+
+    # Same tracks, so only the rest of the crate can differ
+    if SeratoCrate.is_unchanged(os.path.join(self.crates_path, '%s.crate' % crate.crate_name), crate.to_bytes()):
+      return CratePlan(crate.crate_name, UNCHANGED)
+
+    return CratePlan(crate.crate_name, CHANGED)
+
+  @staticmethod
+  def existing_tracks(crate: SeratoCrate) -> Optional[Sequence[str]]:
+    """Parse the tracks of an existing crate, if it can be parsed.
+
+    The contents of the crate are dropped again once its tracks have been
+    read, so a lazily loaded library is only parsed one crate at a time.
+
+    Args:
+      crate (obj:`SeratoCrate`): Crate loaded from a .crate file
+
+    Returns:
+      tracks (obj:`list` of str): Tracks of the crate, or None if its .crate
+                                  file can't be parsed
+
+    """
+
+    try:
+      tracks = crate.tracks
+    except (OSError, ValueError) as e:
+      logger.warning('Unable to parse Serato crate %s: %s' % (crate.source, e))
+      return None
+    finally:
+      crate.unload()
+
+    return tracks
+
+def unique(tracks: Iterable[str]) -> List[str]:
+  """Deduplicate tracks, keeping the order of their first occurrence.
+
+  Args:
+    tracks (obj:`iterable` of str): Tracks, possibly with duplicates
+
+  Returns:
+    tracks (obj:`list` of str): Distinct tracks
+
+  """
+
+  return list(dict.fromkeys(tracks))
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+import re
+import time
+from json import load
+from logging import getLogger
+from typing import Any, Callable, Dict, List, Set
+from cratedigger.media.index import TrackIndex
+from cratedigger.media.tags import TAG_FIELDS
+from cratedigger.serato.crate import SeratoCrate
+
+# Logging
+logger = getLogger(__name__)
+
+# Predicate over the row of a track in an index
+Predicate = Callable[[int], bool]
+
+# Seconds in a day, for within_days conditions
+DAY = 24 * 60 * 60
+
+class SmartRules(object):
+  """A set of rules defining smart crates.
+
+  Each rule names a crate and lists conditions on the fields of a track. A
+  track is added to the crate if it matches all of the conditions in "all",
+  and at least one of the conditions in "any" if present.
+
+  Rules are compiled into predicates over the columns of a TrackIndex, and all
+  rules are evaluated in a single pass over the tracks of the index.
+
+  Example:
+    [
+      {
+        "name": "Techno/FLAC",
+        "all": [
+          {"field": "extension", "eq": ".flac"},
+          {"field": "directory", "under": "Music/Techno"}
+        ]
+      },
+      {
+        "name": "Recently Added",
+        "all": [{"field": "mtime", "within_days": 30}]
+      }
+    ]
+
+  Attributes:
+    rules (obj:`list` of obj:`dict`): Rules of each smart crate
+    names (obj:`list` of str): Crate name of each rule, with its folders
+                               joined by the crate delimiter
+    operators (obj:`tuple` of str): Supported condition operators
+
+  """
+
+  operators = (
+    'eq',
+    'ne',
+    'in',
+    'lt',
+    'le',
+    'gt',
+    'ge',
+    'between',
+    'contains',
+    'matches',
+    'under',
+    'within_days'
+  )
+
+  def __init__(self, rules: List[Dict[str, Any]]) -> None:
+    """Initialize a set of Smart Rules.
+
+    Args:
+      rules (obj:`list` of obj:`dict`): Rules of each smart crate
+
+    Raises:
+      ValueError: If the rules are malformed
+
+    """
+
+    if not isinstance(rules, list):
+      raise ValueError('Smart rules must be a list of rules')
+
+    self.names = [] # type: List[str]
+
+    # Names are compared case insensitively, as when pruning
+    seen = set() # type: Set[str]
+    for rule in rules:
+      if not isinstance(rule, dict) or not isinstance(rule.get('name'), str) or not rule['name'].strip('/\\'):
+        raise ValueError('Each smart rule must have a name')
+
+      # Folders in the rule name become subcrates
+      name = SeratoCrate.delimiter.join(
+        part for part in rule['name'].replace('\\', '/').split('/') if part
+      )
+
+      if name.casefold() in seen:
+        raise ValueError('Duplicate smart rule "%s"' % rule['name'])
+
+      seen.add(name.casefold())
+      self.names.append(name)
+
+      for group in ('all', 'any'):
+        if not isinstance(rule.get(group, []), list):
+          raise ValueError('Conditions of smart rule "%s" must be a list' % rule['name'])
+
+    self.rules = rules
+
+  @classmethod
+  def load(cls, path: str) -> 'SmartRules':
+    """Load a set of Smart Rules from a JSON file.
+
+    Args:
+      path (str): Path to the rules file
+
+    Returns:
+      rules (obj:`SmartRules`): Rules in the file
+
+    Raises:
+      ValueError: If the file is not valid JSON or the rules are malformed
+
+    """
+
+    with open(path, 'r', encoding='utf-8') as rules_file:
+      return cls(load(rules_file))
+
+  @property
+  def fields(self) -> Set[str]:
+    """Track fields used by the conditions of all rules"""
+
+    return {
+      condition['field'] for rule in self.rules
+      for group in ('all', 'any') for condition in rule.get(group, [])
+      if isinstance(condition, dict) and isinstance(condition.get('field'), str)
+    }
+
+  @property
+  def uses_tags(self) -> bool:
+    """Whether any rule has a condition on a tag field"""
+
+    return not self.fields.isdisjoint(TAG_FIELDS)
+
+  def compile(self, index: TrackIndex) -> List[Predicate]:
+    """Compile each rule into a predicate over the tracks of an index.
+
+    Args:
+      index (obj:`TrackIndex`): Index to evaluate the rules against
+
+    Returns:
+      predicates (obj:`list` of obj:`callable`): Predicate of each rule, which
+                                                 takes the row of a track
+
+    Raises:
+      ValueError: If a condition is malformed or uses an unknown field
+
+    """
+
+    predicates = [] # type: List[Predicate]
+
+    # Reference time for within_days conditions, shared by all rules
+    now = time.time()
+
+    for rule in self.rules:
+      try:
+        every = [self.compile_condition(condition, index, now) for condition in rule.get('all', [])]
+        some = [self.compile_condition(condition, index, now) for condition in rule.get('any', [])]
+      except ValueError as e:
+        raise ValueError('Invalid smart rule "%s": %s' % (rule['name'], e))
+
+      predicates.append(self.combine(every, some))
+
+    return predicates
+
+  @staticmethod
+  def combine(every: List[Predicate], some: List[Predicate]) -> Predicate:
+    """Combine the predicates of a rule's conditions.
+
+    Args:
+      every (obj:`list` of obj:`callable`): Predicates which must all match
+      some (obj:`list` of obj:`callable`): Predicates of which at least one must
+                                           match, if any
+
+    Returns:
+      predicate (obj:`callable`): Combined predicate
+
+    """
+
+    if not some:
+      if len(every) == 1:
+        return every[0]
+
+      return lambda row: all(predicate(row) for predicate in every)
+
+    return lambda row: (
+      all(predicate(row) for predicate in every)
+      and any(predicate(row) for predicate in some)
+    )
+
+  def compile_condition(self, condition: Dict[str, Any], index: TrackIndex, now: float) -> Predicate:
+    """Compile a single condition into a predicate.
+
+    Each condition has a field and exactly one operator. Tracks without a value
+    for the field, such as untagged tracks, never match.
+
+    Args:
+      condition (obj:`dict`): Condition, such as {"field": "size", "gt": 100}
+      index (obj:`TrackIndex`): Index to evaluate the condition against
+      now (float): Reference time for within_days conditions
+
+    Returns:
+      predicate (obj:`callable`): Predicate which takes the row of a track
+
+    Raises:
+      ValueError: If the condition is malformed or uses an unknown field
+
+    """
+
+    if not isinstance(condition, dict) or 'field' not in condition:
+      raise ValueError('Each condition must have a field')
+
+    operators = [key for key in condition if key != 'field']
+    if len(operators) != 1 or operators[0] not in SmartRules.operators:
+      raise ValueError('Each condition must have exactly one of %s' % ', '.join(SmartRules.operators))
+
+    field = condition['field']
+    operator = operators[0]
+    value = condition[operator]
+
+    column = index.column(field)
+
+    if operator == 'eq':
+      test = lambda x: x == value
+    elif operator == 'ne':
+      test = lambda x: x != value
+    elif operator == 'in':
+      if not isinstance(value, list):
+        raise ValueError('"in" requires a list of values')
+
+      try:
+        values = set(value)
+      except TypeError:
+        raise ValueError('"in" requires a list of plain values')
+
+      test = lambda x: x in values
+    elif operator == 'lt':
+      test = lambda x: x < value
+    elif operator == 'le':
+      test = lambda x: x <= value
+    elif operator == 'gt':
+      test = lambda x: x > value
+    elif operator == 'ge':
+      test = lambda x: x >= value
+    elif operator == 'between':
+      if not isinstance(value, list) or len(value) != 2:
+        raise ValueError('"between" requires a list of a minimum and a maximum')
+
+      low, high = value
+      test = lambda x: low <= x <= high
+    elif operator == 'contains':
+      text = str(value).casefold()
+      test = lambda x: text in str(x).casefold()
+    elif operator == 'matches':
+      try:
+        pattern = re.compile(value, re.IGNORECASE)
+      except (re.error, TypeError) as e:
+        raise ValueError('Invalid pattern "%s": %s' % (value, e))
+
+      test = lambda x: pattern.search(str(x)) is not None
+    elif operator == 'under':
+      if field not in ('path', 'directory'):
+        raise ValueError('"under" is only supported for the path and directory fields')
+
+      # Match the folder itself and everything beneath it
+      folder = str(value).replace('\\', '/').strip('/')
+      subfolder = folder + '/'
+      test = lambda x: x == folder or x.startswith(subfolder)
+    else:
+      if field != 'mtime':
+        raise ValueError('"within_days" is only supported for the mtime field')
+
+      try:
+        since = now - float(value) * DAY
+      except (TypeError, ValueError):
+        raise ValueError('"within_days" requires a number of days')
+      test = lambda x: x >= since
+
+    def predicate(row: int) -> bool:
+      value = column[row]
+
+      if value is None:
+        return False
+
+      try:
+        return test(value)
+      except TypeError:
+        # Value of a different type, such as a text BPM compared to a number
+        return False
+
+    return predicate
+
+  def evaluate(self, index: TrackIndex, prefix: str) -> List[SeratoCrate]:
+    """Evaluate all rules against an index in a single pass.
+
+    Each track of the index is tested against every rule once, in index order,
+    and added to the crate of each rule it matches.
+
+    Args:
+      index (obj:`TrackIndex`): Index of the tracks to evaluate
+      prefix (str): Name of the crate all smart crates are grouped under
+
+    Returns:
+      crates (obj:`list` of obj:`SeratoCrate`): Smart crate of each rule, in
+                                                rule order
+
+    """
+
+    predicates = self.compile(index)
+    paths = index.column('path')
+
+    # Tracks of each rule's crate
+    matches = [[] for _ in predicates] # type: List[List[str]]
+    rules = list(zip(predicates, matches))
+
+    for row in range(len(index)):
+      for predicate, tracks in rules:
+        if predicate(row):
+          tracks.append(paths[row])
+
+    crates = []
+    for name, tracks in zip(self.names, matches):
+      crate = SeratoCrate()
+      crate.crate_name = prefix + SeratoCrate.delimiter + name
+      crate.tracks = tracks
+
+      logger.debug('Smart crate %s matched %d tracks' % (crate.crate_name, len(tracks)))
+      crates.append(crate)
+
+    return crates
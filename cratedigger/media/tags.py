@@ -0,0 +1,930 @@
+#!/usr/bin/env python3
+import os
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from struct import Struct, error as StructError
+from threading import Lock
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple
+from cratedigger.media.cache import TagCache
+
+# Logging
+logger = getLogger(__name__)
+
+# Fields read from the tags of each track
+# title: Title of the track
+# artist: Artist of the track
+# bpm: Tempo of the track in beats per minute
+# key: Musical key of the track, as tagged
+# duration: Length of the track in seconds
+TAG_FIELDS = ('title', 'artist', 'bpm', 'key', 'duration')
+
+# ID3v2 text frames by field, for ID3v2.3/2.4 and ID3v2.2
+ID3_FRAMES = {
+  'TIT2': 'title',
+  'TPE1': 'artist',
+  'TBPM': 'bpm',
+  'TKEY': 'key',
+  'TLEN': 'duration',
+  'TT2': 'title',
+  'TP1': 'artist',
+  'TBP': 'bpm',
+  'TKE': 'key',
+  'TLE': 'duration'
+}
+
+# Vorbis comment fields, used by FLAC and Ogg
+VORBIS_FIELDS = {
+  'TITLE': 'title',
+  'ARTIST': 'artist',
+  'BPM': 'bpm',
+  'TEMPO': 'bpm',
+  'INITIALKEY': 'key',
+  'KEY': 'key'
+}
+
+# MP4 metadata items
+MP4_FIELDS = {
+  b'\xa9nam': 'title',
+  b'\xa9ART': 'artist',
+  b'tmpo': 'bpm'
+}
+
+# RIFF INFO fields, used by WAV
+INFO_FIELDS = {
+  b'INAM': 'title',
+  b'IART': 'artist'
+}
+
+# Text encodings of ID3v2 frames
+ID3_ENCODINGS = ('latin-1', 'utf-16', 'utf-16-be', 'utf-8')
+
+# Big and little endian integers
+UINT16_BE = Struct('>H')
+UINT32_BE = Struct('>I')
+UINT64_BE = Struct('>Q')
+UINT32_LE = Struct('<I')
+
+# Chunk headers, a 4 byte ID followed by the size
+CHUNK_BE = Struct('>4sI')
+CHUNK_LE = Struct('<4sI')
+
+# MP4 atom header, the size followed by a 4 byte type
+ATOM = Struct('>I4s')
+
+# Ogg page header, up to the number of segments
+OGG_PAGE = Struct('<4sBBqIIIB')
+
+# MPEG audio bitrates in kbps, by version and layer, then bitrate index
+MPEG_BITRATES = {
+  (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+  (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+  (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+  (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+  (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+  (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+}
+
+# MPEG audio sample rates, by version, then sample rate index
+MPEG_SAMPLE_RATES = {
+  1: (44100, 48000, 32000),
+  2: (22050, 24000, 16000),
+  2.5: (11025, 12000, 8000)
+}
+
+# Number of bytes searched for the first MPEG audio frame
+MPEG_SEARCH_SIZE = 64 * 1024
+
+def read_tags(path: str) -> Dict[str, Any]:
+  """Read the tags of a track file.
+
+  The format of the track is determined by its extension. Fields which are
+  not present in the file, or which can't be read, are None.
+
+  Args:
+    path (str): Path to the track file
+
+  Returns:
+    tags (obj:`dict`): Value of each field in TAG_FIELDS, by field
+
+  Raises:
+    OSError: If the file can't be read
+
+  """
+
+  tags = dict.fromkeys(TAG_FIELDS) # type: Dict[str, Any]
+  extension = os.path.splitext(path)[1].lower()
+
+  with open(path, 'rb') as file:
+    try:
+      if extension == '.mp3':
+        read_mp3(file, tags)
+      elif extension == '.flac':
+        read_flac(file, tags)
+      elif extension == '.ogg':
+        read_ogg(file, tags)
+      elif extension in ('.mp4', '.m4a', '.alac'):
+        read_mp4(file, tags)
+      elif extension == '.aif':
+        read_aiff(file, tags)
+      elif extension == '.wav':
+        read_wav(file, tags)
+      elif extension == '.aac':
+        read_id3(file, tags)
+    except (ValueError, OverflowError, StructError, EOFError, IndexError, KeyError) as e:
+      # Keep any fields which were read before the error
+      logger.debug('Unable to read all tags of %s: %s' % (path, e))
+
+  return tags
+
+def set_field(tags: Dict[str, Any], field: str, value: Any) -> None:
+  """Set a field from a tag value, if it has not been set already.
+
+  Text values are stripped, BPMs are converted to a number, and durations in
+  milliseconds (as in ID3v2 TLEN frames) are converted to seconds.
+
+  Args:
+    tags (obj:`dict`): Tags to set the field in
+    field (str): Name of the field
+    value: Value of the tag
+
+  """
+
+  if tags.get(field) is not None or value is None:
+    return
+
+  if isinstance(value, str):
+    value = value.strip('\x00 \t\r\n')
+
+    if not value:
+      return
+
+  if field == 'bpm':
+    try:
+      value = float(value)
+    except ValueError:
+      return
+
+    if value <= 0:
+      return
+  elif field == 'duration':
+    try:
+      # Only TLEN is stored as text, in milliseconds
+      value = float(value) / 1000 if isinstance(value, str) else float(value)
+    except ValueError:
+      return
+
+    if value <= 0:
+      return
+
+  tags[field] = value
+
+def read_exactly(file: BinaryIO, size: int) -> bytes:
+  """Read an exact number of bytes from a file.
+
+  Args:
+    file (obj:`file`): File to read from
+    size (int): Number of bytes to read
+
+  Returns:
+    data (bytes): Bytes read
+
+  Raises:
+    EOFError: If the file ends before all bytes are read
+
+  """
+
+  if size > os.fstat(file.fileno()).st_size - file.tell():
+    # Avoid allocating corrupt sizes larger than the file itself
+    raise EOFError('Unexpected end of file')
+
+  return file.read(size)
+
+def syncsafe(data: bytes) -> int:
+  """Decode an ID3v2 syncsafe integer, which uses 7 bits of each byte"""
+
+  value = 0
+  for byte in data:
+    value = (value << 7) | (byte & 0x7f)
+
+  return value
+
+def read_id3(file: BinaryIO, tags: Dict[str, Any]) -> int:
+  """Read an ID3v2 tag at the current position of a file.
+
+  Args:
+    file (obj:`file`): File positioned at the start of the tag
+    tags (obj:`dict`): Tags to set the fields read in
+
+  Returns:
+    end (int): Position of the end of the tag, or the current position if
+               there is no ID3v2 tag
+
+  """
+
+  start = file.tell()
+  header = file.read(10)
+
+  if len(header) != 10 or header[:3] != b'ID3':
+    file.seek(start)
+    return start
+
+  version = header[3]
+  flags = header[5]
+  size = syncsafe(header[6:10])
+  end = start + 10 + size
+
+  if flags & 0x10:
+    # Footer present
+    end += 10
+
+  data = read_exactly(file, size)
+  file.seek(end)
+
+  if version not in (2, 3, 4):
+    return end
+
+  if flags & 0x80 and version < 4:
+    # The whole tag is unsynchronised
+    data = data.replace(b'\xff\x00', b'\xff')
+
+  offset = 0
+  if flags & 0x40 and version > 2:
+    # Skip the extended header
+    if version == 3:
+      offset = 4 + UINT32_BE.unpack_from(data, 0)[0]
+    else:
+      offset = syncsafe(data[0:4])
+
+  # Frame ID and header sizes
+  if version == 2:
+    id_size, header_size = 3, 6
+  else:
+    id_size, header_size = 4, 10
+
+  while offset + header_size <= len(data):
+    frame_id = data[offset:offset + id_size]
+
+    if not frame_id.strip(b'\x00'):
+      # Padding
+      break
+
+    if version == 2:
+      frame_size = int.from_bytes(data[offset + 3:offset + 6], 'big')
+      frame_flags = 0
+    elif version == 3:
+      frame_size = UINT32_BE.unpack_from(data, offset + 4)[0]
+      frame_flags = UINT16_BE.unpack_from(data, offset + 8)[0]
+    else:
+      frame_size = syncsafe(data[offset + 4:offset + 8])
+      frame_flags = UINT16_BE.unpack_from(data, offset + 8)[0]
+
+    frame = data[offset + header_size:offset + header_size + frame_size]
+    offset += header_size + frame_size
+
+    field = ID3_FRAMES.get(frame_id.decode('latin-1'))
+    if field is None or not frame:
+      continue
+
+    if version == 3 and frame_flags & 0x00c0:
+      # Compressed or encrypted
+      continue
+
+    if version == 4:
+      if frame_flags & 0x000c:
+        # Compressed or encrypted
+        continue
+
+      if frame_flags & 0x0002:
+        # Unsynchronised frame
+        frame = frame.replace(b'\xff\x00', b'\xff')
+
+      if frame_flags & 0x0001:
+        # Data length indicator
+        frame = frame[4:]
+
+    if not frame or frame[0] >= len(ID3_ENCODINGS):
+      continue
+
+    # Only the first value of multi value frames is used
+    text = frame[1:].decode(ID3_ENCODINGS[frame[0]], 'replace')
+    set_field(tags, field, text.split('\x00')[0])
+
+  return end
+
+def read_id3v1(file: BinaryIO, tags: Dict[str, Any]) -> None:
+  """Read the title and artist of an ID3v1 tag at the end of a file.
+
+  Args:
+    file (obj:`file`): File to read
+    tags (obj:`dict`): Tags to set the fields read in
+
+  """
+
+  file.seek(0, os.SEEK_END)
+  if file.tell() < 128:
+    return
+
+  file.seek(-128, os.SEEK_END)
+  data = file.read(128)
+
+  if data[:3] != b'TAG':
+    return
+
+  set_field(tags, 'title', data[3:33].decode('latin-1'))
+  set_field(tags, 'artist', data[33:63].decode('latin-1'))
+
+def read_mp3(file: BinaryIO, tags: Dict[str, Any]) -> None:
+  """Read the tags and duration of an MP3 file.
+
+  Tags are read from the ID3v2 tag, falling back to an ID3v1 tag. If the
+  ID3v2 tag has no length, the duration is determined from the first MPEG
+  audio frame, using its Xing or VBRI header if present, and otherwise the
+  bitrate of the frame and the size of the file.
+
+  Args:
+    file (obj:`file`): File to read
+    tags (obj:`dict`): Tags to set the fields read in
+
+  """
+
+  audio_start = read_id3(file, tags)
+
+  if tags['title'] is None or tags['artist'] is None:
+    read_id3v1(file, tags)
+
+  if tags['duration'] is not None:
+    return
+
+  file.seek(0, os.SEEK_END)
+  file_size = file.tell()
+
+  file.seek(audio_start)
+  data = file.read(MPEG_SEARCH_SIZE)
+
+  offset = data.find(b'\xff')
+  while 0 <= offset < len(data) - 4:
+    header = UINT32_BE.unpack_from(data, offset)[0]
+
+    if (header >> 21) & 0x7ff == 0x7ff:
+      version_bits = (header >> 19) & 0x3
+      layer_bits = (header >> 17) & 0x3
+      bitrate_index = (header >> 12) & 0xf
+      rate_index = (header >> 10) & 0x3
+
+      if version_bits != 1 and layer_bits != 0 and bitrate_index not in (0, 15) and rate_index != 3:
+        break
+
+    offset = data.find(b'\xff', offset + 1)
+  else:
+    # No MPEG audio frame
+    return
+
+  version = {0: 2.5, 2: 2, 3: 1}[version_bits]
+  layer = 4 - layer_bits
+  mono = (header >> 6) & 0x3 == 3
+
+  bitrate = MPEG_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+  sample_rate = MPEG_SAMPLE_RATES[version][rate_index]
+
+  if layer == 1:
+    samples_per_frame = 384
+  elif layer == 3 and version != 1:
+    samples_per_frame = 576
+  else:
+    samples_per_frame = 1152
+
+  # Xing/Info header, which follows the side information
+  if version == 1:
+    side_info = 17 if mono else 32
+  else:
+    side_info = 9 if mono else 17
+
+  xing = offset + 4 + side_info
+  if data[xing:xing + 4] in (b'Xing', b'Info') and len(data) >= xing + 12:
+    xing_flags = UINT32_BE.unpack_from(data, xing + 4)[0]
+
+    if xing_flags & 0x1:
+      frames = UINT32_BE.unpack_from(data, xing + 8)[0]
+      set_field(tags, 'duration', frames * samples_per_frame / sample_rate)
+      return
+
+  # VBRI header, at a fixed position after the frame header
+  vbri = offset + 4 + 32
+  if data[vbri:vbri + 4] == b'VBRI' and len(data) >= vbri + 18:
+    frames = UINT32_BE.unpack_from(data, vbri + 14)[0]
+    set_field(tags, 'duration', frames * samples_per_frame / sample_rate)
+    return
+
+  # Constant bitrate
+  audio_size = file_size - audio_start - offset
+  if file_size >= 128:
+    file.seek(-128, os.SEEK_END)
+    if file.read(3) == b'TAG':
+      audio_size -= 128
+
+  set_field(tags, 'duration', audio_size * 8 / bitrate)
+
+def read_vorbis_comment(data: bytes, tags: Dict[str, Any]) -> None:
+  """Read a Vorbis comment block, as used by FLAC and Ogg.
+
+  Args:
+    data (bytes): Vorbis comment block, starting with the vendor string
+    tags (obj:`dict`): Tags to set the fields read in
+
+  """
+
+  vendor_size = UINT32_LE.unpack_from(data, 0)[0]
+  offset = 4 + vendor_size
+
+  count = UINT32_LE.unpack_from(data, offset)[0]
+  offset += 4
+
+  for _ in range(count):
+    size = UINT32_LE.unpack_from(data, offset)[0]
+    comment = data[offset + 4:offset + 4 + size]
+    offset += 4 + size
+
+    name, separator, value = comment.partition(b'=')
+    if not separator:
+      continue
+
+    field = VORBIS_FIELDS.get(name.decode('ascii', 'replace').upper())
+    if field is not None:
+      set_field(tags, field, value.decode('utf-8', 'replace'))
+
+def read_flac(file: BinaryIO, tags: Dict[str, Any]) -> None:
+  """Read the tags and duration of a FLAC file.
+
+  Args:
+    file (obj:`file`): File to read
+    tags (obj:`dict`): Tags to set the fields read in
+
+  """
+
+  # Some encoders prepend an ID3v2 tag
+  read_id3(file, tags)
+
+  if file.read(4) != b'fLaC':
+    raise ValueError('Missing FLAC stream marker')
+
+  last = False
+  while not last:
+    header = read_exactly(file, 4)
+    last = bool(header[0] & 0x80)
+    block_type = header[0] & 0x7f
+    size = int.from_bytes(header[1:4], 'big')
+
+    if block_type == 0:
+      # STREAMINFO, 20 bits of sample rate and 36 bits of total samples
+      info = read_exactly(file, size)
+      sample_rate = int.from_bytes(info[10:13], 'big') >> 4
+      total_samples = UINT64_BE.unpack_from(info, 10)[0] & 0xfffffffff
+
+      if sample_rate:
+        set_field(tags, 'duration', total_samples / sample_rate)
+    elif block_type == 4:
+      # VORBIS_COMMENT
+      read_vorbis_comment(read_exactly(file, size), tags)
+    else:
+      file.seek(size, os.SEEK_CUR)
+
+def read_ogg_packets(file: BinaryIO, count: int) -> List[bytes]:
+  """Read the first packets of the first logical stream of an Ogg file.
+
+  Args:
+    file (obj:`file`): File positioned at the start of the first page
+    count (int): Number of packets to read
+
+  Returns:
+    packets (obj:`list` of bytes): First packets of the stream
+
+  """
+
+  packets = [] # type: List[bytes]
+  packet = [] # type: List[bytes]
+  serial = None
+
+  while len(packets) < count:
+    header = read_exactly(file, OGG_PAGE.size)
+    capture, _, _, _, page_serial, _, _, segment_count = OGG_PAGE.unpack(header)
+
+    if capture != b'OggS':
+      raise ValueError('Missing Ogg page')
+
+    segments = read_exactly(file, segment_count)
+    body = read_exactly(file, sum(segments))
+
+    if serial is None:
+      serial = page_serial
+    elif page_serial != serial:
+      # Page of another logical stream
+      continue
+
+    offset = 0
+    for segment in segments:
+      packet.append(body[offset:offset + segment])
+      offset += segment
+
+      if segment < 255:
+        # End of a packet
+        packets.append(b''.join(packet))
+        packet = []
+
+  return packets[:count]
+
+def read_ogg(file: BinaryIO, tags: Dict[str, Any]) -> None:
+  """Read the tags and duration of an Ogg Vorbis or Opus file.
+
+  The duration is determined from the granule position of the last page.
+
+  Args:
+    file (obj:`file`): File to read
+    tags (obj:`dict`): Tags to set the fields read in
+
+  """
+
+  identification, comment = read_ogg_packets(file, 2)
+
+  if identification.startswith(b'\x01vorbis'):
+    sample_rate = UINT32_LE.unpack_from(identification, 12)[0]
+    pre_skip = 0
+    if comment.startswith(b'\x03vorbis'):
+      read_vorbis_comment(comment[7:], tags)
+  elif identification.startswith(b'OpusHead'):
+    # Opus granule positions are always at 48kHz
+    sample_rate = 48000
+    pre_skip = int.from_bytes(identification[10:12], 'little')
+    if comment.startswith(b'OpusTags'):
+      read_vorbis_comment(comment[8:], tags)
+  else:
+    return
+
+  # Find the last page, within the end of the file
+  file.seek(0, os.SEEK_END)
+  size = file.tell()
+  file.seek(max(0, size - MPEG_SEARCH_SIZE))
+  data = file.read()
+
+  offset = data.rfind(b'OggS')
+  if offset < 0 or len(data) < offset + OGG_PAGE.size or not sample_rate:
+    return
+
+  granule = OGG_PAGE.unpack_from(data, offset)[3]
+  if granule > 0:
+    set_field(tags, 'duration', (granule - pre_skip) / sample_rate)
+
+def iter_atoms(data: bytes, offset: int = 0, end: Optional[int] = None) -> Iterable[Tuple[bytes, int, int]]:
+  """Iterate over the MP4 atoms within a buffer.
+
+  Args:
+    data (bytes): Buffer of atoms
+    offset (int, optional): Offset of the first atom
+    end (int, optional): Offset of the end of the atoms
+
+  Yields:
+    atom (obj:`tuple`): Tuple of the atom type, and the start and end offsets of
+                        its payload
+
+  """
+
+  if end is None:
+    end = len(data)
+
+  while offset + 8 <= end:
+    size, atom_type = ATOM.unpack_from(data, offset)
+    header_size = 8
+
+    if size == 1:
+      # 64 bit size
+      size = UINT64_BE.unpack_from(data, offset + 8)[0]
+      header_size = 16
+    elif size == 0:
+      # Extends to the end
+      size = end - offset
+
+    if size < header_size:
+      raise ValueError('Invalid MP4 atom size')
+
+    yield atom_type, offset + header_size, min(offset + size, end)
+    offset += size
+
+def read_mp4(file: BinaryIO, tags: Dict[str, Any]) -> None:
+  """Read the tags and duration of an MP4 file.
+
+  Only the moov atom is read, the media data is skipped.
+
+  Args:
+    file (obj:`file`): File to read
+    tags (obj:`dict`): Tags to set the fields read in
+
+  """
+
+  # Find the moov atom among the top level atoms
+  moov = None
+  while moov is None:
+    header = file.read(ATOM.size)
+    if len(header) < ATOM.size:
+      return
+
+    size, atom_type = ATOM.unpack(header)
+    header_size = 8
+
+    if size == 1:
+      size = UINT64_BE.unpack(read_exactly(file, 8))[0]
+      header_size = 16
+    elif size == 0:
+      if atom_type != b'moov':
+        return
+
+      moov = file.read()
+      break
+
+    if size < header_size:
+      raise ValueError('Invalid MP4 atom size')
+
+    if atom_type == b'moov':
+      moov = read_exactly(file, size - header_size)
+    else:
+      file.seek(size - header_size, os.SEEK_CUR)
+
+  for atom_type, start, end in iter_atoms(moov):
+    if atom_type == b'mvhd':
+      # Version 1 has 64 bit times and duration, version 0 has 32 bit ones
+      if end - start < 1 or end - start < (32 if moov[start] == 1 else 20):
+        raise ValueError('Invalid MP4 mvhd atom size')
+
+      if moov[start] == 1:
+        timescale = UINT32_BE.unpack_from(moov, start + 20)[0]
+        duration = UINT64_BE.unpack_from(moov, start + 24)[0]
+      else:
+        timescale = UINT32_BE.unpack_from(moov, start + 12)[0]
+        duration = UINT32_BE.unpack_from(moov, start + 16)[0]
+
+      if timescale:
+        set_field(tags, 'duration', duration / timescale)
+    elif atom_type == b'udta':
+      for meta_type, meta_start, meta_end in iter_atoms(moov, start, end):
+        if meta_type != b'meta':
+          continue
+
+        # meta is a full atom, with 4 bytes of version and flags
+        for ilst_type, ilst_start, ilst_end in iter_atoms(moov, meta_start + 4, meta_end):
+          if ilst_type == b'ilst':
+            read_ilst(moov, ilst_start, ilst_end, tags)
+
+def read_ilst(data: bytes, start: int, end: int, tags: Dict[str, Any]) -> None:
+  """Read the metadata items of an MP4 ilst atom.
+
+  Args:
+    data (bytes): Buffer containing the ilst atom
+    start (int): Offset of the payload of the ilst atom
+    end (int): Offset of the end of the ilst atom
+    tags (obj:`dict`): Tags to set the fields read in
+
+  """
+
+  for item_type, item_start, item_end in iter_atoms(data, start, end):
+    # Name of freeform items, such as com.apple.iTunes:initialkey
+    name = None
+    field = MP4_FIELDS.get(item_type)
+
+    for child_type, child_start, child_end in iter_atoms(data, item_start, item_end):
+      if child_type == b'name':
+        # Freeform item name, after 4 bytes of version and flags
+        name = data[child_start + 4:child_end].decode('utf-8', 'replace').lower()
+
+        if name == 'initialkey':
+          field = 'key'
+        elif name == 'bpm':
+          field = 'bpm'
+      elif child_type == b'data' and field is not None:
+        # 4 bytes of type and 4 bytes of locale precede the value
+        value = data[child_start + 8:child_end]
+
+        if item_type == b'tmpo':
+          set_field(tags, field, int.from_bytes(value, 'big') if value else None)
+        else:
+          set_field(tags, field, value.decode('utf-8', 'replace'))
+
+def read_aiff(file: BinaryIO, tags: Dict[str, Any]) -> None:
+  """Read the tags and duration of an AIFF file.
+
+  Args:
+    file (obj:`file`): File to read
+    tags (obj:`dict`): Tags to set the fields read in
+
+  """
+
+  header = read_exactly(file, 12)
+  if header[:4] != b'FORM' or header[8:12] not in (b'AIFF', b'AIFC'):
+    raise ValueError('Missing AIFF header')
+
+  while True:
+    chunk = file.read(CHUNK_BE.size)
+    if len(chunk) < CHUNK_BE.size:
+      return
+
+    chunk_id, size = CHUNK_BE.unpack(chunk)
+    start = file.tell()
+
+    if chunk_id == b'COMM':
+      comm = read_exactly(file, size)
+      frames = UINT32_BE.unpack_from(comm, 2)[0]
+
+      # 80 bit extended precision sample rate
+      exponent = UINT16_BE.unpack_from(comm, 8)[0] & 0x7fff
+      mantissa = UINT64_BE.unpack_from(comm, 10)[0]
+      sample_rate = mantissa * 2.0 ** (exponent - 16383 - 63)
+
+      if sample_rate:
+        set_field(tags, 'duration', frames / sample_rate)
+    elif chunk_id in (b'ID3 ', b'id3 '):
+      read_id3(file, tags)
+    elif chunk_id == b'NAME':
+      set_field(tags, 'title', read_exactly(file, size).decode('latin-1'))
+
+    # Chunks are padded to an even size
+    file.seek(start + size + (size & 1))
+
+def read_wav(file: BinaryIO, tags: Dict[str, Any]) -> None:
+  """Read the tags and duration of a WAV file.
+
+  Args:
+    file (obj:`file`): File to read
+    tags (obj:`dict`): Tags to set the fields read in
+
+  """
+
+  header = read_exactly(file, 12)
+  if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+    raise ValueError('Missing WAV header')
+
+  byte_rate = None
+  data_size = None
+
+  while True:
+    chunk = file.read(CHUNK_LE.size)
+    if len(chunk) < CHUNK_LE.size:
+      break
+
+    chunk_id, size = CHUNK_LE.unpack(chunk)
+    start = file.tell()
+
+    if chunk_id == b'fmt ':
+      byte_rate = UINT32_LE.unpack_from(read_exactly(file, 12), 8)[0]
+    elif chunk_id == b'data':
+      data_size = size
+    elif chunk_id in (b'ID3 ', b'id3 '):
+      read_id3(file, tags)
+    elif chunk_id == b'LIST':
+      info = read_exactly(file, size)
+
+      if info[:4] == b'INFO':
+        offset = 4
+        while offset + CHUNK_LE.size <= len(info):
+          info_id, info_size = CHUNK_LE.unpack_from(info, offset)
+          value = info[offset + 8:offset + 8 + info_size]
+          offset += 8 + info_size + (info_size & 1)
+
+          field = INFO_FIELDS.get(info_id)
+          if field is not None:
+            set_field(tags, field, value.decode('latin-1'))
+
+    # Chunks are padded to an even size
+    file.seek(start + size + (size & 1))
+
+  if byte_rate and data_size is not None:
+    set_field(tags, 'duration', data_size / byte_rate)
+
+def sort_key(value: Any) -> Tuple[bool, Any]:
+  """Determine the sort key of a field value.
+
+  Text is sorted case insensitively, and tracks without a value are sorted
+  after all tracks with one.
+
+  Args:
+    value: Value of a field, or None
+
+  Returns:
+    key (obj:`tuple`): Key to sort tracks by
+
+  """
+
+  if value is None:
+    return True, 0
+
+  if isinstance(value, str):
+    return False, value.casefold()
+
+  return False, value
+
+class TagReader(object):
+  """Reader of the tags of many track files.
+
+  Tracks are read on a thread pool, and can be cached between runs by the
+  size and modification time of each file. The reader should be used as a
+  context manager, so that its thread pool is shut down when done.
+
+  Example:
+    with TagReader(cache, jobs=4) as reader:
+      tags = reader.read(['/Volumes/Music/Music/8mm/Opener.flac'])
+
+  Attributes:
+    cache (obj:`TagCache`, optional): Cache of track tags
+    jobs (int): Number of tracks to read concurrently
+    parsed (int): Tracks which have been parsed rather than read from the cache
+
+  """
+
+  def __init__(self, cache: Optional[TagCache] = None, jobs: int = 1) -> None:
+    """Initialize a Tag Reader.
+
+    Args:
+      cache (obj:`TagCache`, optional): Cache of track tags
+      jobs (int, optional): Number of tracks to read concurrently
+
+    """
+
+    self.cache = cache
+    self.jobs = jobs
+    self.parsed = 0
+
+    # Lock for counting tracks parsed on the thread pool
+    self._lock = Lock()
+
+    # Thread pool for reading tracks, if reading concurrently
+    if jobs > 1:
+      self._executor = ThreadPoolExecutor(max_workers=jobs) # type: Optional[ThreadPoolExecutor]
+    else:
+      self._executor = None
+
+  def __enter__(self) -> 'TagReader':
+    """Use the reader as a context manager"""
+
+    return self
+
+  def __exit__(self, *exc_info: Any) -> None:
+    """Shut down the thread pool of the reader"""
+
+    self.close()
+
+  def close(self) -> None:
+    """Shut down the thread pool of the reader"""
+
+    if self._executor is not None:
+      self._executor.shutdown(wait=True)
+      self._executor = None
+
+  def read(self, paths: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Read the tags of a number of track files.
+
+    Args:
+      paths (obj:`list` of str): Paths to the track files
+
+    Returns:
+      tags (obj:`dict` of str: obj:`dict`): Tags of each track, by path.
+                                            Tracks which can't be read have
+                                            no tags.
+
+    """
+
+    paths = list(dict.fromkeys(paths))
+
+    if self._executor is not None:
+      results = self._executor.map(self.read_track, paths)
+    else:
+      results = map(self.read_track, paths)
+
+    return dict(zip(paths, results))
+
+  def read_track(self, path: str) -> Dict[str, Any]:
+    """Read the tags of a single track file, from the cache if possible.
+
+    Args:
+      path (str): Path to the track file
+
+    Returns:
+      tags (obj:`dict`): Value of each field in TAG_FIELDS, by field
+
+    """
+
+    try:
+      stat = os.stat(path)
+
+      if self.cache is not None:
+        tags = self.cache.get(path, stat.st_size, stat.st_mtime_ns)
+        if tags is not None:
+          return tags
+
+      tags = read_tags(path)
+    except OSError as e:
+      logger.warning('Unable to read tags of %s: %s' % (path, e))
+      return dict.fromkeys(TAG_FIELDS)
+
+    with self._lock:
+      self.parsed += 1
+
+    if self.cache is not None:
+      self.cache.set(path, stat.st_size, stat.st_mtime_ns, tags)
+
+    return tags
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+from abc import ABC, abstractmethod
+from logging import getLogger
+from struct import Struct
+from typing import Any, Dict, Iterable, Optional, Set
+
+# Logging
+logger = getLogger(__name__)
+
+# inotify flags, from <sys/inotify.h>
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+
+# Changes to the entries of a directory, which are the only changes that affect
+# its crate. Changes to the contents of tracks are not watched.
+IN_ENTRIES = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# inotify event header, watch descriptor, mask, cookie and length of the name
+# which follows it
+EVENT_HEADER = Struct('iIII')
+
+class Watcher(ABC):
+  """Watcher of changes to the entries of a set of directories.
+
+  This is the abstract base class for the watchers of each backend, which
+  implement add, remove and poll. Watchers only report which directories have
+  changed, the directories themselves have to be listed again to determine what
+  has changed.
+
+  """
+
+  @abstractmethod
+  def add(self, path: str) -> None:
+    """Start watching a directory.
+
+    Args:
+      path (str): Path of the directory
+
+    Raises:
+      OSError: If the directory can't be watched
+
+    """
+
+    pass
+
+  @abstractmethod
+  def remove(self, path: str) -> None:
+    """Stop watching a directory.
+
+    Args:
+      path (str): Path of the directory
+
+    """
+
+    pass
+
+  @abstractmethod
+  def poll(self, timeout: Optional[float]) -> Set[str]:
+    """Wait for changes to the watched directories.
+
+    Args:
+      timeout (float): Maximum number of seconds to wait for a change, or None
+                       to wait until there is one
+
+    Returns:
+      changed (obj:`set` of str): Paths of the changed directories, which is
+                                  empty if nothing changed before the timeout
+
+    """
+
+    pass
+
+  def close(self) -> None:
+    """Stop watching all directories"""
+
+    pass
+
+  def wait(self, debounce: float) -> Set[str]:
+    """Wait for a burst of changes to the watched directories.
+
+    Once a directory has changed, changes keep being collected until no
+    directory has changed for the debounce period, so a burst of changes, such
+    as copying an album, is reported once rather than once per track.
+
+    Args:
+      debounce (float): Number of seconds without changes which ends a burst
+
+    Returns:
+      changed (obj:`set` of str): Paths of all directories changed in the burst
+
+    """
+
+    changed = set() # type: Set[str]
+    while not changed:
+      changed = self.poll(None)
+
+    while True:
+      burst = self.poll(debounce)
+      if not burst:
+        return changed
+
+      changed.update(burst)
+
+  def __enter__(self) -> 'Watcher':
+    """Use the watcher as a context manager"""
+
+    return self
+
+  def __exit__(self, *exc_info: Any) -> None:
+    """Stop watching all directories"""
+
+    self.close()
+
+class InotifyWatcher(Watcher):
+  """Watcher of directories using Linux inotify.
+
+  inotify is called through ctypes, so no additional dependencies are needed.
+  Each directory has its own watch, and the kernel reports every entry which is
+  created, deleted or moved in it.
+
+  Attributes:
+    libc (obj:`ctypes.CDLL`): C library providing the inotify calls
+    fd (int): inotify file descriptor
+    paths (obj:`dict` of int: str): Path of each watch descriptor
+    watches (obj:`dict` of str: int): Watch descriptor of each path
+
+  """
+
+  def __init__(self) -> None:
+    """Initialize an inotify Watcher.
+
+    Raises:
+      OSError: If inotify is not available on this platform
+
+    """
+
+    if not sys.platform.startswith('linux'):
+      raise OSError('inotify is only available on Linux')
+
+    self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+
+    self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+    if self.fd < 0:
+      errno = ctypes.get_errno()
+      raise OSError(errno, os.strerror(errno))
+
+    self.paths = {} # type: Dict[int, str]
+    self.watches = {} # type: Dict[str, int]
+
+  def add(self, path: str) -> None:
+    """Start watching a directory.
+
+    Args:
+      path (str): Path of the directory
+
+    Raises:
+      OSError: If the directory can't be watched, such as when the limit of
+               watches per user has been reached
+
+    """
+
+    wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), IN_ENTRIES | IN_ONLYDIR)
+    if wd < 0:
+      errno = ctypes.get_errno()
+      raise OSError(errno, os.strerror(errno), path)
+
+    self.paths[wd] = path
+    self.watches[path] = wd
+
+  def remove(self, path: str) -> None:
+    """Stop watching a directory.
+
+    Args:
+      path (str): Path of the directory
+
+    """
+
+    wd = self.watches.pop(path, None)
+    if wd is None:
+      return
+
+    del self.paths[wd]
+
+    # Fails if the directory no longer exists, which already removed the watch
+    self.libc.inotify_rm_watch(self.fd, wd)
+
+  def poll(self, timeout: Optional[float]) -> Set[str]:
+    """Wait for changes to the watched directories.
+
+    All events which are already queued are read at once. If the kernel queue
+    overflowed, events were lost, and all watched directories are reported.
+
+    Args:
+      timeout (float): Maximum number of seconds to wait for a change, or None
+                       to wait until there is one
+
+    Returns:
+      changed (obj:`set` of str): Paths of the changed directories
+
+    """
+
+    changed = set() # type: Set[str]
+
+    while select.select([self.fd], [], [], timeout)[0]:
+      data = os.read(self.fd, 65536)
+
+      offset = 0
+      while offset < len(data):
+        wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+        offset += EVENT_HEADER.size + length
+
+        if mask & IN_Q_OVERFLOW:
+          logger.warning('inotify event queue overflowed, rescanning all folders')
+          changed.update(self.watches)
+        elif mask & IN_IGNORED:
+          # Directory was removed, along with its watch
+          path = self.paths.pop(wd, None)
+          if path is not None and self.watches.get(path) == wd:
+            del self.watches[path]
+        elif wd in self.paths:
+          changed.add(self.paths[wd])
+
+      # Only collect the events which are already queued
+      timeout = 0
+
+    return changed
+
+  def close(self) -> None:
+    """Stop watching all directories"""
+
+    if self.fd >= 0:
+      os.close(self.fd)
+      self.fd = -1
+
+class PollingWatcher(Watcher):
+  """Watcher of directories which polls their modification times.
+
+  Creating, deleting or renaming an entry in a directory updates the
+  modification time of the directory, so every watched directory is stat'ed
+  at a fixed interval and compared to its last modification time. This works
+  on any platform and filesystem, including network shares which do not
+  deliver change events.
+
+  Attributes:
+    interval (float): Number of seconds between polls
+    mtimes (obj:`dict` of str: int): Last modification time of each directory
+                                     in nanoseconds, or None if it is missing
+
+  """
+
+  def __init__(self, interval: float = 2.0) -> None:
+    """Initialize a Polling Watcher.
+
+    Args:
+      interval (float, optional): Number of seconds between polls
+
+    """
+
+    self.interval = interval
+    self.mtimes = {} # type: Dict[str, Optional[int]]
+
+  @staticmethod
+  def stat_directory(path: str) -> Optional[int]:
+    """Determine the modification time of a directory.
+
+    Args:
+      path (str): Path of the directory
+
+    Returns:
+      mtime (int): Modification time in nanoseconds, or None if the directory
+                   can't be stat'ed
+
+    """
+
+    try:
+      return os.stat(path).st_mtime_ns
+    except OSError:
+      return None
+
+  def add(self, path: str) -> None:
+    """Start watching a directory.
+
+    Args:
+      path (str): Path of the directory
+
+    """
+
+    self.mtimes[path] = self.stat_directory(path)
+
+  def remove(self, path: str) -> None:
+    """Stop watching a directory.
+
+    Args:
+      path (str): Path of the directory
+
+    """
+
+    self.mtimes.pop(path, None)
+
+  def poll(self, timeout: Optional[float]) -> Set[str]:
+    """Wait for changes to the watched directories.
+
+    Args:
+      timeout (float): Maximum number of seconds to wait for a change, or None
+                       to wait until there is one
+
+    Returns:
+      changed (obj:`set` of str): Paths of the changed directories
+
+    """
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    while True:
+      if deadline is None:
+        delay = self.interval
+      else:
+        delay = min(self.interval, deadline - time.monotonic())
+
+      if delay > 0:
+        time.sleep(delay)
+
+      changed = set() # type: Set[str]
+      for path, mtime in self.mtimes.items():
+        current = self.stat_directory(path)
+
+        if current != mtime:
+          self.mtimes[path] = current
+          changed.add(path)
+
+      if changed or (deadline is not None and time.monotonic() >= deadline):
+        return changed
+
+def create_watcher(paths: Iterable[str], polling: bool = False, interval: float = 2.0) -> Watcher:
+  """Create a watcher of a set of directories.
+
+  inotify is used if it is available, unless polling is requested. If inotify
+  is unavailable, or a directory can't be watched with it, such as when the
+  limit of watches per user has been reached, directories are polled instead.
+
+  Args:
+    paths (obj:`iterable` of str): Paths of the directories to watch
+    polling (bool, optional): Poll directories even if inotify is available
+    interval (float, optional): Number of seconds between polls
+
+  Returns:
+    watcher (obj:`Watcher`): Watcher of all of the directories
+
+  """
+
+  paths = list(paths)
+
+  if not polling:
+    try:
+      watcher = InotifyWatcher() # type: Watcher
+    except OSError as e:
+      logger.info('Polling folders for changes, inotify is unavailable: %s' % e)
+    else:
+      try:
+        for path in paths:
+          watcher.add(path)
+      except OSError as e:
+        logger.warning('Polling folders for changes, unable to watch %s: %s' % (e.filename, e.strerror))
+        watcher.close()
+      else:
+        logger.debug('Watching %d folders with inotify' % len(paths))
+        return watcher
+
+  watcher = PollingWatcher(interval)
+  for path in paths:
+    watcher.add(path)
+
+  logger.debug('Polling %d folders every %g seconds' % (len(paths), interval))
+
+  return watcher
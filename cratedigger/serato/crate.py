@@ -1,41 +1,131 @@
 #!/usr/bin/env python3
+import os
+import stat
+import sys
+from functools import lru_cache
+from struct import Struct
+from tempfile import mkstemp
 from logging import getLogger
 from os.path import basename, splitext, join
 from json import dumps
-from typing import Iterable, Tuple, TypeVar, Type
-from anytree import NodeMixin
-from cratedigger.util.io import InputStream, OutputStream
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+from cratedigger.serato.tracks import TrackTable
+from cratedigger.util.io import RECORD_HEADER, iter_records
+from cratedigger.util.tree import Node
 
 # Logging
 logger = getLogger(__name__)
 
-# Type var
-SC = TypeVar('SC', bound='SeratoCrate')
+# Permissions of new .crate files, as they would be created by open. The umask
+# can only be read by setting it, so it is read once at import time rather than
+# on the writer threads.
+UMASK = os.umask(0)
+os.umask(UMASK)
+NEW_CRATE_MODE = 0o666 & ~UMASK
 
-class SeratoCrate(NodeMixin):
+# Results of writing a crate
+# written: The .crate file was missing or different and has been written
+# unchanged: The .crate file on disk already has the same contents
+# skipped: The .crate file is missing or different, but was not written (dry run)
+WRITTEN = 'written'
+UNCHANGED = 'unchanged'
+SKIPPED = 'skipped'
+
+# Big endian 4 byte integer, used for the lengths following each tag
+UINT32 = Struct('>I')
+
+# Default version of a crate
+DEFAULT_VERSION = '81.0'
+
+# Default columns of a crate, shared between all crates using them
+DEFAULT_COLUMNS = ('song', 'artist', 'album', 'length')
+
+# Default empty track records, shared between all crates without any
+NO_TRACK_RECORDS = MappingProxyType({}) # type: Mapping[str, bytes]
+
+# Start of the header of every crate, vrsn followed by two empty bytes
+HEADER_VRSN = b'vrsn\x00\x00'
+
+# UTF-16 junk string which follows the version in the header
+HEADER_JUNK = '/Serato ScratchLive Crate'.encode('utf-16-be')
+
+# Complete header of a crate with the default version
+HEADER = HEADER_VRSN + DEFAULT_VERSION.encode('utf-16-be') + HEADER_JUNK
+
+# Header of a record whose payload starts with a nested record, the tag and
+# length of the outer record followed by the tag and length of the inner one
+# Tracks: otrk, otrk length, ptrk, ptrk length
+# Sorting: osrt, osrt length, tvcn, tvcn length
+# Columns: ovct, ovct length, tvcn, tvcn length
+NESTED_HEADER = Struct('>4sI4sI')
+
+# Column record footer, tvcw, tvcw length of 2, \x00 and 0
+COLUMN_FOOTER = b'tvcw\x00\x00\x00\x02\x000'
+
+class SeratoCrate(Node):
   """A crate within the Serato program.
 
   This class is intended to represent the contents of a Serato crate. The
   attributes roughly follow the values found within a crate file itself.
 
+  Crates are stored in __slots__ rather than a per instance __dict__, and
+  crates with default contents share the same default values, so that large
+  libraries with many crates remain compact in memory.
+
   Attributes:
     version (str): Version of the crate, arbitrarily determined by Serato
     sort (str): Metadata to sort crate by, such as "song" for song name
     sort_rev (int): "Sort Rev", unknown use
-    columns (:obj:`list` of :obj:`str`): Metadata columns within the crate
+    columns (:obj:`tuple` of :obj:`str`): Metadata columns within the crate
     tracks (:obj:`list` of :obj:`str`): Tracks within the crate
+    track_records (:obj:`dict` of :obj:`str`: bytes): Raw otrk payloads of
+                  tracks which contain fields other than ptrk, by track
+    unknown_records (:obj:`tuple` of :obj:`tuple`): Records which are not
+                    understood, as tuples of the number of tracks preceding
+                    the record, the tag and the raw payload
     crate_name (str): Name of the crate when published as a .crate file
+    source (str): Path to the .crate file the crate was loaded from, if any
+    track_table (:obj:`TrackTable`): Library wide table of track paths, which
+                                     tracks are interned in when loaded
     parent (:obj:`SeratoCrate`): Parent crate (if subcrate)
     children (:obj:`tuple` of obj:`SeratoCrate`): Child crates
     delimiter (str): Delimiter to use when creating the name of the .crate file
+    lazy_attributes (:obj:`tuple` of str): Contents of the crate which are
+                                           parsed from the .crate file on first
+                                           access when loaded lazily
 
   """
 
+  __slots__ = (
+    'version',
+    'sort',
+    'sort_rev',
+    'columns',
+    'tracks',
+    'track_records',
+    'unknown_records',
+    'crate_name',
+    'source',
+    'track_table'
+  )
+
   # Delimiter for crates. The Serato crates directory is "flat" and Serato
   # uses the %% delimiter to determine when a crate is a "subcrate" of another
   delimiter = '%%'
 
-  def __init__(self, parent: Type[SC] = None, children: Tuple[Type[SC]] = None) -> None:
+  # Contents of the crate which are parsed from the .crate file
+  lazy_attributes = (
+    'version',
+    'sort',
+    'sort_rev',
+    'columns',
+    'tracks',
+    'track_records',
+    'unknown_records'
+  )
+
+  def __init__(self, parent: Optional['SeratoCrate'] = None, children: Optional[Iterable['SeratoCrate']] = None) -> None:
     """SeratoCrate initialization method.
 
     This initializes a SeratoCrate to the default values found in crates created
@@ -48,8 +138,58 @@ class SeratoCrate(NodeMixin):
 
     """
 
+    # Initialize the tree node
+    super().__init__()
+
+    # Set the contents of the crate to the defaults
+    self.set_defaults()
+
+    # Name of the crate
+    self.crate_name = ''
+
+    # Path to the .crate file this crate was loaded from
+    self.source = None # type: Optional[str]
+
+    # Table to intern track paths in when loading
+    self.track_table = None # type: Optional[TrackTable]
+
+    # anytree: Set parent and child nodes
+    self.parent = parent
+    if children:
+      self.children = children
+
+  def __getattr__(self, name: str) -> Any:
+    """Load the contents of a lazily loaded crate on first access.
+
+    This is only invoked when an attribute is missing, which is the case for
+    the contents of a crate which was loaded lazily or unloaded. The .crate
+    file is parsed, and the requested attribute is returned.
+
+    Args:
+      name (str): Name of the attribute being accessed
+
+    Returns:
+      value: Value of the attribute
+
+    Raises:
+      AttributeError: If the attribute does not exist
+
+    """
+
+    if name in SeratoCrate.lazy_attributes and self.source is not None:
+      # Parse the .crate file into the default crate contents
+      self.set_defaults()
+      self.parse_crate(self.source)
+
+      return getattr(self, name)
+
+    raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+  def set_defaults(self) -> None:
+    """Set the contents of the crate to the defaults used by Serato"""
+
     # "Version" of the crate, presumably something Serato determines
-    self.version = '81.0'
+    self.version = DEFAULT_VERSION
     
     # Metadata to sort crate by, such as "song" for song name
     self.sort = 'song'
@@ -59,18 +199,37 @@ class SeratoCrate(NodeMixin):
     self.sort_rev = 256
     
     # All columns within the crate
-    self.columns = ['song', 'artist', 'album', 'length']
+    self.columns = DEFAULT_COLUMNS # type: Sequence[str]
 
     # All tracks within the crate
-    self.tracks = []
+    self.tracks = [] # type: Sequence[str]
 
-    # Name of the crate
-    self.crate_name = ''
+    # Records which are passed through unchanged when the crate is written
+    # Tracks with fields other than the path (ptrk), by track path
+    self.track_records = NO_TRACK_RECORDS # type: Mapping[str, bytes]
 
-    # anytree: Set parent and child nodes
-    self.parent = parent
-    if children:
-      self.children = children
+    # Unknown records, along with the number of tracks which preceded them
+    self.unknown_records = () # type: Sequence[Tuple[int, str, bytes]]
+
+  def unload(self) -> None:
+    """Drop the parsed contents of a crate loaded from a .crate file.
+
+    The contents are parsed from the .crate file again the next time they are
+    accessed. Any changes made to the contents since they were loaded are lost.
+    Crates which were not loaded from a .crate file are left untouched.
+
+    """
+
+    if self.source is None:
+      # Nothing to reload the crate from
+      return
+
+    for attribute in SeratoCrate.lazy_attributes:
+      try:
+        delattr(self, attribute)
+      except AttributeError:
+        # Already unloaded
+        pass
   
   def __str__(self) -> str:
     """Return a string representation of the Serato Crate
@@ -98,15 +257,62 @@ class SeratoCrate(NodeMixin):
     """
 
     # Return JSON serialized version of the crate
-    return dumps(self.__dict__, indent=2, sort_keys=True)
+    return dumps({
+      'crate_name': self.crate_name,
+      'version': self.version,
+      'sort': self.sort,
+      'sort_rev': self.sort_rev,
+      'columns': list(self.columns),
+      'tracks': self.tracks
+    }, indent=2, sort_keys=True)
   
-  def load_crate(self, path: str) -> None:
+  def load_crate(self, path: str, lazy: bool = False, table: Optional[TrackTable] = None) -> None:
     """Load a Serato Crate from a .crate file
 
     This method takes a path to a .crate file and loads it into a SeratoCrate
+    object.
+
+    If lazy is set, only the name of the crate is set, and the .crate file is
+    parsed the first time the contents of the crate, such as tracks, columns or
+    sort, are accessed.
+
+    Args:
+      path (str): Path to the .crate file
+      lazy (bool, optional): Defer parsing the .crate file until first access
+      table (obj:`TrackTable`, optional): Library wide table to intern track
+                                          paths in, so that tracks shared
+                                          between crates are stored once
+
+    Raises:
+      ValueError: If an unexpected value is encountered while loading the crate.
+
+    """
+
+    # Set crate name, the path it is loaded from and the table to intern
+    # tracks in
+    self.crate_name = splitext(basename(path))[0]
+    self.source = path
+    self.track_table = table
+
+    if lazy:
+      # Drop the default contents, so that they are parsed on first access
+      self.unload()
+      return
+
+    self.parse_crate(path)
+
+  def parse_crate(self, path: str) -> None:
+    """Parse a .crate file into a SeratoCrate
+
+    This method parses the contents of a .crate file into the SeratoCrate
     object. As .crate files use an undocumented binary format, this process is
     documented extensively inline.
 
+    The whole file is read at once and iterated as tag-length-value records.
+    Records which are not understood, including tracks with fields other than
+    the path, are kept as is so that they are passed through unchanged when the
+    crate is written.
+
     Args:
       path (str): Path to the .crate file
 
@@ -117,37 +323,88 @@ class SeratoCrate(NodeMixin):
 
     logger.debug('Loading Serato crate %s' % path)
 
-    # Set crate path
-    self.crate_name = splitext(basename(path))[0]
-
-    # Open crate file as binary BufferedReader
-    crate_file = open(path, 'rb')
+    # Read the entire crate file at once, it is then walked as records rather
+    # than through many small reads
+    with open(path, 'rb') as crate_file:
+      data = crate_file.read()
 
-    # Create InputStream helper from BufferedReader
-    stream = InputStream(crate_file)
+    # Crates are a series of records, each of which is a 4 byte tag, a 4 byte
+    # big endian length and a payload of that length
+    records = iter_records(data)
 
     # Header
     # Load the version
-    stream.skip_string('vrsn')                                   # Skip vrsn
-    stream.skip_bytes(b'\x00\x00')                               # Skip two empty byes after vrsn
-    self.version = stream.read_string(8, 'utf-16-be')            # Set version from next 8 bytes as UTF-16 string
-    stream.skip_string('/Serato ScratchLive Crate', 'utf-16-be') # Skip UTF-16 Big Endian (BE) junk string
-
-    # Parse header sections until we reach the tracks (otrk) section
-    # Get the first section
-    while True:
-      try:
-        # Read the next section
-        section = stream.read_string(4)
-      except ValueError:
-        # If the read didn't get 4 bytes, then we must be at the end of a crate
-        # with no tracks, so just end the load here
-        return
-      
-      if section == 'otrk':
-        # If the section is otrk, it's time to start reading tracks
-        break
-      elif section == 'ovct':
+    # Example:
+    # vrsn\x00\x00\x008\x001\x00.\x000\x00/\x00S\x00e\x00r...
+    # vrsn = 56 (00000038)
+    # version = '81.0'
+    # The version has always been read as the two empty bytes after vrsn
+    # followed by 8 bytes of UTF-16, which includes the low bytes of the
+    # record length, so continue to read it this way
+    tag, payload = next(records, ('', None))
+    if tag != 'vrsn':
+      raise ValueError('Expected vrsn but got %s' % tag)
+
+    self.version = sys.intern(data[6:14].decode('utf-16-be'))
+
+    # Columns within the crate, these replace the default columns if present
+    columns = []
+
+    # Tracks and records are added to any already in the crate
+    tracks = list(self.tracks)
+    table = self.track_table
+    track_records = dict(self.track_records)
+    unknown_records = list(self.unknown_records)
+
+    for tag, payload in records:
+      if tag == 'otrk':
+        # Parse tracks (otrk)
+        # Example:
+        # otrk\x00\x00\x00\x8aptrk\x00\x00\x00\x82\x00M\x00u\x00s\x00i\x00c\x00/
+        # \x00F\x00L\x00A\x00C\x00/\x008\x00m\x00m\x00/\x008\x00m\x00m\x00 \x00-
+        # \x00 \x00O\x00p\x00e\x00n\x00e\x00r\x00 \x00E\x00P\x00/\x000\x001\x00 
+        # \x00-\x00 \x008\x00m\x00m\x00 \x00-\x00 \x00O\x00p\x00e\x00n\x00e\x00r
+        # \x00 \x00E\x00P\x00 \x00-\x00 \x00O\x00p\x00e\x00n\x00e\x00r\x00.\x00f
+        # \x00l\x00a\x00c
+        # otrk = 138 (0000008A)
+        # ptrk = 130 (00000082)
+        # track = 'Music/FLAC/8mm/8mm - Opener EP/01 - 8mm - Opener EP - Opener.flac'
+        # Payloads too short for a ptrk header fall through to iter_records,
+        # which raises a ValueError for them
+        if len(payload) >= 8 and payload[:4] == b'ptrk' and UINT32.unpack_from(payload, 4)[0] == len(payload) - 8:
+          # Track contains only its path, decode the UTF-16 string directly
+          track = str(payload[8:], 'utf-16-be')
+
+          if table is not None:
+            # Share the track path with other crates
+            track = table.intern(track)
+
+          tracks.append(track)
+          continue
+
+        # Otherwise iterate all of the track's fields to find the path
+        ptrk = None # type: Optional[str]
+        fields = 0
+        for field, value in iter_records(payload):
+          fields += 1
+          if field == 'ptrk':
+            ptrk = str(value, 'utf-16-be')  # Decode UTF-16 track path
+
+        if ptrk is None:
+          raise ValueError('Expected ptrk in otrk record')
+
+        track = ptrk
+
+        if table is not None:
+          # Share the track path with other crates
+          track = table.intern(track)
+
+        tracks.append(track)
+
+        if fields > 1:
+          # Keep tracks with additional fields so they are written unchanged
+          track_records[track] = bytes(payload)
+      elif tag == 'ovct':
         # Parse columns (ovct)
         # This pattern occurs once for every column
         # Example:
@@ -156,24 +413,10 @@ class SeratoCrate(NodeMixin):
         # tvcn = 8 (00000008)
         # column = 'song'
         # tvcw = 2 (0002)
-        ovct = stream.read_int()                                   # Read ovct value
-        stream.skip_string('tvcn')                                 # Skip tvcn
-        tvcn = stream.read_int()                                   # Read tvcn value
-        self.columns.append(stream.read_string(tvcn, 'utf-16-be')) # Decode UTF-16 string of tvcn length and append as column
-        stream.skip_string('tvcw')                                 # Skip tvcw
-        tvcw = stream.read_int()                                   # Read tvcw value
-        stream.skip_bytes(b'\x00')                                 # Skip \x00
-        stream.skip_string('0')                                    # Skip 0
-
-        # Fail if ovct - tvcn is not 18
-        difference = ovct - tvcn
-        if difference != 18:
-          raise ValueError('Expected (osrt - tvcn) to be 18, but found %d (osrt = %d, tvcn = %d)' % (difference, ovct, tvcn))
-        
-        # Fail if tvcw is not 2
-        if tvcw != 2:
-          raise ValueError('Expected tvcw to be 2, but found %d' % tvcw)
-      elif section == 'osrt':
+        for field, value in iter_records(payload):
+          if field == 'tvcn':
+            columns.append(sys.intern(str(value, 'utf-16-be'))) # Decode UTF-16 column name
+      elif tag == 'osrt':
         # Parse sorting (osrt)
         # This pattern occurs only once
         # Example:
@@ -182,118 +425,431 @@ class SeratoCrate(NodeMixin):
         # tvcn = 8 (00000008)
         # sort = 'song'
         # sort_rev = 256
-        osrt = stream.read_int()                          # Read osrt value
-        stream.skip_string('tvcn')                        # Skip tvcn
-        tvcn = stream.read_int()                          # Read tvcn value
-        self.sort = stream.read_string(tvcn, 'utf-16-be') # Set sort key to UTF-16 string of tvcn length (e.g. song)
-        stream.skip_string('brev')                        # Skip brev
-        self.sort_rev = stream.read_int(5)                # Read next 5 bytes as sort rev
-
-        # Fail of osrt - tvcn is not 17
-        difference = osrt - tvcn
-        if difference != 17:
-          raise ValueError('Expected (osrt - tvcn) to be 17, but found %d (osrt = %d, tvcn = %d)' % (difference, osrt, tvcn))
+        for field, value in iter_records(payload):
+          if field == 'tvcn':
+            self.sort = sys.intern(str(value, 'utf-16-be')) # Decode UTF-16 sort key (e.g. song)
+          elif field == 'brev':
+            # Sort rev has always been read as the 5 bytes after brev, which is
+            # the length of the brev record followed by its 1 byte payload
+            self.sort_rev = int.from_bytes(UINT32.pack(len(value)) + value, byteorder='big')
       else:
-        raise ValueError('Encountered unknown header section %s' % section)
-    
-    # Parse tracks
-    # Example:
-    # otrk\x00\x00\x00\x8aptrk\x00\x00\x00\x82\x00M\x00u\x00s\x00i\x00c\x00/
-    # \x00F\x00L\x00A\x00C\x00/\x008\x00m\x00m\x00/\x008\x00m\x00m\x00 \x00-
-    # \x00 \x00O\x00p\x00e\x00n\x00e\x00r\x00 \x00E\x00P\x00/\x000\x001\x00 
-    # \x00-\x00 \x008\x00m\x00m\x00 \x00-\x00 \x00O\x00p\x00e\x00n\x00e\x00r
-    # \x00 \x00E\x00P\x00 \x00-\x00 \x00O\x00p\x00e\x00n\x00e\x00r\x00.\x00f
-    # \x00l\x00a\x00c
-    # otrk = 138 (0000008A)
-    # ptrk = 130 (00000082)
-    # track = 'Music/FLAC/8mm/8mm - Opener EP/01 - 8mm - Opener EP - Opener.flac'
-    first_track = True
-    while True:
-      if not first_track:
-        # Skip otrk unless this is the first track
-        # On the first track it was skipped during header parsing
-        try:
-          stream.skip_string('otrk')
-        except ValueError:
-          # If we got an exception, then this is the end of the file
-          break
-      
-      first_track = False
-      
-      otrk = stream.read_int()   # Read otrk value
-      stream.skip_string('ptrk') # Skip ptrk
-      ptrk = stream.read_int()   # Read ptrk value
-
-      difference = otrk - ptrk
-      if difference != 8:
-        raise ValueError('Expected (otrk - ptrk) to be 8, but found %d (otrk = %d, ptrk = %d)' % (difference, otrk, ptrk))
-      
-      # Read UTF-16 string of ptrk length to get track name and append it
-      self.tracks.append(stream.read_string(ptrk, 'utf-16-be'))
-
-    crate_file.close()
+        # Keep unknown records, along with their position relative to the
+        # tracks, so they are written unchanged
+        unknown_records.append((len(tracks), tag, bytes(payload)))
+
+    if columns:
+      # Share the default columns if the crate uses them
+      if tuple(columns) == DEFAULT_COLUMNS:
+        self.columns = DEFAULT_COLUMNS
+      else:
+        self.columns = tuple(columns)
+
+    self.tracks = tracks
+
+    if track_records:
+      self.track_records = track_records
+
+    if unknown_records:
+      self.unknown_records = tuple(unknown_records)
   
-  def write_crate(self, path: str) -> None:
+  def remove_tracks(self, tracks: Set[str]) -> int:
+    """Remove a set of tracks from the crate.
+
+    All occurrences of the given tracks are removed, and the remaining tracks
+    keep their order. Unknown records stay in place relative to the remaining
+    tracks, and the raw records of removed tracks are dropped.
+
+    Args:
+      tracks (obj:`set` of str): Track paths to remove
+
+    Returns:
+      removed (int): Number of tracks removed from the crate
+
+    """
+
+    kept = [] # type: List[str]
+
+    # Number of kept tracks preceding each track and the end of the crate,
+    # only needed to move unknown records
+    if self.unknown_records:
+      preceding = [] # type: Optional[List[int]]
+    else:
+      preceding = None
+
+    for track in self.tracks:
+      if preceding is not None:
+        preceding.append(len(kept))
+
+      if track not in tracks:
+        kept.append(track)
+
+    removed = len(self.tracks) - len(kept)
+    if not removed:
+      return 0
+
+    if preceding is not None:
+      preceding.append(len(kept))
+
+      # Anchor unknown records to the same position among the kept tracks
+      self.unknown_records = tuple(
+        (preceding[index], tag, payload)
+        for index, tag, payload in self.unknown_records
+      )
+
+    if self.track_records:
+      track_records = {
+        track: payload for track, payload in self.track_records.items()
+        if track not in tracks
+      }
+      self.track_records = track_records or NO_TRACK_RECORDS
+
+    self.tracks = kept
+
+    return removed
+
+  def replace_tracks(self, replacements: Mapping[str, str]) -> int:
+    """Replace tracks in the crate with other tracks.
+
+    Each track with a replacement is replaced in place. If this results in a
+    track occurring more than once in the crate, only its first occurrence is
+    kept, while tracks which already occurred more than once are left as is.
+    Unknown records stay in place relative to the remaining tracks, and the raw
+    records of replaced tracks are dropped, as they contain the original track
+    path.
+
+    Args:
+      replacements (obj:`dict` of str: str): Replacement track paths, by the
+                                             track path they replace
+
+    Returns:
+      replaced (int): Number of tracks which were replaced or removed
+
+    """
+
+    kept = [] # type: List[str]
+
+    # Tracks in the kept tracks, and the replacements among them
+    seen = set() # type: Set[str]
+    introduced = set() # type: Set[str]
+
+    # Number of kept tracks preceding each track and the end of the crate,
+    # only needed to move unknown records
+    if self.unknown_records:
+      preceding = [] # type: Optional[List[int]]
+    else:
+      preceding = None
+
+    replaced = 0
+    for track in self.tracks:
+      if preceding is not None:
+        preceding.append(len(kept))
+
+      replacement = replacements.get(track)
+
+      if replacement is None:
+        if track in introduced:
+          # Already in the crate as the replacement of an earlier track
+          replaced += 1
+          continue
+
+        seen.add(track)
+        kept.append(track)
+        continue
+
+      replaced += 1
+
+      if replacement in seen:
+        # Already in the crate, so the track is only removed
+        continue
+
+      seen.add(replacement)
+      introduced.add(replacement)
+      kept.append(replacement)
+
+    if not replaced:
+      return 0
+
+    if preceding is not None:
+      preceding.append(len(kept))
+
+      # Anchor unknown records to the same position among the kept tracks
+      self.unknown_records = tuple(
+        (preceding[index], tag, payload)
+        for index, tag, payload in self.unknown_records
+      )
+
+    if self.track_records:
+      track_records = {
+        track: payload for track, payload in self.track_records.items()
+        if track not in replacements
+      }
+      self.track_records = track_records or NO_TRACK_RECORDS
+
+    self.tracks = kept
+
+    return replaced
+
+  def merge_tracks(self, existing: 'SeratoCrate', base: Optional[Sequence[str]] = None) -> Tuple[int, int]:
+    """Three-way merge the tracks of this crate into an existing crate.
+
+    This crate holds the new tracks, such as a fresh folder listing, the
+    existing crate holds the tracks on disk, which may have been reordered or
+    added to in Serato, and base holds the new tracks of the last merge. Only
+    the differences between base and the new tracks are applied: tracks which
+    were removed since base are removed from the existing tracks, and tracks
+    which were added since base are appended in their order in this crate.
+    Tracks added, removed or reordered in Serato are left as they are.
+
+    Without a base, an empty base is used, so no tracks are removed, as any of
+    them may have been added in Serato, and the new tracks which are not in the
+    existing crate yet are appended.
+
+    This crate takes over the version, sort, columns and raw records of the
+    existing crate, along with the merged tracks. Tracks are compared as sets,
+    so the merge is linear in the number of tracks.
+
+    Args:
+      existing (obj:`SeratoCrate`): Crate currently on disk, which is modified
+                                    by the merge
+      base (obj:`list` of str, optional): New tracks of the last merge
+
+    Returns:
+      changes (obj:`tuple`): Tuple of the number of tracks added to and removed
+                             from the existing crate
+
+    """
+
+    tracks = set(self.tracks)
+    base_tracks = set(base or ())
+
+    # Tracks which are no longer in the folder since the last merge
+    removed = existing.remove_tracks(base_tracks.difference(tracks))
+
+    # Tracks which are new to the folder since the last merge, and which are
+    # not already in the crate
+    present = set(existing.tracks)
+    added = [
+      track for track in dict.fromkeys(self.tracks)
+      if track not in base_tracks and track not in present
+    ]
+
+    if added and existing.unknown_records:
+      # Keep unknown records which followed all tracks after the added tracks
+      end = len(existing.tracks)
+      existing.unknown_records = tuple(
+        (len(existing.tracks) + len(added) if index >= end else index, tag, payload)
+        for index, tag, payload in existing.unknown_records
+      )
+
+    for attribute in SeratoCrate.lazy_attributes:
+      setattr(self, attribute, getattr(existing, attribute))
+
+    self.tracks = list(existing.tracks) + added
+
+    return len(added), removed
+
+  def to_bytes(self) -> bytes:
+    """Serialize a SeratoCrate to the .crate file format.
+
+    This method serializes the SeratoCrate object in memory, which allows for
+    comparing or hashing a crate without touching disk. As .crate files use an
+    undocumented binary format, this process is documented extensively inline.
+
+    All parts of the crate are collected in a list and joined once, with the
+    constant header and the encoded sort and column records shared between
+    crates.
+
+    Returns:
+      crate_bytes (bytes): Contents of the .crate file
+
+    """
+
+    # Header
+    # vrsn, two empty bytes, version as UTF-16 and the UTF-16 junk string
+    if self.version == DEFAULT_VERSION:
+      parts = [HEADER]
+    else:
+      parts = [HEADER_VRSN, self.version.encode('utf-16-be'), HEADER_JUNK]
+
+    # Header sections
+    # osrt, followed by an ovct for each column
+    parts.append(encode_sort(self.sort, self.sort_rev))
+    parts.extend(map(encode_column, self.columns))
+
+    # Unknown records, in order of their position relative to the tracks
+    unknown_records = sorted(self.unknown_records, key=lambda record: record[0])
+    unknown_index = 0
+
+    # Tracks
+    # otrk, track path length * 2 + 8, ptrk, track path length * 2, track path
+    # encoded as UTF-16
+    append = parts.append
+    track_records = self.track_records
+    for index, track in enumerate(self.tracks):
+      while unknown_index < len(unknown_records) and unknown_records[unknown_index][0] <= index:
+        # Write unknown records preceding this track unchanged
+        _, tag, payload = unknown_records[unknown_index]
+        append(RECORD_HEADER.pack(tag.encode('latin-1'), len(payload)))
+        append(payload)
+        unknown_index += 1
+
+      if track_records and track in track_records:
+        # Track has fields other than ptrk, write it unchanged
+        payload = track_records[track]
+        append(RECORD_HEADER.pack(b'otrk', len(payload)))
+        append(payload)
+        continue
+
+      encoded = track.encode('utf-16-be')
+      length = len(encoded)
+      append(NESTED_HEADER.pack(b'otrk', length + 8, b'ptrk', length))
+      append(encoded)
+
+    for _, tag, payload in unknown_records[unknown_index:]:
+      # Write unknown records following all tracks unchanged
+      append(RECORD_HEADER.pack(tag.encode('latin-1'), len(payload)))
+      append(payload)
+
+    # Join and return the serialized crate
+    return b''.join(parts)
+
+  def write_crate(self, path: str, dry_run: bool = False) -> str:
     """Write a SeratoCrate to a .crate file.
 
-    This method takes a path to a .crate file and writes the SeratoCrate object
-    to it. As .crate files use an undocumented binary format, this process is
-    documented extensively inline.
+    This method serializes the SeratoCrate and writes it to a .crate file in
+    the given path. If a .crate file with identical contents already exists,
+    it is left untouched in order to avoid waking up Serato's file watcher and
+    needlessly writing to the disk.
+
+    The crate is first written to a temporary file in the same directory,
+    which is then renamed over the .crate file. This ensures that Serato never
+    sees a partially written crate, and that an interrupted write cannot leave
+    a corrupt crate behind.
 
     Args:
-      path (str): Path to the .crate file
+      path (str): Path to the directory containing .crate files
+      dry_run (bool, optional): Compare the crate without writing it
+
+    Returns:
+      result (str): Either WRITTEN, UNCHANGED, or SKIPPED if the crate differs
+                    from the file on disk but dry_run is set
 
     """
 
     # Crate path
     crate_path = join(path, '%s.crate' % self.crate_name)
+
+    # Serialize the crate in memory
+    crate_bytes = self.to_bytes()
+
+    if SeratoCrate.is_unchanged(crate_path, crate_bytes):
+      # Existing crate file is identical, nothing to do
+      logger.debug('Serato crate %s is unchanged' % crate_path)
+      return UNCHANGED
+
+    if dry_run:
+      logger.debug('Writing Serato crate %s (Dry Run)' % crate_path)
+      return SKIPPED
+
     logger.debug('Writing Serato crate %s' % crate_path)
 
-    # Open crate file as binary BufferedReader
-    crate_file = open(crate_path, 'wb')
+    # Write the serialized crate to a temporary file next to the .crate file
+    # The temporary file does not end in .crate, so Serato will ignore it
+    temp_fd, temp_path = mkstemp(prefix='.cratedigger-', suffix='.tmp', dir=path)
+    try:
+      # mkstemp creates the file as 0600, so give it the permissions of the
+      # .crate file it replaces, or those of a newly created file
+      try:
+        mode = stat.S_IMODE(os.stat(crate_path).st_mode)
+      except FileNotFoundError:
+        mode = NEW_CRATE_MODE
 
-    # Create InputStream helper from BufferedReader
-    stream = OutputStream(crate_file)
+      os.chmod(temp_path, mode)
 
-    # Header
-    # Write the version
-    stream.write_string('vrsn')                                   # Write vrsn
-    stream.write_bytes(b'\x00\x00')                               # Write two empty bytes after vrsn
-    stream.write_string(self.version, 'utf-16-be')                # Write version as UTF-16 string
-    stream.write_string('/Serato ScratchLive Crate', 'utf-16-be') # Write junk as UTF-16 string
-  
-    # Write header sections
-    # osrt
-    sort_length = len(self.sort)                                  # Get length of sort word
-    stream.write_string('osrt')                                   # Write osrt
-    stream.write_int(sort_length * 2 + 17)                        # Write sort word length * 2 + 17 (arbitrary)
-    stream.write_string('tvcn')                                   # Write tvcn
-    stream.write_int(sort_length * 2)                             # Write sort word length * 2 (since UTF-16)
-    stream.write_string(self.sort, 'utf-16-be')                   # Write sort word encoded as UTF-16
-    stream.write_string('brev')                                   # Write brev
-    stream.write_int(self.sort_rev, 5)                            # Write sort_rev as 5 bit int
-
-    # Write columns
-    for column in self.columns:                                   # For each column
-      column_length = len(column)                                 # Get length of column word
-      stream.write_string('ovct')                                 # Write ovct
-      stream.write_int(column_length * 2 + 18)                    # Write column word length * 2 + 17 (arbitrary)
-      stream.write_string('tvcn')                                 # Write tvcn
-      stream.write_int(column_length * 2)                         # Write column word length * 2 (since UTF-16)
-      stream.write_string(column, 'utf-16-be')                    # Write column word encoded as UTF-16
-      stream.write_string('tvcw')                                 # Write tvcw
-      stream.write_int(2)                                         # Write 2
-      stream.write_bytes(b'\x00')                                 # Write \x00 byte
-      stream.write_string('0')                                    # Write 0
-
-    # Write tracks
-    for track in self.tracks:                                     # For each track
-      track_length = len(track)                                   # Get length of track word
-      stream.write_string('otrk')                                 # Write otrk
-      stream.write_int(track_length * 2 + 8)                      # Write track word length * 2 + 8 (arbitrary)
-      stream.write_string('ptrk')                                 # Write ptrk
-      stream.write_int(track_length * 2)                          # Write track word length * 2 (since UTF-16)
-      stream.write_string(track, 'utf-16-be')                     # Write track word encoded as UTF-16
-    
-    # Close crate file
-    crate_file.close()
+      with open(temp_fd, 'wb') as crate_file:
+        crate_file.write(crate_bytes)
+
+      # Atomically replace the .crate file with the temporary file
+      os.replace(temp_path, crate_path)
+    except BaseException:
+      # Clean up the temporary file if the write failed
+      try:
+        os.remove(temp_path)
+      except OSError:
+        pass
+
+      raise
+
+    return WRITTEN
+
+  @staticmethod
+  def is_unchanged(crate_path: str, crate_bytes: bytes) -> bool:
+    """Determine whether a .crate file on disk matches serialized crate bytes.
+
+    The size of the existing file is checked first, which rules out most
+    changed crates with a single stat. Only when the sizes match is the file
+    read and compared byte for byte.
+
+    Args:
+      crate_path (str): Path to the .crate file
+      crate_bytes (bytes): Serialized crate to compare against
+
+    Returns:
+      unchanged (bool): True if the file exists and has identical contents
+
+    """
+
+    try:
+      # Compare sizes first, this avoids reading files which have changed size
+      if os.stat(crate_path).st_size != len(crate_bytes):
+        return False
+
+      # Sizes match, so compare the full contents
+      with open(crate_path, 'rb') as crate_file:
+        return crate_file.read() == crate_bytes
+    except FileNotFoundError:
+      # No existing crate file
+      return False
+
+@lru_cache(maxsize=None)
+def encode_sort(sort: str, sort_rev: int) -> bytes:
+  """Encode the sort (osrt) record of a crate.
+
+  Example:
+    osrt\x00\x00\x00\x19tvcn\x00\x00\x00\x08\x00s\x00o\x00n\x00gbrev\x00\x00\x00\x01\x00
+
+  Args:
+    sort (str): Metadata to sort the crate by
+    sort_rev (int): "Sort Rev", written as a 5 byte int
+
+  Returns:
+    record (bytes): The encoded osrt record
+
+  """
+
+  encoded = sort.encode('utf-16-be')
+  length = len(encoded)
+
+  # osrt, sort length + 17, tvcn, sort length, sort, brev, sort_rev
+  return NESTED_HEADER.pack(b'osrt', length + 17, b'tvcn', length) + encoded + b'brev' + sort_rev.to_bytes(5, byteorder='big')
+
+@lru_cache(maxsize=None)
+def encode_column(column: str) -> bytes:
+  """Encode a column (ovct) record of a crate.
+
+  Example:
+    ovct\x00\x00\x00\x1atvcn\x00\x00\x00\x08\x00s\x00o\x00n\x00gtvcw\x00\x00\x00\x02\x000
+
+  Args:
+    column (str): Name of the column
+
+  Returns:
+    record (bytes): The encoded ovct record
+
+  """
+
+  encoded = column.encode('utf-16-be')
+  length = len(encoded)
+
+  # ovct, column length + 18, tvcn, column length, column, tvcw footer
+  return NESTED_HEADER.pack(b'ovct', length + 18, b'tvcn', length) + encoded + COLUMN_FOOTER
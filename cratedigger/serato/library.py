@@ -1,18 +1,69 @@
 #!/usr/bin/env python3
 import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from logging import getLogger
-from glob import glob
 from re import match
 from json import dumps
-from typing import List
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
 from anytree import PreOrderIter, RenderTree
 from cratedigger.util import to_dict
-from cratedigger.serato.crate import SeratoCrate
+from cratedigger.serato.crate import SeratoCrate, WRITTEN, UNCHANGED, SKIPPED
+from cratedigger.serato.tracks import TrackTable
 
 # Logging
 logger = getLogger(__name__)
 
+class WriteStats(object):
+  """Counts of the results of writing a Serato Library.
+
+  Attributes:
+    written (int): Crates which were new or changed and have been written
+    unchanged (int): Crates which were identical on disk and were not written
+    skipped (int): Crates which were new or changed but were not written due to
+                   a dry run
+    pruned (int): Stale crates which have been deleted, or would have been
+                  deleted during a dry run
+    errors (obj:`dict` of str: obj:`Exception`): Errors encountered while
+                                                 writing crates, by crate name
+    crate_names (obj:`set` of str): Names of all crates which were written or
+                                    attempted to be written
+
+  """
+
+  def __init__(self) -> None:
+    """Initialize all counts to zero"""
+
+    self.written = 0
+    self.unchanged = 0
+    self.skipped = 0
+    self.pruned = 0
+    self.errors = {} # type: Dict[str, Exception]
+    self.crate_names = set() # type: Set[str]
+
+  def __str__(self) -> str:
+    """Return a string representation of the write results"""
+
+    return '%d written, %d skipped, %d unchanged, %d pruned, %d failed' % (
+      self.written, self.skipped, self.unchanged, self.pruned, len(self.errors)
+    )
+
+  def add(self, result: str) -> None:
+    """Count the result of a single crate write.
+
+    Args:
+      result (str): Result returned by SeratoCrate.write_crate
+
+    """
+
+    if result == WRITTEN:
+      self.written += 1
+    elif result == UNCHANGED:
+      self.unchanged += 1
+    elif result == SKIPPED:
+      self.skipped += 1
+
 class SeratoLibrary(object):
   """A library of Serato Crates.
 
@@ -28,20 +79,35 @@ class SeratoLibrary(object):
     volume_path (str): Path to the root of the volume
     crates_path (str): Path to the Subcrates folder on the volume
     crates (obj:`SeratoCrate`): Tree of all crates in the Serato Library
-    root_crate (obj:`SeratoCrate`): Root crate of tree, all loaded Serato
-                                    libraries are grouped under this
+    track_table (obj:`TrackTable`): Table of all track paths in the Serato
+                                    Library, shared by all of its crates
+    root_crate (obj:`SeratoCrate`): Root crate of tree, the library's crates
+                                    are grouped under this, and libraries
+                                    which share it form a single tree
+    pending_writes (int): Number of crates per job which may wait to be written
 
   """
   
-  # "Root" crate of the crates tree, all crates are grouped under this
-  root_crate = SeratoCrate(parent=None)
-  root_crate.crate_name = 'Root'
+  # Name of the "Root" crate of the crates tree, all crates are grouped under it
+  root_name = 'Root'
 
-  def __init__(self) -> None:
+  # Crates per job which may be waiting to be written at once
+  pending_writes = 4
+
+  def __init__(self, root_crate: Optional[SeratoCrate] = None) -> None:
     """Initialize a Serato Library
 
     This initializes the Serato Library and it's attributes to default values.
 
+    Each library has its own root crate, so libraries loaded in the same
+    process are isolated from each other, unless a root crate is given for
+    them to share.
+
+    Args:
+      root_crate (obj:`SeratoCrate`, optional): Root crate to group the
+                                                library's crates under,
+                                                defaults to a new root crate
+
     """
 
     self.path = ''
@@ -49,8 +115,26 @@ class SeratoLibrary(object):
     self.volume = ''
     self.volume_path = ''
     self.crates_path = ''
+    self.track_table = TrackTable()
+
+    if root_crate is None:
+      root_crate = self.create_root()
+
+    self.root_crate = root_crate
+
+  @classmethod
+  def create_root(cls) -> SeratoCrate:
+    """Create an empty root crate for the crates tree.
+
+    Returns:
+      root_crate (obj:`SeratoCrate`): New "Root" crate, without a parent
 
-    pass
+    """
+
+    root_crate = SeratoCrate(parent=None)
+    root_crate.crate_name = SeratoLibrary.root_name
+
+    return root_crate
   
   def __str__(self) -> str:
     """Return a string representation of the Serato Library.
@@ -99,15 +183,22 @@ class SeratoLibrary(object):
     # Return rendered string
     return render
   
-  def load(self, path: str) -> None:
+  def load(self, path: str, lazy: bool = False, crates_path: Optional[str] = None) -> None:
     """Load a Serato Library from a given path
 
     This method loads all .crate files in a given path's Subcrates folder
     as SeratoCrate objects and assembles them in a tree structure based on 
     their delimiters.
 
+    If lazy is set, the tree is built from the .crate file names alone, and
+    each .crate file is only parsed the first time the contents of its crate
+    are accessed.
+
     Args:
       path (str): Path to the _Serato_ folder
+      lazy (bool, optional): Defer parsing .crate files until first access
+      crates_path (str, optional): Subcrates folder to load .crate files from,
+                                   defaults to the one on the path's volume
 
     Raises:
       ValueError: If no _Serato_ folder is present in the given path
@@ -120,77 +211,379 @@ class SeratoLibrary(object):
     # Determine volume name and type
     self.split_volume(path)
 
+    if crates_path is not None:
+      # Override the detected Subcrates folder
+      self.crates_path = crates_path
+
     # SeratoLibrary loads from the root, so set crates to the root
-    self.crates = SeratoLibrary.root_crate
+    self.crates = self.root_crate
 
     if not os.path.isdir(self.crates_path):
       # Error if there is no serato library here
       raise ValueError('No _Serato_ folder present in %s' % path)
 
-    # Get a list of all .crate files, with only their basenames and no path
-    crates = [os.path.basename(file) for file in glob(os.path.join(self.crates_path, '*.crate'))]
+    # Get a list of all .crate files, with only their names and no extension
+    crates = [
+      os.path.splitext(file)[0] for file in os.listdir(self.crates_path)
+      if file.endswith('.crate')
+    ]
 
-    # Start loading all "base" (not delimiters) crates
-    for crate in [crate for crate in crates if crate.startswith('%s%%' % SeratoLibrary.root_crate.crate_name)]:
-      # Create child node from the base crate
-      child = SeratoCrate(parent=self.crates)
-      child.load_crate(os.path.join(self.crates_path, crate))
+    # Load all crates under the root
+    self.load_crates(crates, self.crates, lazy)
+  
+  def load_crates(self, crates: List[str], parent: SeratoCrate, lazy: bool = False) -> None:
+    """Load a set of Serato .crate files as a tree.
 
-      # Split the .crate extension and add the delimiter
-      # e.g. '8mm%%' for '8mm.crate'
-      prefix = '%s%s' % (os.path.splitext(os.path.basename(crate))[0], SeratoCrate.delimiter)
+    This method takes a list of crate names, and loads them as descendants of a
+    given SeratoCrate. Each name is split on the delimiter once, and inserted
+    into an index of children by name, so the tree is built in a single pass
+    over the names and each .crate file is loaded exactly once.
 
-      # Find all "subcrates" that start with this prefix and load them
-      # under the child node
-      subcrates = [crate for crate in crates if crate.startswith(prefix)]
-      if len(subcrates) != 0:
-        self.load_crates(subcrates, prefix, child)
-  
-  def load_crates(self, crates: List[str], prefix: str, parent: SeratoCrate) -> None:
-    """Recursively load a set of Serato .crate files.
+    If a subcrate exists without a .crate file for one of its parents, an empty
+    crate is created for the parent so that the tree remains intact.
 
-    This method takes a list of crates, and loads them as children of a given
-    SeratoCrate. If any of these crates have their own subcrates, this method
-    is recursively called until the end of the tree is reached.
+    Example:
+      ['8mm', '8mm%%8mm - Opener EP', '8mm%%8mm - Songs to Love and Die By']
+      8mm
+      ├── 8mm%%8mm - Opener EP
+      └── 8mm%%8mm - Songs to Love and Die By
 
     Args:
-      crates (obj:`list` of obj:`str`): List of paths to .crate files
-      prefix (str): The prefix to use when attempting to locate subcrates
-      parent (obj:`SeratoCrate`): Parent crate of the subcrates to be loaded
+      crates (obj:`list` of obj:`str`): Names of .crate files without extension
+      parent (obj:`SeratoCrate`): Parent crate of the crates to be loaded
+      lazy (bool, optional): Defer parsing .crate files until first access
 
     """
 
-    for crate in crates:
-      # Create child node from the crate, using the provided parent
-      child = SeratoCrate(parent=parent)
-      child.load_crate(os.path.join(self.crates_path, crate))
+    # Trie of crate names, each node maps the next part of a crate name to the
+    # crate and the trie node of its own children
+    index = {} # type: Dict[str, tuple]
+
+    # Sort the crates, so that the tree is built in a consistent order
+    for crate_name in sorted(crates):
+      children = index
+      node = parent
+      name = None
 
-      # Split the .crate extension and add the delimiter
-      # e.g. '8mm%%8mm - Opener EP%%' for '8mm%%8mm - Opener EP.crate'
-      prefix = '%s%%' % os.path.splitext(os.path.basename(crate))[0]
+      for part in crate_name.split(SeratoCrate.delimiter):
+        # Name of the crate at this level of the tree
+        if name is None:
+          name = part
+        else:
+          name = name + SeratoCrate.delimiter + part
 
-      # Find all "subcrates" that start with this new prefix and load them
-      # under the new child node
-      subcrates = [crate for crate in crates if crate.startswith(prefix)]
-      if len(subcrates) != 0:
-        self.load_crates(subcrates, prefix, child)
+        if part not in children:
+          # Create the crate, this is either the crate itself or a parent with
+          # no .crate file of its own
+          child = SeratoCrate(parent=node)
+          child.crate_name = name
+          children[part] = (child, {})
+
+        node, children = children[part]
+
+      # Load the .crate file into the crate
+      node.load_crate(os.path.join(self.crates_path, '%s.crate' % crate_name), lazy, self.track_table)
+
+  def unload(self) -> None:
+    """Drop the parsed contents of all crates loaded from .crate files.
+
+    This caps the memory used by a library loaded lazily, as the contents of
+    each crate are only parsed again when next accessed.
+
+    """
+
+    for crate in PreOrderIter(self.crates):
+      crate.unload()
   
-  def write(self) -> None:
+  def find_missing_tracks(self, jobs: int = 1) -> Set[str]:
+    """Find the tracks referenced by the library which do not exist.
+
+    The tracks of all crates are deduplicated and grouped by their directory,
+    which is then listed once with os.scandir, rather than checking each track
+    reference with its own stat. Track paths are resolved against the root of
+    the library's volume.
+
+    If more than one job is requested, directories are listed on a thread
+    pool.
+
+    Args:
+      jobs (int, optional): Number of directories to list concurrently
+
+    Returns:
+      missing (obj:`set` of str): Track paths which do not exist, as they are
+                                  stored in the crates
+
+    """
+
+    # Distinct tracks of all crates, grouped by directory
+    # directory: [(file name, track path)]
+    directories = {} # type: Dict[str, List[Tuple[str, str]]]
+
+    tracks = set() # type: Set[str]
+    for crate in PreOrderIter(self.crates):
+      tracks.update(crate.tracks)
+
+    for track in tracks:
+      directory, _, name = track.rpartition('/')
+      directories.setdefault(directory, []).append((name, track))
+
+    logger.debug('Checking %d tracks in %d directories' % (len(tracks), len(directories)))
+
+    missing = set() # type: Set[str]
+
+    if jobs > 1:
+      with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for directory_missing in executor.map(self.find_missing_files, directories.items()):
+          missing.update(directory_missing)
+    else:
+      for directory_missing in map(self.find_missing_files, directories.items()):
+        missing.update(directory_missing)
+
+    return missing
+
+  def find_missing_files(self, directory: Tuple[str, List[Tuple[str, str]]]) -> List[str]:
+    """Find the tracks within a single directory which do not exist.
+
+    The directory is listed once, and only tracks which are not in the listing
+    are checked individually, so that tracks which differ in case on a case
+    insensitive filesystem are not reported as missing.
+
+    Args:
+      directory (obj:`tuple`): Tuple of the directory relative to the volume
+                               root, and the file names and track paths within
+                               it
+
+    Returns:
+      missing (obj:`list` of str): Track paths which do not exist
+
+    """
+
+    directory_path, files = directory
+
+    # Resolve the directory against the volume root
+    directory_path = self.resolve_track(directory_path)
+
+    try:
+      with os.scandir(directory_path) as entries:
+        names = {entry.name for entry in entries}
+    except (FileNotFoundError, NotADirectoryError):
+      # The directory is missing, and so are all of its tracks
+      return [track for _, track in files]
+    except OSError:
+      # The directory can't be listed, so check each track individually
+      names = set()
+
+    return [
+      track for name, track in files
+      if name not in names and not os.path.exists(os.path.join(directory_path, name))
+    ]
+
+  def resolve_track(self, track: str) -> str:
+    """Resolve a track path from a crate to a path on the filesystem.
+
+    Track paths in crates are relative to the root of the volume and always
+    use forward slashes, so they are joined to the volume path using the
+    separator of the current platform.
+
+    Example:
+      volume_path: /Volumes/Music/
+      track: Music/8mm/Opener.flac
+      resolved: /Volumes/Music/Music/8mm/Opener.flac
+
+    Args:
+      track (str): Track path as stored in a crate
+
+    Returns:
+      path (str): Path to the track on the filesystem
+
+    """
+
+    return os.path.join(self.volume_path, track.replace('/', os.sep))
+
+  def write(self, dry_run: bool = False, jobs: int = 1) -> WriteStats:
     """Write all crates in a Serato Library as .crate files.
 
     This method traverses the Serato Library and writes all Serato Crates as
-    .crate files in the crates_path.
+    .crate files in the crates_path. Crates which are identical to the .crate
+    file already on disk are not rewritten.
+
+    Args:
+      dry_run (bool, optional): Compare all crates without writing any of them
+      jobs (int, optional): Number of crates to write concurrently
+
+    Returns:
+      stats (obj:`WriteStats`): Counts of written, skipped and unchanged crates,
+                                as well as any errors encountered
 
     """
 
+    return self.write_crates(PreOrderIter(self.crates), dry_run, jobs)
+
+  def write_crates(self, crates: Iterable[SeratoCrate], dry_run: bool = False, jobs: int = 1) -> WriteStats:
+    """Write a number of crates as .crate files in the crates_path.
+
+    Crates are written as they are produced by the given iterable, so crates
+    can be generated on the fly without holding all of them in memory.
+
+    If more than one job is requested, crates are serialized and written on a
+    thread pool. The number of crates waiting to be written is bounded, so a
+    slow disk does not cause produced crates to pile up in memory. A crate
+    which fails to write does not stop the remaining crates from being written,
+    instead the error is recorded in the returned stats.
+
+    Args:
+      crates (obj:`list` of obj:`SeratoCrate`): Crates to write
+      dry_run (bool, optional): Compare all crates without writing any of them
+      jobs (int, optional): Number of crates to write concurrently
+
+    Returns:
+      stats (obj:`WriteStats`): Counts of written, skipped and unchanged crates,
+                                as well as any errors encountered
+
+    """
+
+    stats = WriteStats()
+
     if not os.path.exists(self.crates_path):
+      if dry_run:
+        # Nothing exists yet, so every crate would be written
+        for crate in crates:
+          stats.crate_names.add(crate.crate_name)
+          stats.add(SKIPPED)
+
+        return stats
+
       # Create the crates path if it doesn't exist
       logger.info('Creating crates directory %s' % self.crates_path )
       os.makedirs(self.crates_path)
 
-    for crate in PreOrderIter(self.crates):
-      # Traverse the tree and write all crates
-      crate.write_crate(self.crates_path)
+    if jobs > 1:
+      # Write all crates on a thread pool, collecting results in order
+      with ThreadPoolExecutor(max_workers=jobs) as executor:
+        # Crates submitted to the pool which have not been collected yet
+        pending = deque() # type: Deque[Tuple[SeratoCrate, Future]]
+
+        for crate in crates:
+          stats.crate_names.add(crate.crate_name)
+          pending.append((crate, executor.submit(crate.write_crate, self.crates_path, dry_run)))
+
+          if len(pending) >= jobs * SeratoLibrary.pending_writes:
+            # Wait for the oldest write before producing more crates
+            self.collect_write(stats, *pending.popleft())
+
+        while pending:
+          self.collect_write(stats, *pending.popleft())
+    else:
+      for crate in crates:
+        stats.crate_names.add(crate.crate_name)
+
+        # Write all crates in order
+        try:
+          stats.add(crate.write_crate(self.crates_path, dry_run))
+        except (OSError, ValueError) as e:
+          stats.errors[crate.crate_name] = e
+
+    return stats
+
+  def prune_crates(self, prefix: str, stats: WriteStats, dry_run: bool = False) -> List[str]:
+    """Delete stale .crate files under a given crate name prefix.
+
+    A .crate file is stale if its crate is one of the descendants of the prefix
+    crate, and it was not written by the write which produced the given stats.
+    The prefix crate itself is never pruned, as it is the parent crate which
+    Serato shows the pruned crates under. The crates_path is listed once, and the stale crates are the set
+    difference between the listed crate names and the written crate names.
+
+    Crate names are compared case insensitively, so a crate is never deleted
+    because it differs from a written crate only in case, which would refer to
+    the same file on a case insensitive filesystem.
+
+    Args:
+      prefix (str): Name of the crate whose descendants are pruned, such as
+                    Media%%root
+      stats (obj:`WriteStats`): Stats of the write, the pruned crates and any
+                                errors are counted in this
+      dry_run (bool, optional): Determine the stale crates without deleting any
+                                of them
+
+    Returns:
+      pruned (obj:`list` of str): Names of the stale crates, in sorted order
+
+    """
+
+    if not os.path.isdir(self.crates_path):
+      # Nothing has been written yet, so nothing is stale
+      return []
+
+    # Names of all crates under the prefix in the crates path
+    subcrate_prefix = prefix + SeratoCrate.delimiter
+    existing = {} # type: Dict[str, str]
+    for file in os.listdir(self.crates_path):
+      if not file.endswith('.crate'):
+        continue
+
+      crate_name = file[:-len('.crate')]
+      if crate_name.startswith(subcrate_prefix):
+        existing[crate_name.casefold()] = crate_name
+
+    # Crates which exist but were not written
+    written = {crate_name.casefold() for crate_name in stats.crate_names}
+    pruned = sorted(existing[crate_name] for crate_name in existing.keys() - written)
+
+    self.delete_crates(pruned, stats, dry_run)
+
+    return pruned
+
+  def delete_crates(self, crate_names: Iterable[str], stats: WriteStats, dry_run: bool = False) -> None:
+    """Delete the .crate files of a number of crates from the crates_path.
+
+    A crate which fails to be deleted does not stop the remaining crates from
+    being deleted, instead the error is recorded in the given stats.
+
+    Args:
+      crate_names (obj:`iterable` of str): Names of the crates to delete
+      stats (obj:`WriteStats`): Stats to count the pruned crates and any errors
+                                in
+      dry_run (bool, optional): Report the crates without deleting any of them
+
+    """
+
+    for crate_name in crate_names:
+      crate_path = os.path.join(self.crates_path, '%s.crate' % crate_name)
+
+      if dry_run:
+        logger.info('Deleting Serato crate %s (Dry Run)' % crate_path)
+        stats.pruned += 1
+        continue
+
+      logger.info('Deleting Serato crate %s' % crate_path)
+
+      try:
+        os.remove(crate_path)
+      except FileNotFoundError:
+        # Already removed by something else
+        continue
+      except OSError as e:
+        stats.errors[crate_name] = e
+        continue
+
+      stats.pruned += 1
+
+  @staticmethod
+  def collect_write(stats: WriteStats, crate: SeratoCrate, write: Future) -> None:
+    """Wait for a crate write on the thread pool and count its result.
+
+    Args:
+      stats (obj:`WriteStats`): Stats to count the result in
+      crate (obj:`SeratoCrate`): Crate being written
+      write (obj:`Future`): Future of the crate write
+
+    """
+
+    try:
+      stats.add(write.result())
+    except (OSError, ValueError) as e:
+      stats.errors[crate.crate_name] = e
   
   def split_volume(self, path: str) -> None:
     """Determine volume metadata of the library based on a given path.
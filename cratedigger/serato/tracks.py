@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+from array import array
+from threading import Lock
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Set
+
+class TrackTable(object):
+  """A library wide table of track paths.
+
+  This table maps each normalized track path to a single shared string and an
+  integer ID. Crates store the shared strings returned by intern, so a track
+  which is present in several crates is only stored once. The integer IDs
+  allow set operations across crates, such as deduplication, diffs and
+  membership checks, to be performed over integers rather than strings.
+
+  Interning is thread safe, so crates can be loaded concurrently into a single
+  table.
+
+  Example:
+    table = TrackTable()
+    table.intern('Music/8mm/Opener.flac') # 'Music/8mm/Opener.flac'
+    table.id('Music/8mm/Opener.flac')     # 0
+    table.path(0)                         # 'Music/8mm/Opener.flac'
+
+  """
+
+  __slots__ = ('_ids', '_paths', '_lock')
+
+  def __init__(self) -> None:
+    """Initialize an empty Track Table"""
+
+    # IDs by track path
+    self._ids = {} # type: Dict[str, int]
+
+    # Track paths by ID
+    self._paths = [] # type: List[str]
+
+    # Lock for adding new tracks
+    self._lock = Lock()
+
+  def __len__(self) -> int:
+    """Return the number of distinct tracks in the table"""
+
+    return len(self._paths)
+
+  def __contains__(self, path: str) -> bool:
+    """Return whether a track path is in the table"""
+
+    return path in self._ids
+
+  def id(self, path: str) -> int:
+    """Retrieve the ID of a track path, adding it to the table if needed.
+
+    Args:
+      path (str): Normalized track path
+
+    Returns:
+      id (int): ID of the track
+
+    """
+
+    track_id = self._ids.get(path)
+
+    if track_id is None:
+      with self._lock:
+        # Check again, in case another thread added it in the meantime
+        track_id = self._ids.get(path)
+
+        if track_id is None:
+          track_id = len(self._paths)
+          self._paths.append(path)
+          self._ids[path] = track_id
+
+    return track_id
+
+  def intern(self, path: str) -> str:
+    """Retrieve the shared string for a track path, adding it if needed.
+
+    Args:
+      path (str): Normalized track path
+
+    Returns:
+      path (str): Shared string equal to the given track path
+
+    """
+
+    return self._paths[self.id(path)]
+
+  def path(self, track_id: int) -> str:
+    """Retrieve the track path for a given ID.
+
+    Args:
+      track_id (int): ID of the track
+
+    Returns:
+      path (str): Normalized track path
+
+    """
+
+    return self._paths[track_id]
+
+  def ids(self, paths: Iterable[str]) -> Set[int]:
+    """Retrieve the set of IDs for a number of track paths.
+
+    Args:
+      paths (obj:`list` of str): Normalized track paths, such as the tracks of
+                                 a crate
+
+    Returns:
+      ids (obj:`set` of int): IDs of the tracks
+
+    """
+
+    return set(map(self.id, paths))
+
+  def paths(self, track_ids: Iterable[int]) -> List[str]:
+    """Retrieve the track paths for a number of IDs.
+
+    Args:
+      track_ids (obj:`list` of int): IDs of the tracks
+
+    Returns:
+      paths (obj:`list` of str): Normalized track paths
+
+    """
+
+    return [self._paths[track_id] for track_id in track_ids]
+
+class TrackView(Sequence[str]):
+  """A read only view of a range of track IDs as track paths.
+
+  A view references a range of a shared array of track IDs rather than holding
+  a list of its own, so many crates with overlapping tracks, such as a folder
+  and all of its ancestors, can be produced from a single array. Track paths
+  are looked up in the track table as the view is accessed.
+
+  Example:
+    track_ids = array('l', [table.id('a.mp3'), table.id('b.mp3')])
+    list(TrackView(table, track_ids, 1, 2)) # ['b.mp3']
+
+  """
+
+  __slots__ = ('table', 'track_ids', 'start', 'end')
+
+  def __init__(self, table: TrackTable, track_ids: array, start: int, end: int) -> None:
+    """Initialize a Track View.
+
+    Args:
+      table (obj:`TrackTable`): Table the track IDs belong to
+      track_ids (obj:`array` of int): Shared array of track IDs, which may keep
+                                      growing past the end of the view
+      start (int): Offset of the first track of the view in the array
+      end (int): Offset after the last track of the view in the array
+
+    """
+
+    self.table = table
+    self.track_ids = track_ids
+    self.start = start
+    self.end = end
+
+  def __len__(self) -> int:
+    """Return the number of tracks in the view"""
+
+    return self.end - self.start
+
+  def __getitem__(self, index: Any) -> Any:
+    """Retrieve the track path at an index, or a list of the paths of a slice"""
+
+    if isinstance(index, slice):
+      return [self[i] for i in range(*index.indices(len(self)))]
+
+    if index < 0:
+      index += len(self)
+
+    if not 0 <= index < len(self):
+      raise IndexError('Track index out of range')
+
+    return self.table.path(self.track_ids[self.start + index])
+
+  def __iter__(self) -> Iterator[str]:
+    """Iterate over the track paths of the view, in order"""
+
+    for offset in range(self.start, self.end):
+      yield self.table.path(self.track_ids[offset])
@@ -1,6 +1,17 @@
 #!/usr/bin/env python3
 
 def to_dict(obj) -> dict:
-  """Return a given object's dictionary representation"""
+  """Return a given object's dictionary representation
 
-  return obj.__dict__
+  Objects using __slots__ are represented by their public slots.
+
+  """
+
+  if hasattr(obj, '__dict__'):
+    return obj.__dict__
+
+  return {
+    name: getattr(obj, name)
+    for cls in type(obj).__mro__ for name in getattr(cls, '__slots__', ())
+    if not name.startswith('_')
+  }
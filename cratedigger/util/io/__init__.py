@@ -1,5 +1,56 @@
 #!/usr/bin/env python3
 from io import BufferedReader, BufferedWriter
+from struct import Struct
+from typing import Iterator, Tuple, Union
+
+# Record header, a 4 byte tag followed by a big endian 4 byte payload length
+RECORD_HEADER = Struct('>4sI')
+
+def iter_records(buffer: Union[bytes, memoryview], offset: int = 0) -> Iterator[Tuple[str, memoryview]]:
+  """Iterate over the tag-length-value records in a binary buffer.
+
+  Serato files are composed of records, each of which is a 4 byte ASCII tag,
+  a 4 byte big endian payload length, and the payload. Payloads may in turn
+  contain further records, which can be iterated by calling this function on
+  the payload.
+
+  Records are yielded lazily as views into the buffer, so no bytes are copied
+  and a record which is not needed is skipped using its length alone.
+
+  Example:
+    ptrk\x00\x00\x00\x04\x00a\x00b
+    ('ptrk', <memory at ...>) where the view contains \x00a\x00b
+
+  Args:
+    buffer (bytes): Buffer containing the records
+    offset (int, optional): Offset of the first record in the buffer
+
+  Yields:
+    record (obj:`tuple`): Tuple of the tag and a memoryview of the payload
+
+  Raises:
+    ValueError: If a record extends past the end of the buffer
+
+  """
+
+  view = memoryview(buffer)
+  size = len(view)
+
+  while offset < size:
+    if size - offset < RECORD_HEADER.size:
+      raise ValueError('Expected to read %d bytes but read only %d bytes' % (RECORD_HEADER.size, size - offset))
+
+    # Decode the tag and payload length
+    tag, length = RECORD_HEADER.unpack_from(view, offset)
+    offset += RECORD_HEADER.size
+
+    if length > size - offset:
+      raise ValueError('Expected to read %d bytes but read only %d bytes' % (length, size - offset))
+
+    yield tag.decode('latin-1'), view[offset:offset + length]
+
+    # Skip to the next record
+    offset += length
 
 class InputStream(object):
   """Utility class for interacting with a binary file.
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+from typing import Any, Iterable, List, Optional, Tuple, TypeVar
+
+# Type var
+N = TypeVar('N', bound='Node')
+
+class Node(object):
+  """A compact node within a tree.
+
+  This class implements the parts of the anytree NodeMixin API used by
+  cratedigger, so that anytree's iterators and renderers such as PreOrderIter
+  and RenderTree can traverse it. Unlike NodeMixin, it is built on __slots__,
+  so nodes do not carry a per instance __dict__. Leaf nodes, which make up
+  most of a crate tree, do not allocate a list of children at all.
+
+  Attributes:
+    parent (:obj:`Node`): Parent node, or None if this is a root node
+    children (:obj:`tuple` of :obj:`Node`): Child nodes
+
+  """
+
+  __slots__ = ('_parent', '_children')
+
+  def __init__(self) -> None:
+    """Initialize a Node without a parent or children"""
+
+    # Parent node
+    self._parent = None # type: Any
+
+    # List of child nodes, only allocated when the first child is added
+    self._children = None # type: Optional[List[Any]]
+
+  @property
+  def parent(self: N) -> Optional[N]:
+    """Parent node, or None if this is a root node"""
+
+    return self._parent
+
+  @parent.setter
+  def parent(self, parent: Optional['Node']) -> None:
+    """Move this node under a new parent node.
+
+    Args:
+      parent (:obj:`Node`): New parent node, or None to detach this node
+
+    Raises:
+      ValueError: If the new parent is this node or one of its descendants
+
+    """
+
+    if parent is self._parent:
+      return
+
+    if parent is not None:
+      # Ensure that the tree stays acyclic
+      ancestor = parent
+      while ancestor is not None:
+        if ancestor is self:
+          raise ValueError('Cannot set parent, as it would create a loop in the tree')
+
+        ancestor = ancestor._parent
+
+    if self._parent is not None:
+      # Detach from the current parent
+      self._parent._children.remove(self)
+
+    self._parent = parent
+
+    if parent is not None:
+      # Attach to the new parent
+      if parent._children is None:
+        parent._children = [self]
+      else:
+        parent._children.append(self)
+
+  @property
+  def children(self: N) -> Tuple[N, ...]:
+    """Child nodes, in the order they were added"""
+
+    if self._children is None:
+      return ()
+
+    return tuple(self._children)
+
+  @children.setter
+  def children(self, children: Iterable['Node']) -> None:
+    """Replace the children of this node.
+
+    Args:
+      children (:obj:`tuple` of :obj:`Node`): New child nodes
+
+    """
+
+    for child in self.children:
+      child.parent = None
+
+    for child in children:
+      child.parent = self
+
+  @property
+  def descendants(self: N) -> Tuple[N, ...]:
+    """All nodes below this node, in pre-order"""
+
+    descendants = [] # type: List[N]
+
+    # Stack of nodes left to visit, children are pushed in reverse so that
+    # they are visited in order
+    stack = list(reversed(self.children))
+    while stack:
+      node = stack.pop()
+      descendants.append(node)
+
+      if node._children is not None:
+        stack.extend(reversed(node._children))
+
+    return tuple(descendants)
+
+  @property
+  def ancestors(self: N) -> Tuple[N, ...]:
+    """All nodes above this node, starting from the root"""
+
+    ancestors = [] # type: List[N]
+
+    node = self._parent
+    while node is not None:
+      ancestors.append(node)
+      node = node._parent
+
+    return tuple(reversed(ancestors))
+
+  @property
+  def path(self: N) -> Tuple[N, ...]:
+    """All nodes from the root down to and including this node"""
+
+    return self.ancestors + (self,)
+
+  @property
+  def root(self: N) -> N:
+    """Root node of the tree"""
+
+    node = self
+    while node._parent is not None:
+      node = node._parent
+
+    return node
+
+  @property
+  def depth(self) -> int:
+    """Number of ancestors of this node"""
+
+    return len(self.ancestors)
+
+  @property
+  def is_root(self) -> bool:
+    """Whether this node has no parent"""
+
+    return self._parent is None
+
+  @property
+  def is_leaf(self) -> bool:
+    """Whether this node has no children"""
+
+    return not self._children
@@ -30,6 +30,9 @@ setup(
     'click>=7.0',
     'anytree>=2.6.0'
   ],
+  extras_require={
+    'numpy': ['numpy']
+  },
   entry_points='''
     [console_scripts]
     cratedigger=cratedigger.cli:cli